@@ -1,12 +1,45 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort, make_response, g, has_app_context, Response, stream_with_context, send_from_directory, before_render_template, template_rendered
 import os
 from flask import Blueprint
+from flask.cli import AppGroup
 from dotenv import load_dotenv
-import google.generativeai as genai
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
+from markupsafe import Markup, escape
+from sqlalchemy import bindparam, delete, event, func, inspect, select, text, tuple_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, validates
+from sqlalchemy.sql.elements import TextClause
+import asyncio
+import atexit
+import click
+import csv
+import sys
+from contextlib import nullcontext
 import re
-from datetime import datetime 
+import json
+import math
+import hashlib
+import sqlite3
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime, date, timedelta, timezone
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are served as uploaded
+    Image = None
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # asgiref (flask[async]) is only needed to serve the whole app via asgi_app
+    WsgiToAsgi = None
 
 # ========== CONFIGURATION ==========
 load_dotenv()
@@ -18,15 +51,85 @@ import os
 
 load_dotenv(override=True) 
 
-API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=API_KEY)
+app.config['GOOGLE_API_KEY'] = os.getenv("GOOGLE_API_KEY")
+# Debugger and reloader for `python app.py`; never enable in production
+app.config['DEBUG'] = os.getenv("FLASK_DEBUG", "0").lower() in ("1", "true", "yes")
 
+# LLM backend: "gemini" (default) or "stub" for offline load tests and CI
+app.config['LLM_BACKEND'] = os.getenv("LLM_BACKEND", "gemini")
 # Ensure you use a supported model name
-chat_model = genai.GenerativeModel("gemini-2.5-flash")
+app.config['LLM_MODEL'] = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+# Max concurrent model calls per process, and total seconds one call may take
+# (waiting for a slot and retries included)
+app.config['LLM_MAX_CONCURRENCY'] = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Max concurrent model calls from the async chat path (asgi_app); these cost no thread
+app.config['LLM_ASYNC_MAX_CONCURRENCY'] = int(os.getenv("LLM_ASYNC_MAX_CONCURRENCY", "512"))
+app.config['LLM_TIMEOUT'] = float(os.getenv("LLM_TIMEOUT", "30"))
+# Retries after a failed call, with jittered exponential backoff starting at LLM_BACKOFF seconds
+app.config['LLM_RETRIES'] = int(os.getenv("LLM_RETRIES", "2"))
+app.config['LLM_BACKOFF'] = float(os.getenv("LLM_BACKOFF", "0.5"))
+# Consecutive failures that open the circuit, and seconds before a trial call is allowed
+app.config['LLM_CIRCUIT_THRESHOLD'] = int(os.getenv("LLM_CIRCUIT_THRESHOLD", "5"))
+app.config['LLM_CIRCUIT_RESET'] = float(os.getenv("LLM_CIRCUIT_RESET", "30"))
+# Simulated seconds per stub answer
+app.config['LLM_STUB_LATENCY'] = float(os.getenv("LLM_STUB_LATENCY", "0"))
 
 # Database
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URI", 'mysql+pymysql://root:@localhost/tripwise')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Seconds a catalog snapshot may be served before it is reloaded (0 = only on writes).
+# Keeps workers that did not see a write from serving stale data forever.
+app.config['CATALOG_TTL'] = int(os.getenv("CATALOG_TTL", "300"))
+# How many islands/establishments the chatbot search puts into a prompt
+app.config['SEARCH_TOP_K'] = int(os.getenv("SEARCH_TOP_K", "5"))
+# Approximate token budgets for the catalog context in chat and trip-plan prompts;
+# the lowest-ranked entries are shortened or left out to stay within them
+app.config['CHAT_CONTEXT_TOKENS'] = int(os.getenv("CHAT_CONTEXT_TOKENS", "1200"))
+app.config['PLAN_CONTEXT_TOKENS'] = int(os.getenv("PLAN_CONTEXT_TOKENS", "2500"))
+# Gemini response cache: max entries kept in memory, seconds an answer stays valid,
+# and an optional SQLite file so warm entries survive restarts (empty = memory only)
+app.config['LLM_CACHE_SIZE'] = int(os.getenv("LLM_CACHE_SIZE", "512"))
+app.config['LLM_CACHE_TTL'] = int(os.getenv("LLM_CACHE_TTL", "3600"))
+app.config['LLM_CACHE_PATH'] = os.getenv("LLM_CACHE_PATH", "")
+# Itinerary generation runs in a background pool: number of worker threads, how many
+# jobs may wait before new ones are refused, and after how many seconds a job left
+# 'running' by a dead worker is picked up again
+app.config['PLAN_WORKERS'] = int(os.getenv("PLAN_WORKERS", "4"))
+app.config['PLAN_MAX_PENDING'] = int(os.getenv("PLAN_MAX_PENDING", "100"))
+app.config['PLAN_JOB_STALE'] = int(os.getenv("PLAN_JOB_STALE", "600"))
+# Longest trip, in days, the planner accepts
+app.config['MAX_TRIP_DAYS'] = int(os.getenv("MAX_TRIP_DAYS", "30"))
+# Most islands one trip may visit; the route is planned while the request waits
+app.config['MAX_TRIP_DESTINATIONS'] = int(os.getenv("MAX_TRIP_DESTINATIONS", "15"))
+# Year shown in popularity rankings (empty = last complete year with visit data)
+app.config['VISIT_STATS_YEAR'] = int(os.getenv("VISIT_STATS_YEAR") or 0) or None
+# Seconds the admin report aggregates are reused before being recomputed
+app.config['REPORT_CACHE_TTL'] = int(os.getenv("REPORT_CACHE_TTL", "60"))
+# Rows per page on paginated listings (?per_page= may override, up to PAGE_SIZE_MAX)
+app.config['PAGE_SIZE'] = int(os.getenv("PAGE_SIZE", "25"))
+app.config['PAGE_SIZE_MAX'] = int(os.getenv("PAGE_SIZE_MAX", "200"))
+# Requests slower than this many milliseconds are logged with their SQL (0 = off)
+app.config['SLOW_REQUEST_MS'] = int(os.getenv("SLOW_REQUEST_MS", "0"))
+# Bearer token for scraping /metrics (admins can also read it from a session;
+# empty = admins only)
+app.config['METRICS_TOKEN'] = os.getenv("METRICS_TOKEN", "")
+# Bearer token for POST /api/visits/ingest (admins can also post from a session)
+app.config['VISIT_INGEST_TOKEN'] = os.getenv("VISIT_INGEST_TOKEN", "")
+# Buffered visit counts are written out this often, or sooner once the buffer
+# holds VISIT_INGEST_FLUSH_KEYS (island, week) pairs; past VISIT_INGEST_MAX_KEYS
+# new pairs are refused with 503 until a flush catches up
+app.config['VISIT_INGEST_FLUSH_SECONDS'] = float(os.getenv("VISIT_INGEST_FLUSH_SECONDS", "5"))
+app.config['VISIT_INGEST_FLUSH_KEYS'] = int(os.getenv("VISIT_INGEST_FLUSH_KEYS", "10000"))
+app.config['VISIT_INGEST_MAX_KEYS'] = int(os.getenv("VISIT_INGEST_MAX_KEYS", "100000"))
+app.config['VISIT_INGEST_MAX_ITEMS'] = int(os.getenv("VISIT_INGEST_MAX_ITEMS", "5000"))
+# Password hashing method in werkzeug syntax; stored hashes made with other
+# parameters are upgraded on the next successful login
+app.config['PASSWORD_HASH_METHOD'] = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# Threads that hash/verify passwords, how many checks may wait for one before
+# logins are turned away, and seconds a login waits for its check
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv("PASSWORD_HASH_WORKERS") or os.cpu_count() or 2)
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
 db = SQLAlchemy(app)
 
 # ========== MODELS (MATCHING SQL SCHEMA) ==========
@@ -41,6 +144,17 @@ class User(db.Model):
     role = db.Column(db.String(20), default='user')  # 👈 ADD THIS
 
 
+def parse_map_coordinates(value):
+    """'16.1622,120.3621' -> (16.1622, 120.3621); (None, None) if missing or malformed."""
+    if value:
+        try:
+            lat, lng = (float(part.strip()) for part in value.split(','))
+            return lat, lng
+        except ValueError:
+            pass
+    return None, None
+
+
 class Island(db.Model):
     __tablename__ = 'islands'
     id = db.Column('island_id', db.Integer, primary_key=True)
@@ -52,36 +166,29 @@ class Island(db.Model):
     region = db.Column(db.String(100))
     history = db.Column(db.Text) 
     map_coordinates = db.Column(db.String(255))
-    
-    @property
-    def latitude(self):
-        if self.map_coordinates:
-            try:
-                return float(self.map_coordinates.split(',')[0].strip())
-            except:
-                return None
-        return None
-    
-    @property
-    def longitude(self):
-        if self.map_coordinates:
-            try:
-                return float(self.map_coordinates.split(',')[1].strip())
-            except:
-                return None
-        return None
+    # Parsed from map_coordinates ("lat,lng") whenever it is set; see ensure_coordinate_columns()
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+
+    @validates('map_coordinates')
+    def _sync_coordinates(self, key, value):
+        self.latitude, self.longitude = parse_map_coordinates(value)
+        return value
 
     @property
     def details(self):
         return self.history
 
 
+ESTABLISHMENT_TYPES = ('hotel', 'bar', 'restaurant')
+
+
 class Establishment(db.Model):
     __tablename__ = 'establishments'
 
     establishment_id = db.Column('establishment_id', db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
-    type = db.Column(db.Enum('hotel','bar','restaurant'), nullable=False)
+    type = db.Column(db.Enum(*ESTABLISHMENT_TYPES), nullable=False)
     island_id = db.Column(db.Integer, db.ForeignKey('islands.island_id'))
     location = db.Column(db.String(255))
     contact_number = db.Column(db.String(50))
@@ -90,14 +197,22 @@ class Establishment(db.Model):
     rating = db.Column(db.Float)
     establishments_image = db.Column(db.String(255), nullable=False)
     official_website = db.Column(db.String(255))
+    # Max guests per night across all bookings; NULL means no limit
+    capacity = db.Column(db.Integer)
     
 
     owner_id = db.Column(db.Integer, db.ForeignKey('users.user_id'))
     is_approved = db.Column(db.Boolean, default=False)
     rejected_reason = db.Column(db.String(255))
 
-    created_at = db.Column(db.DateTime)
-    updated_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Drives Last-Modified on the place page, so every ORM and Core update bumps it
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Type matches in search_establishments() (ENUMs cannot be in the FULLTEXT index)
+        db.Index('ix_establishments_type', 'type'),
+    )
 
     @property
     def category(self):
@@ -118,8 +233,37 @@ class Visit(db.Model):
     total_visits = db.Column('total_visit', db.Integer, nullable=False)
     island = db.relationship('Island', backref='visits')
 
+    __table_args__ = (
+        # One row per island and week; bulk imports and visit ingestion upsert on it
+        db.Index('ix_visits_island_week', 'island_id', 'visit_week', unique=True),
+    )
+
+
+class VisitRollup(db.Model):
+    """Per-island visit totals per month and per year, kept in step with `visits`."""
+    __tablename__ = 'visit_rollups'
+    island_id = db.Column(db.Integer, db.ForeignKey('islands.island_id'), primary_key=True)
+    period = db.Column(db.String(5), primary_key=True)  # 'month' or 'year'
+    period_start = db.Column(db.Date, primary_key=True)
+    total_visits = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_visit_rollups_period', 'period', 'period_start', 'total_visits'),
+    )
+
 from datetime import datetime
 
+class Activity(db.Model):
+    __tablename__ = 'activities'
+    activity_id = db.Column(db.Integer, primary_key=True)
+    island_id = db.Column(db.Integer, db.ForeignKey('islands.island_id'))
+    name = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.Text)
+    price = db.Column(db.Float)
+    created_datetime_id = db.Column(db.Integer)
+    updated_datetime_id = db.Column(db.Integer)
+
+
 class Booking(db.Model):
     __tablename__ = "bookings"
 
@@ -135,16 +279,1127 @@ class Booking(db.Model):
     status = db.Column(db.String(20), default="pending")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Backs the overlap queries in the availability engine
+        db.Index('ix_bookings_availability', 'establishment_id', 'check_in_date', 'check_out_date'),
+    )
+
+
+class TripPlanJob(db.Model):
+    __tablename__ = "trip_plan_jobs"
+
+    job_id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), nullable=False)
+    # Hash of the prompt, used to dedupe identical pending requests per user
+    dedupe_key = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(20), default="pending")  # pending, running, done, failed
+
+    destination = db.Column(db.String(1000))
+    days = db.Column(db.Integer, nullable=False)
+    people = db.Column(db.Integer, nullable=False)
+    budget = db.Column(db.Float, nullable=False)
+    prompt = db.Column(db.Text, nullable=False)
+
+    itinerary = db.Column(db.Text)
+    error = db.Column(db.String(1000))
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+
+
+# ========== VISIT ROLLUPS ==========
+# Reports and rankings read visit_rollups instead of summing the ever-growing weekly
+# `visits` table. ORM writes to Visit update the rollups in the same flush; bulk
+# writers that bypass the ORM call apply_visit_delta(s)() themselves, and
+# `flask rebuild-visit-rollups` recomputes everything from scratch.
+
+_rollups = VisitRollup.__table__
+
+
+def _upsert_rollups(connection, rows):
+    """Add each row's total_visits to its (island_id, period, period_start) rollup,
+    creating it if missing. Done in one statement (ON CONFLICT / ON DUPLICATE KEY on
+    the primary key), so concurrent writers never lose an increment."""
+    dialect = connection.dialect.name
+    if dialect == "mysql":
+        statement = mysql.insert(_rollups)
+        statement = statement.on_duplicate_key_update(
+            total_visits=_rollups.c.total_visits + statement.inserted.total_visits
+        )
+    elif dialect in ("sqlite", "postgresql"):
+        statement = (sqlite if dialect == "sqlite" else postgresql).insert(_rollups)
+        statement = statement.on_conflict_do_update(
+            index_elements=["island_id", "period", "period_start"],
+            set_={"total_visits": _rollups.c.total_visits + statement.excluded.total_visits},
+        )
+    else:
+        for row in rows:
+            key = (
+                (_rollups.c.island_id == row["island_id"]) &
+                (_rollups.c.period == row["period"]) &
+                (_rollups.c.period_start == row["period_start"])
+            )
+            result = connection.execute(
+                _rollups.update().where(key).values(total_visits=_rollups.c.total_visits + row["total_visits"])
+            )
+            if result.rowcount == 0:
+                connection.execute(_rollups.insert().values(**row))
+        return
+    if rows:
+        connection.execute(statement, rows)
+
+
+def _add_to_rollup(connection, island_id, period, period_start, delta):
+    if delta:
+        _upsert_rollups(connection, [{"island_id": island_id, "period": period,
+                                      "period_start": period_start, "total_visits": delta}])
+
+
+def apply_visit_delta(connection, island_id, visit_month, visit_year, delta):
+    """Add `delta` visits for an island to its month and year rollups."""
+    _add_to_rollup(connection, island_id, 'month', visit_month, delta)
+    _add_to_rollup(connection, island_id, 'year', visit_year, delta)
+
+
+def apply_visit_deltas(connection, deltas):
+    """Set-based apply_visit_delta() for many rows at once.
+
+    `deltas` maps (island_id, visit_month, visit_year) -> delta. Costs a single
+    executemany upsert covering both periods.
+    """
+    totals = {}
+    for (island_id, visit_month, visit_year), delta in deltas.items():
+        if delta:
+            for key in ((island_id, 'month', visit_month), (island_id, 'year', visit_year)):
+                totals[key] = totals.get(key, 0) + delta
+    _upsert_rollups(connection, [
+        {"island_id": island_id, "period": period, "period_start": start, "total_visits": delta}
+        for (island_id, period, start), delta in totals.items() if delta
+    ])
+
+
+def _previous_value(state, attr):
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, attr)
+
+
+@event.listens_for(Visit, "after_insert")
+def _rollup_visit_insert(mapper, connection, target):
+    apply_visit_delta(connection, target.island_id, target.visit_month,
+                      target.visit_year, target.total_visits)
+
+
+@event.listens_for(Visit, "after_update")
+def _rollup_visit_update(mapper, connection, target):
+    state = inspect(target)
+    apply_visit_delta(
+        connection,
+        _previous_value(state, 'island_id'),
+        _previous_value(state, 'visit_month'),
+        _previous_value(state, 'visit_year'),
+        -_previous_value(state, 'total_visits')
+    )
+    apply_visit_delta(connection, target.island_id, target.visit_month,
+                      target.visit_year, target.total_visits)
+
+
+@event.listens_for(Visit, "after_delete")
+def _rollup_visit_delete(mapper, connection, target):
+    apply_visit_delta(connection, target.island_id, target.visit_month,
+                      target.visit_year, -target.total_visits)
+
+
+def rebuild_visit_rollups():
+    """Recompute every rollup row from the raw visits table."""
+    VisitRollup.query.delete()
+    for period, column in [('month', Visit.visit_month), ('year', Visit.visit_year)]:
+        totals = db.session.query(
+            Visit.island_id, column, func.sum(Visit.total_visits)
+        ).group_by(Visit.island_id, column).all()
+        if totals:
+            db.session.execute(_rollups.insert(), [
+                {"island_id": island_id, "period": period, "period_start": start, "total_visits": int(total)}
+                for island_id, start, total in totals
+            ])
+    db.session.commit()
+
+
+@app.cli.command("rebuild-visit-rollups")
+def rebuild_visit_rollups_command():
+    """Recompute visit_rollups from the visits table."""
+    rebuild_visit_rollups()
+    print(f"✅ Rebuilt {VisitRollup.query.count()} visit rollup rows.")
+
+
+def stats_year_filter():
+    """Condition selecting the annual rollups used for popularity rankings:
+    VISIT_STATS_YEAR if configured, otherwise the last complete year with data
+    (the current year only counts until one exists, so rankings do not collapse
+    to a few early counts every January)."""
+    if app.config.get('VISIT_STATS_YEAR'):
+        return VisitRollup.period_start == date(app.config['VISIT_STATS_YEAR'], 1, 1)
+    latest_complete = db.session.query(func.max(VisitRollup.period_start)).filter(
+        VisitRollup.period == 'year', VisitRollup.period_start < date(date.today().year, 1, 1)
+    ).scalar_subquery()
+    latest_any = db.session.query(func.max(VisitRollup.period_start))\
+        .filter(VisitRollup.period == 'year').scalar_subquery()
+    return VisitRollup.period_start == func.coalesce(latest_complete, latest_any)
+
+
+# ========== COORDINATES ==========
+
+def ensure_coordinate_columns():
+    """Migration: add islands.latitude/longitude if missing and backfill them
+    from map_coordinates for rows that have not been parsed yet."""
+    columns = {c["name"] for c in inspect(db.engine).get_columns("islands")}
+    for column in ("latitude", "longitude"):
+        if column not in columns:
+            db.session.execute(text(f"ALTER TABLE islands ADD COLUMN {column} FLOAT"))
+    db.session.commit()
+
+    rows = db.session.execute(text(
+        "SELECT island_id, map_coordinates FROM islands "
+        "WHERE latitude IS NULL AND map_coordinates IS NOT NULL"
+    )).all()
+    updates = []
+    for island_id, map_coordinates in rows:
+        lat, lng = parse_map_coordinates(map_coordinates)
+        if lat is not None:
+            updates.append({"id": island_id, "lat": lat, "lng": lng})
+    if updates:
+        db.session.execute(text(
+            "UPDATE islands SET latitude = :lat, longitude = :lng WHERE island_id = :id"
+        ), updates)
+    db.session.commit()
+    return len(updates)
+
+
+@app.cli.command("backfill-coordinates")
+def backfill_coordinates_command():
+    """Add and fill the numeric island coordinate columns."""
+    print(f"✅ Backfilled coordinates for {ensure_coordinate_columns()} islands.")
+
+
+# ========== BOOKING AVAILABILITY ==========
+# A booking occupies the nights [check_in, check_out); without a check-out date it
+# is one night. Overlaps are found with one range query on
+# ix_bookings_availability, then a sweep over the few rows it returns gives the
+# guests per night, which must stay within Establishment.capacity. Routes that
+# write bookings go through reserve_capacity(), which locks the establishment row
+# first, so concurrent bookings for one place are checked and saved one at a time.
+
+BOOKING_INACTIVE_STATUSES = ("cancelled",)
+
+
+def ensure_booking_columns():
+    """Migration: add establishments.capacity and the availability index if missing."""
+    inspector = inspect(db.engine)
+    if "capacity" not in {c["name"] for c in inspector.get_columns("establishments")}:
+        db.session.execute(text("ALTER TABLE establishments ADD COLUMN capacity INTEGER"))
+    if "ix_bookings_availability" not in {i["name"] for i in inspector.get_indexes("bookings")}:
+        db.session.execute(text(
+            "CREATE INDEX ix_bookings_availability ON bookings "
+            "(establishment_id, check_in_date, check_out_date)"
+        ))
+    db.session.commit()
+
+
+def _booking_end(check_in, check_out):
+    return check_out if check_out and check_out > check_in else check_in + timedelta(days=1)
+
+
+def overlapping_bookings(establishment_id, start, end, exclude_booking_id=None):
+    """(check_in, check_out, guests) of active bookings sharing a night with [start, end)."""
+    query = db.session.query(Booking.check_in_date, Booking.check_out_date, Booking.guests).filter(
+        Booking.establishment_id == establishment_id,
+        Booking.check_in_date < end,
+        # Open-ended bookings only cover their check-in night, which is >= start
+        # exactly when check_in_date >= start; the index range above bounds the scan
+        db.or_(Booking.check_out_date > start,
+               db.and_(Booking.check_out_date.is_(None), Booking.check_in_date >= start)),
+        Booking.status.notin_(BOOKING_INACTIVE_STATUSES)
+    )
+    if exclude_booking_id is not None:
+        query = query.filter(Booking.booking_id != exclude_booking_id)
+    return query.all()
+
+
+def nightly_occupancy(bookings, start, end):
+    """{night: guests} for every night in [start, end), via a difference array sweep."""
+    nights = (end - start).days
+    deltas = [0] * (nights + 1)
+    for check_in, check_out, guests in bookings:
+        first = max((check_in - start).days, 0)
+        last = min((_booking_end(check_in, check_out) - start).days, nights)
+        if first < last:
+            deltas[first] += guests or 0
+            deltas[last] -= guests or 0
+    occupancy = {}
+    running = 0
+    for offset in range(nights):
+        running += deltas[offset]
+        occupancy[start + timedelta(days=offset)] = running
+    return occupancy
+
+
+def check_availability(establishment, check_in, check_out, guests, exclude_booking_id=None):
+    """None if the stay fits, otherwise a message explaining why it does not."""
+    end = _booking_end(check_in, check_out)
+    if check_out and check_out <= check_in:
+        return "Check-out must be after check-in."
+    if guests < 1:
+        return "At least one guest is required."
+    if establishment.capacity is None:
+        return None
+    if guests > establishment.capacity:
+        return f"{establishment.name} can host at most {establishment.capacity} guests."
+
+    occupancy = nightly_occupancy(
+        overlapping_bookings(establishment.id, check_in, end, exclude_booking_id), check_in, end
+    )
+    full = [night for night, booked in occupancy.items() if booked + guests > establishment.capacity]
+    if full:
+        return f"Not enough space on {full[0].strftime('%b %d, %Y')}" + (
+            f" and {len(full) - 1} other night(s)." if len(full) > 1 else "."
+        )
+    return None
+
+
+def lock_establishment(establishment):
+    """Lock `establishment`'s row until the current transaction ends, and reload it."""
+    if db.engine.dialect.name == "sqlite":
+        # SQLite has no row locks (and pysqlite only opens a transaction on the first
+        # write). A write statement that matches no rows still takes the database
+        # write lock for this transaction, without firing the FTS triggers.
+        db.session.execute(text("UPDATE establishments SET establishment_id = establishment_id WHERE 1 = 0"))
+        db.session.refresh(establishment)
+    else:
+        db.session.refresh(establishment, with_for_update=True)
+
+
+def parse_capacity(value):
+    """Capacity from a form field: None when blank (no limit), else a whole number >= 1."""
+    if value is None or not value.strip():
+        return None
+    capacity = int(value)
+    if capacity < 1:
+        raise ValueError(value)
+    return capacity
+
+
+def reserve_capacity(establishment, check_in, check_out, guests, exclude_booking_id=None):
+    """check_availability() under a lock on the establishment row.
+
+    On None the caller writes the booking and commits in the same transaction; on
+    a problem the transaction is rolled back here, releasing the lock.
+    """
+    lock_establishment(establishment)
+    problem = check_availability(establishment, check_in, check_out, guests, exclude_booking_id)
+    if problem:
+        db.session.rollback()
+    return problem
+
+
+# ========== FULL-TEXT SEARCH ==========
+# Chatbot retrieval goes through a real text index instead of ILIKE '%message%':
+# MySQL FULLTEXT indexes or SQLite FTS5 tables, picked from the DATABASE_URI dialect.
+# Other backends fall back to per-token ILIKE so the app still works.
+
+SEARCH_STOPWORDS = {
+    "the", "and", "for", "are", "you", "what", "which", "where", "when", "how",
+    "can", "with", "about", "there", "best", "any", "some", "tell", "want",
+    "like", "near", "from", "that", "this", "have", "island", "islands", "place",
+    "places", "please", "recommend", "show", "good", "visit", "our", "your",
+}
+
+MYSQL_FULLTEXT_INDEXES = {
+    # ENUM columns cannot be part of a FULLTEXT index, so establishment type is
+    # matched by a separate query on ix_establishments_type in search_establishments()
+    "ft_islands": ("islands", "name, description, history"),
+    "ft_establishments": ("establishments", "name, description"),
+}
+
+SQLITE_FTS_TABLES = {
+    "islands_fts": ("islands", "island_id", ["name", "description", "history"]),
+    "establishments_fts": ("establishments", "establishment_id", ["name", "type", "description"]),
+}
+
+
+def search_tokens(message, limit=12):
+    """Lower-cased, de-duplicated keywords from a chat message."""
+    tokens = []
+    for word in re.findall(r"\w+", message.lower()):
+        if len(word) < 3 or word in SEARCH_STOPWORDS or word in tokens:
+            continue
+        tokens.append(word)
+    return tokens[:limit]
+
+
+def ensure_search_index():
+    """Create the text index for the current database if it does not exist yet."""
+    dialect = db.engine.dialect.name
+    if "ix_establishments_type" not in {i["name"] for i in inspect(db.engine).get_indexes("establishments")}:
+        db.session.execute(text("CREATE INDEX ix_establishments_type ON establishments (type)"))
+        db.session.commit()
+    if dialect == "mysql":
+        for index_name, (table, columns) in MYSQL_FULLTEXT_INDEXES.items():
+            exists = db.session.execute(text(
+                "SELECT COUNT(*) FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = :t AND index_name = :i"
+            ), {"t": table, "i": index_name}).scalar()
+            if not exists:
+                db.session.execute(text(f"ALTER TABLE {table} ADD FULLTEXT INDEX {index_name} ({columns})"))
+        db.session.commit()
+    elif dialect == "sqlite":
+        for fts, (table, pk, columns) in SQLITE_FTS_TABLES.items():
+            exists = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"
+            ), {"n": fts}).first()
+            if exists:
+                continue
+            cols = ", ".join(columns)
+            new_cols = ", ".join(f"new.{c}" for c in columns)
+            old_cols = ", ".join(f"old.{c}" for c in columns)
+            db.session.execute(text(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='{pk}')"
+            ))
+            # External-content FTS tables are kept in sync by triggers
+            db.session.execute(text(
+                f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{pk}, {new_cols}); END"
+            ))
+            db.session.execute(text(
+                f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{pk}, {old_cols}); END"
+            ))
+            db.session.execute(text(
+                f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{pk}, {old_cols}); "
+                f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{pk}, {new_cols}); END"
+            ))
+            db.session.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        db.session.commit()
+
+
+def _search_ids(fts, mysql_sql, like_columns, model_pk, tokens, limit):
+    """Ids of the best matching rows, most relevant first."""
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        match = " OR ".join(f'"{t}"' for t in tokens)
+        rows = db.session.execute(text(
+            f"SELECT rowid FROM {fts} WHERE {fts} MATCH :q ORDER BY bm25({fts}) LIMIT :k"
+        ), {"q": match, "k": limit})
+    elif dialect == "mysql":
+        rows = db.session.execute(mysql_sql if isinstance(mysql_sql, TextClause) else text(mysql_sql), {
+            "q": " ".join(tokens), "types": search_types(tokens), "k": limit
+        })
+    else:
+        conditions = [col.ilike(f"%{t}%") for t in tokens for col in like_columns]
+        rows = db.session.query(model_pk).filter(db.or_(*conditions)).limit(limit)
+    return [row[0] for row in rows]
+
+
+def search_types(tokens):
+    """Establishment types named in the tokens ('hotel' or 'hotels')."""
+    return [t for t in ESTABLISHMENT_TYPES if t in tokens or f"{t}s" in tokens]
+
+
+# Text matches (scored by relevance, +1 when the type also matches) and type-only
+# matches are separate queries so each uses its own index; an OR across the two in
+# one WHERE would make MySQL scan the whole table
+MYSQL_ESTABLISHMENT_SEARCH = text(
+    "SELECT establishment_id, MAX(score) AS score FROM ("
+    " (SELECT establishment_id, MATCH(name, description) AGAINST (:q IN NATURAL LANGUAGE MODE)"
+    "  + IF(type IN :types, 1, 0) AS score"
+    "  FROM establishments WHERE MATCH(name, description) AGAINST (:q IN NATURAL LANGUAGE MODE)"
+    "  ORDER BY score DESC LIMIT :k)"
+    " UNION ALL"
+    " (SELECT establishment_id, 1 AS score FROM establishments WHERE type IN :types LIMIT :k)"
+    ") AS matches GROUP BY establishment_id ORDER BY score DESC LIMIT :k"
+).bindparams(bindparam("types", expanding=True, type_=db.String()))
+MYSQL_ESTABLISHMENT_TEXT_SEARCH = text(
+    "SELECT establishment_id, MATCH(name, description) AGAINST (:q IN NATURAL LANGUAGE MODE) AS score "
+    "FROM establishments WHERE MATCH(name, description) AGAINST (:q IN NATURAL LANGUAGE MODE) "
+    "ORDER BY score DESC LIMIT :k"
+)
+
+
+def search_islands(message, limit=None):
+    """Relevance-ranked islands for a chat message (at most `limit`)."""
+    tokens = search_tokens(message)
+    if not tokens:
+        return []
+    ids = _search_ids(
+        "islands_fts",
+        "SELECT island_id, MATCH(name, description, history) AGAINST (:q IN NATURAL LANGUAGE MODE) AS score "
+        "FROM islands WHERE MATCH(name, description, history) AGAINST (:q IN NATURAL LANGUAGE MODE) "
+        "ORDER BY score DESC LIMIT :k",
+        [Island.name, Island.description, Island.history], Island.id,
+        tokens, limit or app.config['SEARCH_TOP_K'],
+    )
+    by_id = get_catalog().islands_by_id
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def search_establishments(message, limit=None):
+    """Relevance-ranked establishments for a chat message (at most `limit`)."""
+    tokens = search_tokens(message)
+    if not tokens:
+        return []
+    ids = _search_ids(
+        "establishments_fts",
+        # An empty IN () list is not valid SQL, so skip the type query when no type is named
+        MYSQL_ESTABLISHMENT_SEARCH if search_types(tokens) else MYSQL_ESTABLISHMENT_TEXT_SEARCH,
+        [Establishment.name, Establishment.type, Establishment.description],
+        Establishment.establishment_id, tokens, limit or app.config['SEARCH_TOP_K'],
+    )
+    by_id = get_catalog().establishments_by_id
+    return [by_id[i] for i in ids if i in by_id]
+
+
+# ========== BULK IMPORT / EXPORT ==========
+# `flask data import ENTITY FILE` streams CSV or JSONL into islands, establishments
+# or visits in fixed-size batches, one commit per batch, so memory stays flat however
+# large the file is. Rows are upserted on natural keys: islands by name,
+# establishments by (name, island), visits by (island, visit_week). Only columns
+# present in the file are written on update. Islands are referenced by `island_id`
+# or by `island` (name). `flask data export ENTITY FILE` writes the same format.
+
+BULK_MODELS = {"islands": Island, "establishments": Establishment, "visits": Visit}
+# Model attribute -> table column, so batches can be written with Core executemany
+BULK_COLUMNS = {
+    entity: {attr.key: attr.columns[0] for attr in model.__mapper__.column_attrs}
+    for entity, model in BULK_MODELS.items()
+}
+BULK_PROGRESS_SECONDS = 1.0
+BULK_MAX_ERRORS_SHOWN = 10
+
+
+class BulkRowError(ValueError):
+    """A row that cannot be imported; it is skipped and reported."""
+
+
+def _bulk_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _bulk_bool(value):
+    return value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes", "y")
+
+
+def _bulk_choice(*choices):
+    def convert(value):
+        if value not in choices:
+            raise BulkRowError(f"must be one of {', '.join(choices)}")
+        return value
+    return convert
+
+
+def _bulk_number(convert, minimum=None, maximum=None):
+    def check(value):
+        number = convert(value)
+        if isinstance(value, bool) or not math.isfinite(number) \
+                or (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+            raise ValueError(value)
+        return number
+    return check
+
+
+# Columns accepted on import (and written on export) per entity, with converters that
+# apply the same rules as the owner forms (type from the enum, capacity of at least 1)
+BULK_FIELDS = {
+    "islands": {"name": str, "image": str, "description": str, "location": str,
+                "region": str, "history": str, "map_coordinates": str},
+    "establishments": {"name": str, "type": _bulk_choice(*ESTABLISHMENT_TYPES), "location": str,
+                       "contact_number": str, "opening_hours": str, "description": str,
+                       "rating": _bulk_number(float, 0, 5), "establishments_image": str,
+                       "official_website": str, "capacity": _bulk_number(int, 1),
+                       "owner_id": int, "is_approved": _bulk_bool},
+    "visits": {"visit_week": _bulk_date, "visit_month": _bulk_date, "visit_year": _bulk_date,
+               "total_visits": _bulk_number(int, 0)},
+}
+# Values for NOT NULL columns when a new row does not provide them
+BULK_INSERT_DEFAULTS = {
+    "islands": {"image": ""},
+    "establishments": {"establishments_image": "", "is_approved": False},
+    "visits": {},
+}
+# NOT NULL columns without a default that a new row must provide
+BULK_REQUIRED_ON_INSERT = {"islands": (), "establishments": ("type",), "visits": ()}
+
+
+def ensure_bulk_indexes():
+    """Migration: make (island_id, visit_week) unique, merging duplicate week rows first."""
+    indexes = {i["name"]: i for i in inspect(db.engine).get_indexes("visits")}
+    existing = indexes.get("ix_visits_island_week")
+    if existing and existing["unique"]:
+        return
+    duplicates = db.session.query(
+        Visit.island_id, Visit.visit_week, func.min(Visit.id), func.sum(Visit.total_visits)
+    ).group_by(Visit.island_id, Visit.visit_week).having(func.count() > 1).all()
+    # Rows of the same week share a month and year, so rollups are unchanged
+    for island_id, visit_week, keep_id, total in duplicates:
+        db.session.execute(update(Visit).where(Visit.id == keep_id).values(total_visits=total))
+        db.session.execute(delete(Visit).where(
+            Visit.island_id == island_id, Visit.visit_week == visit_week, Visit.id != keep_id
+        ))
+    index = next(i for i in Visit.__table__.indexes if i.name == "ix_visits_island_week")
+    connection = db.session.connection()
+    if existing:
+        index.drop(connection)
+    index.create(connection)
+    db.session.commit()
+
+
+def _bulk_format(path, fmt):
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    raise click.UsageError("Cannot tell the format from the file name; pass --format csv or jsonl.")
+
+
+def _open_bulk_file(path, mode):
+    if path == "-":
+        return nullcontext(sys.stdin if mode == "r" else sys.stdout)
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _read_bulk_rows(stream, fmt):
+    """Yield (row, None) per input row, or (None, error) for an unreadable line."""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield row, None
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line), None
+            except ValueError as e:
+                yield None, f"line {line_number}: {e}"
+
+
+def _bulk_references(entity):
+    """Names and ids that imported rows may refer to, loaded once per import."""
+    if entity == "islands":
+        return {}
+    island_ids_by_name = {name: island_id for island_id, name in db.session.query(Island.id, Island.name)}
+    references = {"island_ids_by_name": island_ids_by_name, "island_ids": set(island_ids_by_name.values())}
+    if entity == "establishments":
+        references["user_ids"] = {user_id for (user_id,) in db.session.query(User.id)}
+    return references
+
+
+def _clean_bulk_row(entity, raw, references):
+    """Convert one input row to model attributes, resolving and checking references."""
+    if not isinstance(raw, dict):
+        raise BulkRowError("not an object")
+    columns = BULK_COLUMNS[entity]
+    row = {}
+    for field, convert in BULK_FIELDS[entity].items():
+        if field not in raw:
+            continue
+        value = raw[field]
+        if value is None or value == "":
+            if columns[field].nullable:
+                row[field] = None
+            elif field not in BULK_INSERT_DEFAULTS[entity]:
+                raise BulkRowError(f"{field} cannot be empty")
+            continue
+        try:
+            row[field] = convert(value)
+        except BulkRowError as e:
+            raise BulkRowError(f"bad {field} {value!r}: {e}")
+        except (TypeError, ValueError):
+            raise BulkRowError(f"bad {field} {value!r}")
+        length = getattr(columns[field].type, "length", None)
+        if length and isinstance(row[field], str) and len(row[field]) > length:
+            raise BulkRowError(f"{field} is longer than {length} characters")
+
+    if entity != "islands":
+        island_id = raw.get("island_id")
+        if island_id not in (None, ""):
+            try:
+                row["island_id"] = int(island_id)
+            except (TypeError, ValueError):
+                raise BulkRowError(f"bad island_id {island_id!r}")
+            if row["island_id"] not in references["island_ids"]:
+                raise BulkRowError(f"unknown island_id {island_id!r}")
+        elif raw.get("island"):
+            if raw["island"] not in references["island_ids_by_name"]:
+                raise BulkRowError(f"unknown island {raw['island']!r}")
+            row["island_id"] = references["island_ids_by_name"][raw["island"]]
+    if row.get("owner_id") is not None and row["owner_id"] not in references["user_ids"]:
+        raise BulkRowError(f"unknown owner_id {row['owner_id']!r}")
+
+    if not row.get("name") and entity != "visits":
+        raise BulkRowError("missing name")
+    if entity == "islands" and "map_coordinates" in row:
+        row["latitude"], row["longitude"] = parse_map_coordinates(row["map_coordinates"])
+    if entity == "visits":
+        if not row.get("island_id") or not row.get("visit_week") or row.get("total_visits") is None:
+            raise BulkRowError("visits need island_id (or island), visit_week and total_visits")
+        row["visit_month"] = row.get("visit_month") or row["visit_week"].replace(day=1)
+        row["visit_year"] = row.get("visit_year") or row["visit_week"].replace(month=1, day=1)
+    return row
+
+
+def _bulk_key(entity, row):
+    if entity == "islands":
+        return row["name"]
+    if entity == "establishments":
+        return (row["name"], row.get("island_id"))
+    return (row["island_id"], row["visit_week"])
+
+
+def _existing_rows(connection, entity, keys):
+    """Map natural key -> existing row for the keys of one batch (one query)."""
+    c = BULK_COLUMNS[entity]
+    if entity == "islands":
+        found = connection.execute(select(c["id"], c["name"]).where(c["name"].in_(keys)))
+        return {name: {"id": island_id} for island_id, name in found}
+    if entity == "establishments":
+        # NULL never equals NULL, so places without an island are matched separately
+        with_island = [key for key in keys if key[1] is not None]
+        without_island = [name for name, island_id in keys if island_id is None]
+        found = []
+        if with_island:
+            found += connection.execute(
+                select(c["establishment_id"], c["name"], c["island_id"])
+                .where(tuple_(c["name"], c["island_id"]).in_(with_island))
+            ).all()
+        if without_island:
+            found += connection.execute(
+                select(c["establishment_id"], c["name"], c["island_id"])
+                .where(c["name"].in_(without_island), c["island_id"].is_(None))
+            ).all()
+        return {(name, island_id): {"establishment_id": pk} for pk, name, island_id in found}
+    found = connection.execute(
+        select(c["id"], c["island_id"], c["visit_week"], c["visit_month"], c["visit_year"], c["total_visits"])
+        .where(tuple_(c["island_id"], c["visit_week"]).in_(keys))
+    )
+    return {(island_id, week): {"id": pk, "visit_month": month, "visit_year": year, "total_visits": total}
+            for pk, island_id, week, month, year, total in found}
+
+
+def _bulk_execute(connection, entity, rows, pk=None):
+    """executemany INSERT, or UPDATE by primary key `pk`, grouping rows by the columns they set."""
+    columns = BULK_COLUMNS[entity]
+    table = BULK_MODELS[entity].__table__
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(k for k in row if k != pk)), []).append(row)
+    for keys, group in groups.items():
+        if pk is None:
+            connection.execute(table.insert(), [{columns[k].name: row[k] for k in keys} for row in group])
+        else:
+            statement = table.update().where(columns[pk] == bindparam("_pk")).values(
+                {columns[k]: bindparam(f"_{k}") for k in keys}
+            )
+            connection.execute(statement, [{"_pk": row[pk], **{f"_{k}": row[k] for k in keys}} for row in group])
+
+
+def upsert_visits(connection, rows, increment=False):
+    """INSERT visit rows (keyed by column name); where the island already has a row
+    for that week, set its total instead, or add to it with `increment`.
+
+    Done in the database (ON CONFLICT / ON DUPLICATE KEY on ix_visits_island_week),
+    so concurrent writers never create a second row for the same week.
+    """
+    table = Visit.__table__
+    dialect = connection.dialect.name
+    if dialect == "mysql":
+        statement = mysql.insert(table)
+        new_total = statement.inserted.total_visit
+        statement = statement.on_duplicate_key_update(
+            total_visit=table.c.total_visit + new_total if increment else new_total
+        )
+    elif dialect in ("sqlite", "postgresql"):
+        statement = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+        new_total = statement.excluded.total_visit
+        statement = statement.on_conflict_do_update(
+            index_elements=["island_id", "visit_week"],
+            set_={"total_visit": table.c.total_visit + new_total if increment else new_total},
+        )
+    else:
+        statement = table.insert()
+    if rows:
+        connection.execute(statement, rows)
+
+
+def _write_bulk_batch(entity, batch, apply_rollups):
+    """Upsert one batch (natural key -> row) and commit.
+
+    Returns (inserted, updated, rejected) where `rejected` maps the key of each
+    new row that lacks a required column to the reason it was not written.
+    """
+    pk = "establishment_id" if entity == "establishments" else "id"
+    connection = db.session.connection()
+    existing = _existing_rows(connection, entity, list(batch))
+    inserts, updates = [], []
+    rejected = {}
+    rollup_deltas = {}
+
+    for key, row in batch.items():
+        old = existing.get(key)
+        if old is None:
+            missing = [f for f in BULK_REQUIRED_ON_INSERT[entity] if row.get(f) is None]
+            if missing:
+                rejected[key] = f"new rows need {', '.join(missing)}"
+                continue
+            inserts.append({**BULK_INSERT_DEFAULTS[entity], **row})
+        else:
+            updates.append({**row, pk: old[pk]})
+        if entity == "visits" and apply_rollups:
+            new_key = (row["island_id"], row["visit_month"], row["visit_year"])
+            rollup_deltas[new_key] = rollup_deltas.get(new_key, 0) + row["total_visits"]
+            if old is not None:
+                old_key = (row["island_id"], old["visit_month"], old["visit_year"])
+                rollup_deltas[old_key] = rollup_deltas.get(old_key, 0) - old["total_visits"]
+
+    if entity == "visits":
+        # A row another writer added since the lookup is overwritten, not duplicated
+        columns = BULK_COLUMNS["visits"]
+        upsert_visits(connection, [{columns[k].name: v for k, v in row.items()} for row in inserts])
+    else:
+        _bulk_execute(connection, entity, inserts)
+    _bulk_execute(connection, entity, updates, pk)
+    if rollup_deltas:
+        apply_visit_deltas(connection, rollup_deltas)
+    db.session.commit()
+    return len(inserts), len(updates), rejected
+
+
+data_cli = AppGroup("data", help="Bulk import/export of islands, establishments and visits.")
+app.cli.add_command(data_cli)
+
+
+@data_cli.command("import")
+@click.argument("entity", type=click.Choice(list(BULK_MODELS)))
+@click.argument("path", type=click.Path(dir_okay=False, allow_dash=True))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="Default: from the file extension.")
+@click.option("--batch-size", default=5000, show_default=True, help="Rows per batch and commit.")
+@click.option("--rebuild-rollups/--incremental-rollups", default=None,
+              help="Visits only: recompute visit_rollups once at the end instead of per batch "
+                   "(default: rebuild when the visits table started empty).")
+def import_data_command(entity, path, fmt, batch_size, rebuild_rollups):
+    """Upsert ENTITY rows from a CSV or JSONL file ('-' for stdin)."""
+    fmt = _bulk_format(path, fmt)
+    if rebuild_rollups is None:
+        rebuild_rollups = entity == "visits" and not db.session.query(Visit.id).first()
+    references = _bulk_references(entity)
+
+    started = last_report = time.perf_counter()
+    total = inserted = updated = skipped = 0
+    errors = []  # only the first few are kept, so a bad file does not grow memory
+    batch, row_numbers = {}, {}
+
+    def skip(message):
+        nonlocal skipped
+        skipped += 1
+        if len(errors) < BULK_MAX_ERRORS_SHOWN:
+            errors.append(message)
+
+    def flush():
+        nonlocal inserted, updated
+        if batch:
+            new, changed, rejected = _write_bulk_batch(entity, batch, apply_rollups=not rebuild_rollups)
+            inserted += new
+            updated += changed
+            for key, reason in rejected.items():
+                skip(f"row {row_numbers[key]}: {reason}")
+            batch.clear()
+            row_numbers.clear()
+
+    with _open_bulk_file(path, "r") as stream:
+        for number, (raw, problem) in enumerate(_read_bulk_rows(stream, fmt), start=1):
+            total += 1
+            try:
+                if raw is None:
+                    raise BulkRowError(problem)
+                row = _clean_bulk_row(entity, raw, references)
+            except BulkRowError as e:
+                skip(f"row {number}: {e}")
+                continue
+            # A key repeated within a batch keeps its last row
+            key = _bulk_key(entity, row)
+            batch[key] = row
+            row_numbers[key] = number
+            if len(batch) >= batch_size:
+                flush()
+                now = time.perf_counter()
+                if now - last_report >= BULK_PROGRESS_SECONDS:
+                    last_report = now
+                    click.echo(f"  {total:,} rows read, {total / (now - started):,.0f} rows/s", err=True)
+        flush()
+
+    if entity == "visits" and rebuild_rollups:
+        rebuild_visit_rollups()
+    if entity != "visits":
+        invalidate_catalog()
+
+    elapsed = time.perf_counter() - started
+    click.echo(f"✅ {entity}: {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s); "
+               f"{inserted:,} inserted, {updated:,} updated, {skipped:,} skipped.")
+    for error in errors:
+        click.echo(f"  skipped {error}", err=True)
+    if skipped > len(errors):
+        click.echo(f"  ... and {skipped - len(errors):,} more", err=True)
+    if entity != "visits":
+        click.echo(f"Running web workers pick up the changes within CATALOG_TTL "
+                   f"({app.config['CATALOG_TTL']}s) or on restart.", err=True)
+
+
+def _bulk_export_query(entity):
+    if entity == "islands":
+        return select(*(getattr(Island, f).label(f) for f in BULK_FIELDS["islands"])).order_by(Island.id)
+    model = BULK_MODELS[entity]
+    pk = Establishment.establishment_id if entity == "establishments" else Visit.id
+    return select(
+        Island.name.label("island"), model.island_id,
+        *(getattr(model, f).label(f) for f in BULK_FIELDS[entity])
+    ).outerjoin(Island, model.island_id == Island.id).order_by(pk)
+
+
+@data_cli.command("export")
+@click.argument("entity", type=click.Choice(list(BULK_MODELS)))
+@click.argument("path", type=click.Path(dir_okay=False, allow_dash=True))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="Default: from the file extension.")
+@click.option("--batch-size", default=5000, show_default=True, help="Rows fetched from the database at a time.")
+def export_data_command(entity, path, fmt, batch_size):
+    """Write all ENTITY rows to a CSV or JSONL file ('-' for stdout)."""
+    fmt = _bulk_format(path, fmt)
+    query = _bulk_export_query(entity)
+    columns = [c.key for c in query.selected_columns]
+    started = time.perf_counter()
+    total = 0
+
+    with _open_bulk_file(path, "w") as stream:
+        writer = csv.writer(stream) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+        for row in db.session.execute(query.execution_options(yield_per=batch_size)):
+            values = [v.isoformat() if isinstance(v, date) else v for v in row]
+            if writer:
+                writer.writerow(["" if v is None else v for v in values])
+            else:
+                stream.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False) + "\n")
+            total += 1
+
+    elapsed = time.perf_counter() - started
+    click.echo(f"✅ {entity}: exported {total:,} rows in {elapsed:.1f}s "
+               f"({total / max(elapsed, 1e-9):,.0f} rows/s).", err=True)
+
+# ========== VISIT INGESTION ==========
+# Gate counters and boat operators POST visit counts to /api/visits/ingest, many
+# per request. Counts are summed in memory per (island, week) and a background
+# thread writes the buffer out every VISIT_INGEST_FLUSH_SECONDS as one bulk
+# upsert (increment existing visit rows, insert new ones, adjust rollups with
+# apply_visit_deltas), instead of a transaction per counter tick. Each worker
+# process has its own buffer; counts still buffered when a process is killed
+# hard are lost, a clean shutdown flushes them.
 
+VISIT_INGEST_CHUNK = 5000  # (island, week) pairs per lookup/write statement
+
+
+def visit_week_start(day):
+    """Monday of the week containing `day`; visits are stored per week."""
+    return day - timedelta(days=day.weekday())
+
+
+def write_visit_counts(counts):
+    """Add `counts` ((island_id, visit_week) -> visits) to the visits table in one transaction.
+
+    Rows are incremented with upsert_visits(), so flushes from several workers (or an
+    import running alongside) add up instead of creating duplicate week rows.
+    """
+    connection = db.session.connection()
+    keys = list(counts)
+    rollup_deltas = {}
+    try:
+        for start in range(0, len(keys), VISIT_INGEST_CHUNK):
+            chunk = keys[start:start + VISIT_INGEST_CHUNK]
+            # Existing rows keep the month/year they were filed under, for the rollups
+            existing = _existing_rows(connection, "visits", chunk)
+            rows = []
+            for island_id, week in chunk:
+                delta = counts[(island_id, week)]
+                old = existing.get((island_id, week))
+                if old is None:
+                    month, year = week.replace(day=1), week.replace(month=1, day=1)
+                else:
+                    month, year = old["visit_month"], old["visit_year"]
+                rows.append({"island_id": island_id, "visit_week": week, "visit_month": month,
+                             "visit_year": year, "total_visit": delta})
+                rollup_key = (island_id, month, year)
+                rollup_deltas[rollup_key] = rollup_deltas.get(rollup_key, 0) + delta
+            upsert_visits(connection, rows, increment=True)
+        apply_visit_deltas(connection, rollup_deltas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+class VisitIngestBuffer:
+    """Visit counts summed per (island_id, visit_week), waiting to be written."""
+
+    def __init__(self, flush_seconds, flush_keys, max_keys):
+        self.flush_seconds = flush_seconds
+        self.flush_keys = flush_keys
+        self.max_keys = max_keys
+        self.flushed_keys = 0
+        self.failed_flushes = 0
+        self.last_flush = None
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def pending(self):
+        return len(self._counts)
+
+    def add(self, counts):
+        """Buffer (island_id, visit_week, visits) items; False if the buffer is full."""
+        with self._lock:
+            new_keys = {(i, w) for i, w, _ in counts} - self._counts.keys()
+            if len(self._counts) + len(new_keys) > self.max_keys:
+                self._wake.set()
+                return False
+            for island_id, week, visits in counts:
+                self._counts[(island_id, week)] = self._counts.get((island_id, week), 0) + visits
+            if len(self._counts) >= self.flush_keys:
+                self._wake.set()
+        self._start()
+        return True
+
+    def flush(self):
+        """Write out everything buffered so far; returns the number of (island, week) rows."""
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, {}
+            if not counts:
+                return 0
+            try:
+                with app.app_context():
+                    write_visit_counts(counts)
+            except Exception:
+                # Put the counts back so a database hiccup delays them rather than losing them
+                with self._lock:
+                    for key, visits in counts.items():
+                        self._counts[key] = self._counts.get(key, 0) + visits
+                self.failed_flushes += 1
+                raise
+            self.flushed_keys += len(counts)
+            self.last_flush = time.time()
+            return len(counts)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="visit-ingest", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Visit ingest flush failed, will retry: {e}")
+
+
+visit_buffer = VisitIngestBuffer(
+    flush_seconds=app.config['VISIT_INGEST_FLUSH_SECONDS'],
+    flush_keys=app.config['VISIT_INGEST_FLUSH_KEYS'],
+    max_keys=app.config['VISIT_INGEST_MAX_KEYS'],
+)
+
+
+def _parse_visit_count(item, catalog, today):
+    """One posted count -> (island_id, visit_week, visits); raises ValueError if invalid."""
+    if not isinstance(item, dict):
+        raise ValueError("not an object")
+    island_id = item.get("island_id")
+    # bool is a subclass of int, so `true` would otherwise count as island 1
+    if not isinstance(island_id, int) or isinstance(island_id, bool) or island_id not in catalog.islands_by_id:
+        raise ValueError(f"unknown island_id {island_id!r}")
+    visits = item.get("count")
+    if not isinstance(visits, int) or isinstance(visits, bool) or visits < 1:
+        raise ValueError("count must be a positive integer")
+    day = _bulk_date(item["date"]) if item.get("date") else today
+    if day > today:
+        raise ValueError(f"date {day.isoformat()} is in the future")
+    return island_id, visit_week_start(day), visits
+
+
+@app.route("/api/visits/ingest", methods=["POST"])
+def ingest_visits():
+    """Buffer visit counts: {"counts": [{"island_id": 1, "count": 12, "date": "YYYY-MM-DD"}]}.
+
+    `date` defaults to today. Invalid items are reported by index and skipped;
+    the rest are accepted (202) and written on the next flush.
+    """
+    token = app.config['VISIT_INGEST_TOKEN']
+    authorized = (token and request.headers.get("Authorization") == f"Bearer {token}") \
+        or session.get("role") == "admin"
+    if not authorized:
+        return jsonify({"error": "Not authorized."}), 401
+
+    payload = request.get_json(silent=True)
+    items = payload.get("counts") if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        return jsonify({"error": "Expected a JSON list of counts or {\"counts\": [...]}."}), 400
+    if len(items) > app.config['VISIT_INGEST_MAX_ITEMS']:
+        return jsonify({"error": f"At most {app.config['VISIT_INGEST_MAX_ITEMS']} counts per request."}), 413
+
+    catalog = get_catalog()
+    today = date.today()
+    counts, rejected = [], []
+    for index, item in enumerate(items):
+        try:
+            counts.append(_parse_visit_count(item, catalog, today))
+        except (KeyError, TypeError, ValueError) as e:
+            rejected.append({"index": index, "error": str(e)})
 
+    if counts and not visit_buffer.add(counts):
+        response = jsonify({"error": "Ingest buffer is full, retry shortly."})
+        response.headers["Retry-After"] = str(max(1, math.ceil(visit_buffer.flush_seconds)))
+        return response, 503
+    return jsonify({"accepted": len(counts), "rejected": rejected,
+                    "pending": visit_buffer.pending()}), 202
 
 # ========== DATABASE INIT (Updated with new Establishment fields) ==========
-def init_db():
+def create_schema():
+    """Create missing tables and apply the in-place migrations; safe to re-run."""
+    db.create_all()
+    ensure_coordinate_columns()
+    ensure_booking_columns()
+    ensure_bulk_indexes()
+    ensure_search_index()
+
+
+def init_db(seed=True):
     print("Initializing MySQL Database...")
     try:
         with app.app_context():
-            db.create_all() 
+            create_schema()
             print("✅ MySQL tables created or already exist.")
+            if not seed:
+                print("✅ Database OK")
+                return
 
             # --- Island Data ---
             if not Island.query.first():
@@ -174,17 +1429,17 @@ def init_db():
                 sample_establishments = [
                     Establishment(name='Quezon Beach Resort', description='Beachfront resort',
                                         type='hotel', island_id=2, 
-                                        image='quezon_resort.jpg', # NEW FIELD
+                                        establishments_image='quezon_resort.jpg', # NEW FIELD
                                         location='Quezon Island, Alaminos', # NEW FIELD
                                         rating=4.5, opening_hours='24/7'), # NEW FIELD
                     Establishment(name='Imelda Resort', description='Small cozy resort',
                                         type='hotel', island_id=3,
-                                        image='imelda_resort.jpg', # NEW FIELD
+                                        establishments_image='imelda_resort.jpg', # NEW FIELD
                                         location='Imelda Island, Alaminos', # NEW FIELD
                                         rating=4.2, contact_number='09123456789'), # NEW FIELD
                     Establishment(name='Island Bar & Grill', description='Beachside bar and restaurant',
                                         type='bar', island_id=1,
-                                        image='island_bar.jpg', # NEW FIELD
+                                        establishments_image='island_bar.jpg', # NEW FIELD
                                         location='Governor\'s Island, Alaminos', # NEW FIELD
                                         opening_hours='10:00 AM - 10:00 PM', rating=4.0) # NEW FIELD
                 ]
@@ -214,6 +1469,11 @@ def init_db():
                 db.session.add_all(sample_visits)
                 db.session.commit()
                 print("✅ Sample visit data added.")
+
+            # --- Visit Rollups (first run on a database that already has visits) ---
+            if not VisitRollup.query.first() and Visit.query.first():
+                rebuild_visit_rollups()
+                print("✅ Visit rollups built.")
             
         print("✅ Database OK")
     except Exception as e:
@@ -221,7 +1481,426 @@ def init_db():
         print("ACTION NEEDED: Ensure MySQL/XAMPP is running and the 'tripwise' database exists and credentials are correct.")
 
 
-init_db()
+@app.cli.command("init-db")
+@click.option("--no-seed", is_flag=True, help="Only create/migrate the schema, without sample data.")
+def init_db_command(no_seed):
+    """Create or migrate the schema and add the sample data (run once per deploy)."""
+    init_db(seed=not no_seed)
+
+# ========== SPATIAL INDEX ==========
+# Islands are bucketed into a lat/lng grid, so "within N km" and "k nearest" only
+# look at the cells around the point instead of every island.
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GeoGridIndex:
+    """Grid of cell_deg x cell_deg cells holding (lat, lng, item) points."""
+
+    def __init__(self, points, cell_deg=0.05):
+        self.cell_deg = cell_deg
+        self.cells = {}
+        self._size = 0
+        for lat, lng, item in points:
+            if lat is None or lng is None:
+                continue
+            self.cells.setdefault(self._cell(lat, lng), []).append((lat, lng, item))
+            self._size += 1
+        rows = [row for row, _ in self.cells] or [0]
+        cols = [col for _, col in self.cells] or [0]
+        self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def __len__(self):
+        return self._size
+
+    def _scan_all(self, lat, lng):
+        """[(distance_km, item)] for every point, nearest first."""
+        found = [(haversine_km(lat, lng, plat, plng), item)
+                 for points in self.cells.values() for plat, plng, item in points]
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def _ring(self, row, col, r):
+        if r == 0:
+            yield (row, col)
+            return
+        for dc in range(-r, r + 1):
+            yield (row - r, col + dc)
+            yield (row + r, col + dc)
+        for dr in range(-r + 1, r):
+            yield (row + dr, col - r)
+            yield (row + dr, col + r)
+
+    def within(self, lat, lng, radius_km):
+        """[(distance_km, item)] for points within radius_km, nearest first."""
+        lat_cells = math.ceil(radius_km / (KM_PER_DEGREE * self.cell_deg))
+        lng_km = KM_PER_DEGREE * max(math.cos(math.radians(min(89.0, abs(lat) + radius_km / KM_PER_DEGREE))), 0.01)
+        lng_cells = math.ceil(radius_km / (lng_km * self.cell_deg))
+        row, col = self._cell(lat, lng)
+        if not self._size:
+            return []
+
+        # A wide window (big radius, high latitude) can hold far more cells than are
+        # populated; then walk the populated cells instead of the window
+        if (2 * lat_cells + 1) * (2 * lng_cells + 1) > len(self.cells):
+            window = [cell for cell in self.cells
+                      if abs(cell[0] - row) <= lat_cells and abs(cell[1] - col) <= lng_cells]
+        else:
+            window = [(r, c) for r in range(row - lat_cells, row + lat_cells + 1)
+                      for c in range(col - lng_cells, col + lng_cells + 1)]
+
+        found = []
+        for cell in window:
+            for plat, plng, item in self.cells.get(cell, ()):
+                distance = haversine_km(lat, lng, plat, plng)
+                if distance <= radius_km:
+                    found.append((distance, item))
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def nearest(self, lat, lng, k=5):
+        """[(distance_km, item)] for the k nearest points, nearest first."""
+        if not self._size or k < 1:
+            return []
+        if self._size <= k:
+            return self._scan_all(lat, lng)
+        row, col = self._cell(lat, lng)
+        min_row, max_row, min_col, max_col = self._bounds
+        max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+
+        best = []
+        seen = 0
+        for r in range(max_ring + 1):
+            # Rings grow as 8r cells; once the cells walked outnumber the populated
+            # ones (query far from the data), scanning every point is cheaper
+            if (2 * r + 1) ** 2 > 4 * len(self.cells):
+                return self._scan_all(lat, lng)[:k]
+            for cell in self._ring(row, col, r):
+                for plat, plng, item in self.cells.get(cell, ()):
+                    best.append((haversine_km(lat, lng, plat, plng), item))
+                    seen += 1
+            if seen == self._size:
+                break
+            if len(best) >= k:
+                best.sort(key=lambda pair: pair[0])
+                del best[k:]
+                # Anything in ring r+1 is at least r full cells away
+                cell_km = self.cell_deg * KM_PER_DEGREE * max(
+                    math.cos(math.radians(min(89.0, abs(lat) + (r + 1) * self.cell_deg))), 0.01)
+                if best[-1][0] <= r * cell_km:
+                    break
+        best.sort(key=lambda pair: pair[0])
+        return best[:k]
+
+
+# ========== ROUTE PLANNING ==========
+# plan_trip() orders the selected islands itself (nearest neighbour + 2-opt over a
+# haversine distance matrix) and splits them into days, then gives the model that
+# skeleton instead of leaving the routing to it.
+
+# Nearest-neighbour tours tried (one per start island) before picking the shortest
+ROUTE_MAX_STARTS = 8
+# Full 2-opt sweeps per tour; each is O(n^2), and the route is usually settled in a few
+ROUTE_MAX_PASSES = 10
+
+
+def distance_matrix_km(lats, lngs):
+    """NxN great-circle distances between the given points, in km."""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lng = np.radians(np.asarray(lngs, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def route_length(route, dist):
+    return float(sum(dist[a, b] for a, b in zip(route, route[1:])))
+
+
+def nearest_neighbour_route(dist, start):
+    n = len(dist)
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[start] = False
+    route = [start]
+    while unvisited.any():
+        last = route[-1]
+        candidates = np.where(unvisited, dist[last], np.inf)
+        nxt = int(np.argmin(candidates))
+        route.append(nxt)
+        unvisited[nxt] = False
+    return route
+
+
+def two_opt(route, dist):
+    """Improve an open route by reversing segments while that shortens it."""
+    route = list(route)
+    n = len(route)
+    improved = True
+    passes = 0
+    while improved and passes < ROUTE_MAX_PASSES:
+        improved = False
+        passes += 1
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                a, b = route[i - 1], route[i]
+                c = route[j]
+                # Open path: reversing up to the last stop has no edge after it
+                d = route[j + 1] if j + 1 < n else None
+                before = dist[a, b] + (dist[c, d] if d is not None else 0.0)
+                after = dist[a, c] + (dist[b, d] if d is not None else 0.0)
+                if after + 1e-9 < before:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    improved = True
+    return route
+
+
+def plan_island_route(islands):
+    """(ordered islands, km): the shortest of a few nearest-neighbour tours, each
+    refined with 2-opt. Islands without coordinates go last."""
+    located = [i for i in islands if i.latitude is not None and i.longitude is not None]
+    unlocated = [i for i in islands if i.latitude is None or i.longitude is None]
+    if len(located) < 2:
+        return located + unlocated, 0.0
+
+    dist = distance_matrix_km([i.latitude for i in located], [i.longitude for i in located])
+    starts = range(min(len(located), ROUTE_MAX_STARTS))
+    best = min(
+        (two_opt(nearest_neighbour_route(dist, start), dist) for start in starts),
+        key=lambda route: route_length(route, dist)
+    )
+    return [located[k] for k in best] + unlocated, route_length(best, dist)
+
+
+def split_into_days(stops, days):
+    """Contiguous, evenly sized groups of stops, one list per day (may be empty)."""
+    buckets = []
+    start = 0
+    for day in range(days):
+        size = len(stops) // days + (1 if day < len(stops) % days else 0)
+        buckets.append(stops[start:start + size])
+        start += size
+    return buckets
+
+
+def route_skeleton(islands, days):
+    """(ordered islands, prompt text describing the day-by-day route)."""
+    ordered, total_km = plan_island_route(islands)
+    lines = [f"Planned route ({total_km:.1f} km of island hopping in total):"]
+    for day, stops in enumerate(split_into_days(ordered, days), start=1):
+        if not stops:
+            lines.append(f"Day {day}: free day, revisit favourites or rest")
+            continue
+        legs = [stops[0].name]
+        for prev, stop in zip(stops, stops[1:]):
+            if None in (prev.latitude, stop.latitude):
+                legs.append(stop.name)
+            else:
+                km = haversine_km(prev.latitude, prev.longitude, stop.latitude, stop.longitude)
+                legs.append(f"{stop.name} ({km:.1f} km)")
+        lines.append(f"Day {day}: " + " -> ".join(legs))
+    return ordered, "\n".join(lines)
+
+
+# ========== CATALOG SNAPSHOT ==========
+# Islands and establishments change only when owners/admins edit them, but almost
+# every page and every chatbot message reads them. Keep one process-local copy and
+# reload it only after a write bumps the version.
+
+class CatalogSnapshot:
+    """Read-only view of all islands and establishments at a given version."""
+
+    def __init__(self, version, islands, establishments, activities=()):
+        self.version = version
+        self.loaded_at = time.time()
+        self.islands = islands
+        self.establishments = establishments
+        self.activities = list(activities)
+        self.islands_by_id = {i.id: i for i in islands}
+        self.establishments_by_id = {e.id: e for e in establishments}
+        self._linker = None
+        self._fingerprint = None
+        self._island_index = None
+        self._establishment_index = None
+
+    @property
+    def fingerprint(self):
+        """Hash of the catalog contents. Unlike `version` it is stable across
+        processes and restarts, so it can key data that outlives this worker."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for i in self.islands:
+                digest.update(repr((i.id, i.name, i.image, i.description, i.location, i.region,
+                                    i.history, i.map_coordinates, i.latitude, i.longitude)).encode())
+            for e in self.establishments:
+                digest.update(repr((e.id, e.name, e.type, e.island_id, e.location, e.contact_number,
+                                    e.opening_hours, e.description, e.rating, e.establishments_image,
+                                    e.official_website, e.is_approved, e.updated_at)).encode())
+            for a in self.activities:
+                digest.update(repr((a.activity_id, a.island_id, a.name, a.description, a.price)).encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @property
+    def island_index(self):
+        """Spatial index over islands, built on first use."""
+        if self._island_index is None:
+            self._island_index = GeoGridIndex(
+                (i.latitude, i.longitude, i) for i in self.islands
+            )
+        return self._island_index
+
+    @property
+    def establishment_index(self):
+        """Spatial index over approved establishments, placed at their island's
+        coordinates (establishments have no coordinates of their own)."""
+        if self._establishment_index is None:
+            points = []
+            for e in self.approved_establishments:
+                island = self.islands_by_id.get(e.island_id)
+                if island is not None:
+                    points.append((island.latitude, island.longitude, e))
+            self._establishment_index = GeoGridIndex(points)
+        return self._establishment_index
+
+    def nearby_islands(self, island, k=3):
+        """The k islands closest to `island`, as [(distance_km, island)]."""
+        if island.latitude is None or island.longitude is None:
+            return []
+        return [
+            (distance, other)
+            for distance, other in self.island_index.nearest(island.latitude, island.longitude, k + 1)
+            if other.id != island.id
+        ][:k]
+
+    @property
+    def linker(self):
+        """Entity linker for this version, compiled on first use."""
+        if self._linker is None:
+            self._linker = EntityLinker(self.islands, self.establishments)
+        return self._linker
+
+    @property
+    def approved_establishments(self):
+        return [e for e in self.establishments if e.is_approved]
+
+    def establishments_for_island(self, island_id):
+        return [e for e in self.establishments if e.island_id == island_id]
+
+    def activities_for_island(self, island_id):
+        """Activities of one island, one per name (the table may hold duplicates)."""
+        seen = set()
+        activities = []
+        for a in self.activities:
+            if a.island_id == island_id and a.name not in seen:
+                seen.add(a.name)
+                activities.append(a)
+        return activities
+
+    def islands_for_ids(self, island_ids):
+        """Return the islands matching the given ids (strings or ints), in catalog order."""
+        wanted = set()
+        for island_id in island_ids:
+            try:
+                wanted.add(int(island_id))
+            except (TypeError, ValueError):
+                continue
+        return [i for i in self.islands if i.id in wanted]
+
+
+class EntityLinker:
+    """Links every island/place name in a text in one left-to-right regex pass.
+
+    All names go into a single alternation, longest first, so the longest name
+    wins at any position. Anchors already present in the text are matched as a
+    whole and copied through untouched, so their contents are never re-linked.
+    Islands win over places that share the same name.
+    """
+
+    def __init__(self, islands, establishments):
+        self.urls = {}
+        for obj_list, base_url in [(islands, '/island/'), (establishments, '/place/')]:
+            for obj in obj_list:
+                if obj.name:
+                    self.urls.setdefault(obj.name, f"{base_url}{obj.id}")
+
+        names = sorted(self.urls, key=len, reverse=True)
+        if names:
+            alternation = "|".join(re.escape(name) for name in names)
+            self.pattern = re.compile(
+                r'(<a\b[^>]*>.*?</a>)|\b(' + alternation + r')\b', re.DOTALL
+            )
+        else:
+            self.pattern = None
+
+    def _replace(self, match):
+        if match.group(1):
+            return match.group(1)
+        name = match.group(2)
+        return f"<a href='{self.urls[name]}'>{name}</a>"
+
+    def link(self, text):
+        if not text or self.pattern is None:
+            return text
+        return self.pattern.sub(self._replace, text)
+
+
+_catalog_lock = threading.Lock()
+_catalog_version = 0
+_catalog_snapshot = None
+
+
+def _load_catalog(version):
+    # Use a private session so the rows end up detached and are never shared with
+    # (or expired by a commit in) the request's own db.session
+    with Session(db.engine) as catalog_session:
+        islands = catalog_session.query(Island).order_by(Island.id).all()
+        establishments = catalog_session.query(Establishment)\
+            .order_by(Establishment.establishment_id).all()
+        activities = catalog_session.query(Activity).order_by(Activity.activity_id).all()
+    return CatalogSnapshot(version, islands, establishments, activities)
+
+
+def get_catalog():
+    """Return the current catalog snapshot, loading it from the database if needed."""
+    global _catalog_snapshot
+    snapshot = _catalog_snapshot
+    ttl = app.config.get('CATALOG_TTL', 0)
+    if snapshot is not None and snapshot.version == _catalog_version:
+        if not ttl or time.time() - snapshot.loaded_at < ttl:
+            return snapshot
+
+    with _catalog_lock:
+        snapshot = _catalog_snapshot
+        fresh = (snapshot is not None and snapshot.version == _catalog_version
+                 and (not ttl or time.time() - snapshot.loaded_at < ttl))
+        if not fresh:
+            snapshot = _load_catalog(_catalog_version)
+            _catalog_snapshot = snapshot
+    return snapshot
+
+
+def catalog_version():
+    return _catalog_version
+
+
+def invalidate_catalog():
+    """Call after committing any change to islands or establishments."""
+    global _catalog_version, _catalog_snapshot
+    with _catalog_lock:
+        _catalog_version += 1
+        _catalog_snapshot = None
 
 # ==========================================================
 # FIX: DEFINE THE MISSING HELPER FUNCTION HERE
@@ -232,73 +1911,1250 @@ def get_place_by_id(place_id):
     return Establishment.query.get_or_404(place_id)
 # ==========================================================
 
+# ========== METRICS ==========
+# Per-endpoint timings exposed in Prometheus text format at /metrics. Each request
+# records wall time, SQL statement count and time (see QUERY COUNTER), and template
+# render time; model calls record their latency in ResilientBackend. Numbers are
+# per process, so scrape every worker. With SLOW_REQUEST_MS set, slow requests are
+# logged together with the SQL statements they ran.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SLOW_REQUEST_MAX_STATEMENTS = 20
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram with a fixed set of label names."""
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def _label_text(self, labels, extra=None):
+        pairs = list(zip(self.labelnames, labels)) + ([extra] if extra else [])
+        return ",".join(
+            '%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for k, v in pairs
+        )
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, dict(s, counts=list(s["counts"]))) for labels, s in self._series.items())
+        for labels, s in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, s["counts"]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self._label_text(labels, ("le", bound))}}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self._label_text(labels, ("le", "+Inf"))}}} {s["count"]}')
+            label_text = self._label_text(labels)
+            lines.append(f"{self.name}_sum{{{label_text}}} {s['sum']}")
+            lines.append(f"{self.name}_count{{{label_text}}} {s['count']}")
+        return "\n".join(lines)
+
+
+REQUEST_SECONDS = Histogram(
+    "tripwise_request_duration_seconds", "Wall time spent handling a request.", ("endpoint", "method", "status")
+)
+REQUEST_QUERIES = Histogram(
+    "tripwise_request_db_queries", "SQL statements executed per request.", ("endpoint",), QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram(
+    "tripwise_request_db_seconds", "Total SQL execution time per request.", ("endpoint",)
+)
+TEMPLATE_SECONDS = Histogram(
+    "tripwise_template_render_seconds", "Time spent rendering a template.", ("template",)
+)
+CONTEXT_TOKENS = Histogram(
+    "tripwise_prompt_context_tokens", "Estimated context tokens kept in and dropped from a prompt.",
+    ("prompt", "part"), (0, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+)
+LLM_SECONDS = Histogram(
+    "tripwise_llm_call_seconds", "Model call latency, retries and waiting for a slot included.",
+    ("call", "outcome")
+)
+METRICS = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, TEMPLATE_SECONDS, CONTEXT_TOKENS, LLM_SECONDS)
+
+
+@before_render_template.connect_via(app)
+def _start_template_timer(sender, template, context, **extra):
+    if has_app_context():
+        g.setdefault("template_timers", []).append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def _record_template_time(sender, template, context, **extra):
+    timers = g.get("template_timers") if has_app_context() else None
+    if timers:
+        TEMPLATE_SECONDS.observe(time.perf_counter() - timers.pop(), template.name or "<string>")
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    reset_query_count()
+    if app.config['SLOW_REQUEST_MS']:
+        g.db_statements = []
+
+
+@app.after_request
+def _record_request_metrics(response):
+    # Streamed bodies (/ask/stream) are timed up to the first byte only
+    started = g.get("request_started")
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or "unmatched"
+    query_count = get_query_count()
+    query_seconds = get_query_time()
+
+    REQUEST_SECONDS.observe(elapsed, endpoint, request.method, response.status_code)
+    REQUEST_QUERIES.observe(query_count, endpoint)
+    REQUEST_DB_SECONDS.observe(query_seconds, endpoint)
+
+    slow_ms = app.config['SLOW_REQUEST_MS']
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        statements = sorted(g.get("db_statements", []), key=lambda s: s[1], reverse=True)
+        app.logger.warning(
+            "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms\n%s",
+            request.method, request.path, endpoint, elapsed * 1000, query_count, query_seconds * 1000,
+            "\n".join(f"  {seconds * 1000:8.1f} ms  {statement}"
+                      for statement, seconds in statements[:SLOW_REQUEST_MAX_STATEMENTS])
+        )
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    token = app.config['METRICS_TOKEN']
+    scraper = token and request.headers.get("Authorization") == f"Bearer {token}"
+    if not scraper and session.get("role") != "admin":
+        abort(401)
+    body = "\n\n".join(metric.render() for metric in METRICS) + "\n"
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+# ========== LLM BACKEND ==========
+# Routes never call Gemini directly; they go through `llm`, which caps concurrency,
+# enforces a deadline, retries with jitter and fails fast while the circuit is open.
+# LLM_BACKEND=stub swaps Gemini for a deterministic local model.
+
+class LLMUnavailable(Exception):
+    """Raised when the model cannot answer in time or the circuit is open."""
+
+
+class LLMBackend:
+    """Interface: a text answer for a prompt, whole or as a stream of chunks.
+
+    The a* variants are awaited by the async chat path; by default they run the
+    blocking call in a thread.
+    """
+
+    def generate(self, prompt, timeout=None):
+        raise NotImplementedError
+
+    def stream(self, prompt, timeout=None):
+        yield self.generate(prompt, timeout=timeout)
+
+    async def agenerate(self, prompt, timeout=None):
+        return await asyncio.to_thread(self.generate, prompt, timeout)
+
+    async def astream(self, prompt, timeout=None):
+        yield await self.agenerate(prompt, timeout=timeout)
+
+
+class GeminiBackend(LLMBackend):
+    def __init__(self, model_name, api_key=None):
+        # Imported here: the SDK alone takes most of a second to import
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    @staticmethod
+    def _request_options(timeout):
+        return {"timeout": timeout} if timeout else None
+
+    def generate(self, prompt, timeout=None):
+        return self.model.generate_content(
+            prompt, request_options=self._request_options(timeout)
+        ).text
+
+    def stream(self, prompt, timeout=None):
+        for chunk in self.model.generate_content(
+            prompt, stream=True, request_options=self._request_options(timeout)
+        ):
+            yield chunk.text or ""
+
+    async def agenerate(self, prompt, timeout=None):
+        response = await self.model.generate_content_async(
+            prompt, request_options=self._request_options(timeout)
+        )
+        return response.text
+
+    async def astream(self, prompt, timeout=None):
+        response = await self.model.generate_content_async(
+            prompt, stream=True, request_options=self._request_options(timeout)
+        )
+        async for chunk in response:
+            yield chunk.text or ""
+
+
+class StubBackend(LLMBackend):
+    """Deterministic offline model: the same prompt always gets the same answer."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def generate(self, prompt, timeout=None):
+        return "".join(self.stream(prompt, timeout=timeout))
+
+    def stream(self, prompt, timeout=None):
+        parts = self._answer(prompt)
+        delay = self.latency / len(parts)
+        for part in parts:
+            if delay:
+                time.sleep(delay)
+            yield part
+
+    async def agenerate(self, prompt, timeout=None):
+        return "".join([part async for part in self.astream(prompt, timeout=timeout)])
+
+    async def astream(self, prompt, timeout=None):
+        parts = self._answer(prompt)
+        delay = self.latency / len(parts)
+        for part in parts:
+            if delay:
+                await asyncio.sleep(delay)
+            yield part
+
+    @staticmethod
+    def _answer(prompt):
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        days_match = re.search(r"exactly (\d+) days", prompt)
+        if days_match:
+            days = int(days_match.group(1))
+            parts = [f"Day {day}: Explore, eat local food and rest. Estimated cost: PHP 1,000 per person.\n"
+                     for day in range(1, days + 1)]
+            parts.append(f"Total Estimated Cost: PHP {days * 1000:,}.00\n")
+        else:
+            parts = ["This is WiseBot running in offline mode. ",
+                     f"Your question has reference {digest}. ",
+                     "Please try again later for a full answer.\n"]
+        return parts
+
+
+class ResilientBackend(LLMBackend):
+    """Wraps a backend with a concurrency limit, deadline, retries and a circuit breaker."""
+
+    def __init__(self, backend, max_concurrency=8, timeout=30.0, retries=2,
+                 backoff=0.5, circuit_threshold=5, circuit_reset=30.0, async_max_concurrency=512):
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.circuit_threshold = circuit_threshold
+        self.circuit_reset = circuit_reset
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # Sync backend calls run here so the caller can stop waiting at the deadline
+        self._calls = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-call")
+        # Separate limit for the event loop; asyncio.Semaphore binds to the loop on first use
+        self._async_slots = asyncio.Semaphore(async_max_concurrency)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started = None
+
+    # --- circuit breaker ---
+    def _check_circuit(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.time()
+            # Half-open: one caller probes the backend while the rest keep failing fast.
+            # A probe that never reports back (e.g. it timed out waiting for a slot)
+            # is given up on after `timeout`, letting the next caller try.
+            if now - self._opened_at < self.circuit_reset or \
+                    (self._trial_started is not None and now - self._trial_started < self.timeout):
+                raise LLMUnavailable("The assistant is temporarily unavailable. Please try again shortly.")
+            self._trial_started = now
+
+    def _record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_started = None
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            # A failed probe re-opens the circuit straight away
+            if self._trial_started is not None or self._failures >= self.circuit_threshold:
+                self._opened_at = time.time()
+                self._trial_started = None
+
+    def _acquire(self, deadline):
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.time())):
+            raise LLMUnavailable("The assistant is busy right now. Please try again shortly.")
+
+    def _wait(self, future, deadline):
+        try:
+            return future.result(timeout=max(0.0, deadline - time.time()))
+        except FutureTimeout:
+            raise TimeoutError("no answer before the deadline")
+
+    def _release_when_done(self, future, cleanup=None):
+        """Give the slot back, after `cleanup`, once `future` (the last backend call
+        of an attempt) has returned. A call abandoned at the deadline keeps its slot
+        until it really finishes, so overdue calls still count against the limit."""
+        def finish(_=None):
+            try:
+                if cleanup:
+                    cleanup()
+            finally:
+                self._slots.release()
+        if future is None or future.done():
+            finish()
+        else:
+            future.add_done_callback(finish)
+
+    def _sleep_before_retry(self, attempt, deadline):
+        delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if time.time() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def generate(self, prompt, timeout=None):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = self._generate(prompt, timeout)
+            outcome = "ok"
+            return result
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - started, "generate", outcome)
+
+    def _generate(self, prompt, timeout=None):
+        deadline = time.time() + (timeout or self.timeout)
+        self._check_circuit()
+        attempt = 0
+        while True:
+            # A slot is held per attempt, so the backoff sleep does not keep one
+            self._acquire(deadline)
+            future = None
+            try:
+                future = self._calls.submit(self.backend.generate, prompt,
+                                            timeout=max(0.1, deadline - time.time()))
+                result = self._wait(future, deadline)
+                self._record_success()
+                return result
+            except Exception as e:
+                self._record_failure()
+                error = e
+            finally:
+                self._release_when_done(future)
+            if attempt >= self.retries or not self._sleep_before_retry(attempt, deadline):
+                raise LLMUnavailable(f"The assistant could not answer: {error}") from error
+            self._check_circuit()
+            attempt += 1
+
+    def stream(self, prompt, timeout=None):
+        """Streams chunks; only retried while nothing has been yielded yet."""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield from self._stream(prompt, timeout)
+            outcome = "ok"
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - started, "stream", outcome)
+
+    def _stream(self, prompt, timeout=None):
+        deadline = time.time() + (timeout or self.timeout)
+        self._check_circuit()
+        attempt = 0
+        while True:
+            started = False
+            self._acquire(deadline)
+            chunks = future = None
+            try:
+                chunks = iter(self.backend.stream(prompt, timeout=max(0.1, deadline - time.time())))
+                while True:
+                    # Each chunk is fetched on the call pool, so a stalled stream
+                    # cannot outlive the deadline
+                    future = self._calls.submit(next, chunks, None)
+                    chunk = self._wait(future, deadline)
+                    if chunk is None:
+                        break
+                    started = True
+                    yield chunk
+                self._record_success()
+                return
+            except Exception as e:
+                self._record_failure()
+                error = e
+            finally:
+                self._release_when_done(future, getattr(chunks, "close", None))
+            if started or attempt >= self.retries or not self._sleep_before_retry(attempt, deadline):
+                raise LLMUnavailable(f"The assistant could not answer: {error}") from error
+            self._check_circuit()
+            attempt += 1
+
+
+    # --- async path (asgi_app) ---
+    async def _aacquire(self, deadline):
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), max(0.0, deadline - time.time()))
+        except asyncio.TimeoutError:
+            raise LLMUnavailable("The assistant is busy right now. Please try again shortly.")
+
+    async def _asleep_before_retry(self, attempt, deadline):
+        delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if time.time() + delay >= deadline:
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+    async def agenerate(self, prompt, timeout=None):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await self._agenerate(prompt, timeout)
+            outcome = "ok"
+            return result
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - started, "generate_async", outcome)
+
+    async def _agenerate(self, prompt, timeout=None):
+        deadline = time.time() + (timeout or self.timeout)
+        self._check_circuit()
+        attempt = 0
+        while True:
+            await self._aacquire(deadline)
+            try:
+                remaining = max(0.1, deadline - time.time())
+                result = await asyncio.wait_for(self.backend.agenerate(prompt, timeout=remaining), remaining)
+                self._record_success()
+                return result
+            except Exception as e:
+                self._record_failure()
+                error = e
+            finally:
+                self._async_slots.release()
+            if attempt >= self.retries or not await self._asleep_before_retry(attempt, deadline):
+                raise LLMUnavailable(f"The assistant could not answer: {error}") from error
+            self._check_circuit()
+            attempt += 1
+
+    async def astream(self, prompt, timeout=None):
+        """Streams chunks; only retried while nothing has been yielded yet."""
+        started = time.perf_counter()
+        outcome = "error"
+        chunks = self._astream(prompt, timeout)
+        try:
+            async for chunk in chunks:
+                yield chunk
+            outcome = "ok"
+        finally:
+            # Close the inner stream now, not whenever the loop finalizes it, so an
+            # abandoned stream hands back its slot and connection straight away
+            await chunks.aclose()
+            LLM_SECONDS.observe(time.perf_counter() - started, "stream_async", outcome)
+
+    async def _astream(self, prompt, timeout=None):
+        deadline = time.time() + (timeout or self.timeout)
+        self._check_circuit()
+        attempt = 0
+        while True:
+            started = False
+            await self._aacquire(deadline)
+            try:
+                chunks = self.backend.astream(prompt, timeout=max(0.1, deadline - time.time()))
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), max(0.1, deadline - time.time()))
+                        except StopAsyncIteration:
+                            break
+                        started = True
+                        yield chunk
+                finally:
+                    await chunks.aclose()
+                self._record_success()
+                return
+            except Exception as e:
+                self._record_failure()
+                error = e
+            finally:
+                self._async_slots.release()
+            if started or attempt >= self.retries or not await self._asleep_before_retry(attempt, deadline):
+                raise LLMUnavailable(f"The assistant could not answer: {error}") from error
+            self._check_circuit()
+            attempt += 1
+
+
+def build_llm_backend():
+    if app.config['LLM_BACKEND'] == "stub":
+        backend = StubBackend(latency=app.config['LLM_STUB_LATENCY'])
+    else:
+        backend = GeminiBackend(app.config['LLM_MODEL'], app.config['GOOGLE_API_KEY'])
+    return ResilientBackend(
+        backend,
+        max_concurrency=app.config['LLM_MAX_CONCURRENCY'],
+        timeout=app.config['LLM_TIMEOUT'],
+        retries=app.config['LLM_RETRIES'],
+        backoff=app.config['LLM_BACKOFF'],
+        circuit_threshold=app.config['LLM_CIRCUIT_THRESHOLD'],
+        circuit_reset=app.config['LLM_CIRCUIT_RESET'],
+        async_max_concurrency=app.config['LLM_ASYNC_MAX_CONCURRENCY'],
+    )
+
+
+class LazyBackend(LLMBackend):
+    """Builds the real backend on first use, so importing the app stays cheap."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._factory()
+        return self._backend
+
+    def generate(self, prompt, timeout=None):
+        return self.backend.generate(prompt, timeout=timeout)
+
+    def stream(self, prompt, timeout=None):
+        return self.backend.stream(prompt, timeout=timeout)
+
+    async def agenerate(self, prompt, timeout=None):
+        return await self.backend.agenerate(prompt, timeout=timeout)
+
+    def astream(self, prompt, timeout=None):
+        return self.backend.astream(prompt, timeout=timeout)
+
+
+llm = LazyBackend(build_llm_backend)
+
+# ========== LLM RESPONSE CACHE ==========
+# Identical chat questions and trip requests produce identical prompts. Cache the
+# model's answers keyed on the normalized prompt plus the catalog fingerprint, so
+# an edit to any island or establishment naturally misses the old entries.
+
+class ResponseCache:
+    """LRU + TTL cache of prompt -> text, optionally backed by a SQLite file."""
+
+    def __init__(self, max_size=512, ttl=3600, path=""):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, created REAL)"
+            )
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(prompt, catalog_fingerprint):
+        normalized = " ".join(prompt.lower().split())
+        return hashlib.sha256(f"{catalog_fingerprint}\n{normalized}".encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created < self.ttl:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+            if self._disk is None:
+                return None
+            row = self._disk.execute(
+                "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if now - created >= self.ttl:
+                self._disk.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._disk.commit()
+                return None
+            self._remember(key, value, created)
+            return value
+
+    def set(self, key, value):
+        created = time.time()
+        with self._lock:
+            self._remember(key, value, created)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, value, created)
+                )
+                self._disk.execute("DELETE FROM llm_cache WHERE created < ?", (created - self.ttl,))
+                self._disk.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM llm_cache")
+                self._disk.commit()
+
+    def _remember(self, key, value, created):
+        self._entries[key] = (value, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+llm_cache = ResponseCache(
+    max_size=app.config['LLM_CACHE_SIZE'],
+    ttl=app.config['LLM_CACHE_TTL'],
+    path=app.config['LLM_CACHE_PATH'],
+)
+
+
+def llm_cache_key(prompt):
+    return ResponseCache.make_key(prompt, get_catalog().fingerprint)
+
+
+def generate_text(prompt):
+    """Model answer for a prompt, served from the response cache when possible."""
+    key = llm_cache_key(prompt)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    text_response = llm.generate(prompt)
+    llm_cache.set(key, text_response)
+    return text_response
+
+# ========== TRIP PLAN JOBS ==========
+# plan_trip() only stores a TripPlanJob and hands it to a bounded thread pool; the
+# result page polls /plan_trip/job/<id>/status. Jobs live in the database, so a
+# restarted worker picks up whatever was still pending (see resume_plan_jobs()).
+
+plan_executor = ThreadPoolExecutor(
+    max_workers=app.config['PLAN_WORKERS'], thread_name_prefix="plan-job"
+)
+_plan_queue_lock = threading.Lock()
+_plan_queued = 0
+
+
+def format_itinerary(itinerary, days):
+    """Keep exactly the requested number of 'Day N' sections of the model's answer."""
+    day_splits = re.split(r'Day\s+\d+[:.\s]*', itinerary, flags=re.IGNORECASE)
+    filtered_itinerary = ""
+
+    for i in range(1, min(days + 1, len(day_splits))):
+        filtered_itinerary += f"Day {i}\n{day_splits[i].strip()}\n\n"
+
+    return filtered_itinerary.strip()
+
+
+def _enqueue_plan_job(job_id):
+    global _plan_queued
+    with _plan_queue_lock:
+        if _plan_queued >= app.config['PLAN_MAX_PENDING']:
+            return False
+        _plan_queued += 1
+    plan_executor.submit(run_plan_job, job_id)
+    return True
+
+
+def submit_plan_job(user_id, prompt, destination, days, people, budget):
+    """Create (or reuse an identical pending) itinerary job and queue it.
+
+    Returns None when the queue is full.
+    """
+    dedupe_key = hashlib.sha256(" ".join(prompt.lower().split()).encode()).hexdigest()
+    existing = TripPlanJob.query.filter(
+        TripPlanJob.user_id == user_id,
+        TripPlanJob.dedupe_key == dedupe_key,
+        TripPlanJob.status.in_(["pending", "running"])
+    ).first()
+    if existing:
+        return existing
+
+    job = TripPlanJob(
+        job_id=uuid.uuid4().hex,
+        user_id=user_id,
+        dedupe_key=dedupe_key,
+        status="pending",
+        destination=destination,
+        days=days,
+        people=people,
+        budget=budget,
+        prompt=prompt
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    if not _enqueue_plan_job(job.job_id):
+        job.status = "failed"
+        job.error = "Planner queue is full"
+        db.session.commit()
+        return None
+    return job
+
+
+def run_plan_job(job_id):
+    """Worker entry point: claim the job, generate the itinerary, store the result."""
+    global _plan_queued
+    try:
+        with app.app_context():
+            # Claim with a conditional UPDATE so two workers never run the same job
+            claimed = TripPlanJob.query.filter_by(job_id=job_id, status="pending").update(
+                {"status": "running", "updated_at": datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.session.commit()
+            if not claimed:
+                return
+
+            job = TripPlanJob.query.get(job_id)
+            try:
+                job.itinerary = format_itinerary(generate_text(job.prompt), job.days)
+                job.status = "done"
+            except Exception as e:
+                db.session.rollback()
+                job = TripPlanJob.query.get(job_id)
+                job.status = "failed"
+                job.error = str(e)[:1000]
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+    finally:
+        with _plan_queue_lock:
+            _plan_queued -= 1
+
+
+_plan_jobs_resumed = False
+_plan_resume_lock = threading.Lock()
+
+
+def resume_plan_jobs():
+    """Re-queue jobs left pending, or stuck running, by a previous worker process."""
+    try:
+        with app.app_context():
+            stale_before = datetime.utcfromtimestamp(time.time() - app.config['PLAN_JOB_STALE'])
+            TripPlanJob.query.filter(
+                TripPlanJob.status == "running",
+                TripPlanJob.updated_at < stale_before
+            ).update({"status": "pending"}, synchronize_session=False)
+            db.session.commit()
+
+            pending = [job_id for (job_id,) in db.session.query(TripPlanJob.job_id)
+                       .filter_by(status="pending").all()]
+        unqueued = [job_id for job_id in pending if not _enqueue_plan_job(job_id)]
+        if unqueued:
+            # Same outcome as a new job refused by a full queue in submit_plan_job()
+            with app.app_context():
+                TripPlanJob.query.filter(
+                    TripPlanJob.job_id.in_(unqueued),
+                    TripPlanJob.status == "pending"
+                ).update({"status": "failed", "error": "Planner queue is full",
+                          "updated_at": datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+    except Exception as e:
+        print(f"Could not resume trip plan jobs: {e}")
+
+
+@app.before_request
+def _resume_plan_jobs_once():
+    # Done on the first request rather than at import, so forking workers and
+    # CLI commands never touch the database just by loading the app
+    global _plan_jobs_resumed
+    if _plan_jobs_resumed:
+        return
+    with _plan_resume_lock:
+        if not _plan_jobs_resumed:
+            _plan_jobs_resumed = True
+            resume_plan_jobs()
+
+# ========== QUERY COUNTER ==========
+# Counts and times SQL statements per request/app context in g, so tests and
+# debugging can check that a route keeps a fixed number of queries (e.g. no N+1
+# loops), and /metrics can report where request time goes.
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.db_query_count = g.get("db_query_count", 0) + 1
+        context._tripwise_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_tripwise_started", None)
+    if started is None or not has_app_context():
+        return
+    elapsed = time.perf_counter() - started
+    g.db_query_time = g.get("db_query_time", 0.0) + elapsed
+    statements = g.get("db_statements")
+    if statements is not None:
+        statements.append((statement, elapsed))
+
+
+def get_query_count():
+    """Number of SQL statements executed in the current app context so far."""
+    return g.get("db_query_count", 0) if has_app_context() else 0
+
+
+def get_query_time():
+    """Seconds spent executing SQL in the current app context so far."""
+    return g.get("db_query_time", 0.0) if has_app_context() else 0.0
+
+
+def reset_query_count():
+    if has_app_context():
+        g.db_query_count = 0
+        g.db_query_time = 0.0
+
+# ========== RESPONSIVE IMAGES ==========
+# Catalog photos are multi-megabyte originals. For every image used through
+# responsive_image() we generate JPEG and WebP copies at a few widths, named after
+# a hash of the original's content, and serve them from /img/ as immutable.
+# Variants are made on first use (or ahead of time with `flask build-image-variants`).
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_DIR = os.path.join(app.static_folder, "images", "variants")
+IMAGE_VARIANT_FORMATS = (
+    ("jpeg", "jpg", {"quality": 80, "optimize": True, "progressive": True}),
+    ("webp", "webp", {"quality": 78, "method": 6}),
+)
+_image_variants = {}
+_image_variants_lock = threading.Lock()
+
+
+def _build_image_variants(source):
+    with open(source, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(source))[0]
+    os.makedirs(IMAGE_VARIANT_DIR, exist_ok=True)
+
+    variants = {fmt: [] for fmt, _, _ in IMAGE_VARIANT_FORMATS}
+    with Image.open(source) as original:
+        img = ImageOps.exif_transpose(original).convert("RGB")
+        for target_width in IMAGE_VARIANT_WIDTHS:
+            # Never upscale: the last variant of a small image is its own width
+            width = min(target_width, img.width)
+            resized = None
+            for fmt, ext, options in IMAGE_VARIANT_FORMATS:
+                name = f"{stem}-{width}.{digest}.{ext}"
+                path = os.path.join(IMAGE_VARIANT_DIR, name)
+                if not os.path.exists(path):
+                    if resized is None:
+                        height = max(1, round(img.height * width / img.width))
+                        resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+                    # Write then rename so other workers never serve a half-written file
+                    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                    resized.save(tmp_path, format=fmt.upper(), **options)
+                    os.replace(tmp_path, path)
+                variants[fmt].append((width, name))
+            if width == img.width:
+                break
+    return variants
+
+
+def image_variants(filename):
+    """{'jpeg': [(width, name)], 'webp': [...]} for a file under static/, or None
+    when Pillow is missing or the file cannot be read."""
+    source = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(source)
+    except OSError:
+        return None
+
+    cache_key = (filename, mtime)
+    if cache_key in _image_variants:
+        return _image_variants[cache_key]
+
+    with _image_variants_lock:
+        if cache_key not in _image_variants:
+            variants = None
+            if Image is not None:
+                try:
+                    variants = _build_image_variants(source)
+                except (OSError, ValueError) as e:
+                    print(f"Could not build image variants for {filename}: {e}")
+            _image_variants[cache_key] = variants
+    return _image_variants[cache_key]
+
+
+def _html_attrs(attrs):
+    # class_="x" -> class="x", data_id="1" -> data-id="1"
+    return "".join(
+        f' {name.rstrip("_").replace("_", "-")}="{escape(value)}"'
+        for name, value in attrs.items() if value is not None
+    )
+
+
+@app.template_global()
+def responsive_image(filename, alt="", sizes="100vw", **attrs):
+    """<img> for a static image with WebP/JPEG srcsets and lazy loading.
+
+    Extra keyword arguments become attributes (class_, style, loading="eager", ...).
+    """
+    img_attrs = {"alt": alt, "loading": "lazy", "decoding": "async"}
+    img_attrs.update(attrs)
+
+    variants = image_variants(filename)
+    if not variants:
+        return Markup(f'<img src="{url_for("static", filename=filename)}"{_html_attrs(img_attrs)}>')
+
+    def srcset(fmt):
+        return ", ".join(f"{url_for('image_variant', name=name)} {width}w" for width, name in variants[fmt])
+
+    jpegs = variants["jpeg"]
+    fallback_name = jpegs[min(1, len(jpegs) - 1)][1]
+    return Markup(
+        '<picture style="display: contents;">'
+        f'<source type="image/webp" srcset="{srcset("webp")}" sizes="{escape(sizes)}">'
+        f'<img src="{url_for("image_variant", name=fallback_name)}" srcset="{srcset("jpeg")}" '
+        f'sizes="{escape(sizes)}"{_html_attrs(img_attrs)}>'
+        '</picture>'
+    )
+
+
+@app.route("/img/<path:name>")
+def image_variant(name):
+    # Variant names contain a content hash, so they can be cached forever
+    response = send_from_directory(IMAGE_VARIANT_DIR, name, max_age=31536000)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@app.cli.command("build-image-variants")
+def build_image_variants_command():
+    """Pre-generate resized JPEG/WebP variants for all island and establishment photos."""
+    if Image is None:
+        print("Pillow is not installed; nothing to do.")
+        return
+    count = 0
+    for folder in ("islands", "establishments"):
+        directory = os.path.join(app.static_folder, "images", folder)
+        for entry in sorted(os.listdir(directory)):
+            if image_variants(f"images/{folder}/{entry}"):
+                count += 1
+    print(f"✅ Image variants ready for {count} images.")
+
+# ========== PAGE CACHING ==========
+# Catalog pages only change when the catalog does. Their ETag is derived from the
+# catalog fingerprint, so a revisit gets a 304 without queries or rendering, and
+# rendered HTML is kept per fingerprint so other visitors skip rendering too.
+
+_fragments = {}
+_fragments_fingerprint = None
+_fragments_lock = threading.Lock()
+
+
+def cached_fragment(key, render):
+    """Rendered HTML for `key` at the current catalog fingerprint, or render() it."""
+    global _fragments_fingerprint
+    fingerprint = get_catalog().fingerprint
+    with _fragments_lock:
+        if _fragments_fingerprint != fingerprint:
+            _fragments.clear()
+            _fragments_fingerprint = fingerprint
+        html = _fragments.get(key)
+    if html is None:
+        html = render()
+        with _fragments_lock:
+            if _fragments_fingerprint == fingerprint:
+                _fragments[key] = html
+    return html
+
+
+def catalog_etag(*parts):
+    return hashlib.sha256(repr((get_catalog().fingerprint,) + parts).encode()).hexdigest()[:32]
+
+
+def http_timestamp(value):
+    """A stored (naive UTC) datetime as the aware, whole-second value HTTP dates carry."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def not_modified(etag, last_modified=None):
+    """True when the client's cached copy (If-None-Match / If-Modified-Since) is current."""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified and request.if_modified_since:
+        return request.if_modified_since >= http_timestamp(last_modified)
+    return False
+
+
+def conditional_page(html_or_none, etag, last_modified=None):
+    """Wrap a page with validators; html_or_none=None means answer 304."""
+    if html_or_none is None:
+        response = make_response("", 304)
+    else:
+        response = make_response(html_or_none)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = http_timestamp(last_modified)
+    # Browsers must revalidate, which is a cheap 304 while the catalog is unchanged
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# ========== PAGINATION ==========
+# Listings use keyset pagination on the primary key: ?after=<last id seen> instead
+# of OFFSET, so every page is one index range scan no matter how deep it is.
+
+def keyset_paginate(query, key_column, key=None, descending=False):
+    """One page of `query` after the ?after= cursor, ordered by `key_column`.
+
+    `key` extracts the cursor value from a result row; by default the attribute
+    named like `key_column` is read. Returns (items, next_cursor, page_size), where
+    next_cursor is None on the last page.
+    """
+    page_size = request.args.get("per_page", type=int) or app.config['PAGE_SIZE']
+    page_size = max(1, min(page_size, app.config['PAGE_SIZE_MAX']))
+
+    cursor = request.args.get("after", type=int)
+    if cursor is not None:
+        query = query.filter(key_column < cursor if descending else key_column > cursor)
+    query = query.order_by(key_column.desc() if descending else key_column.asc())
+
+    rows = query.limit(page_size + 1).all()
+    items = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = key(last) if key else getattr(last, key_column.key)
+    return items, next_cursor, page_size
+
+# ========== PROMPT CONTEXT BUDGET ==========
+# Catalog context is collected as scored entries grouped into sections, then the
+# highest-scoring entries are kept until the token budget is spent. A section can
+# reserve a share of the budget that its own entries get first pick of, so the core
+# of a prompt (the islands) cannot be crowded out by long lists. An entry that does
+# not fit whole is cut at a word boundary if a useful part still fits.
+# Token counts are estimated locally (about one token per short word or
+# punctuation mark, more for long words), which is close enough for budgeting.
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+CONTEXT_MIN_PARTIAL_TOKENS = 24
+
+
+def estimate_tokens(text):
+    return sum(1 + len(piece) // 8 for piece in TOKEN_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Longest word-boundary prefix of `text` estimated at no more than `max_tokens` (plus '…')."""
+    used = 1  # the ellipsis
+    words = text.split(" ")
+    for count, word in enumerate(words):
+        used += estimate_tokens(word)
+        if used > max_tokens:
+            return " ".join(words[:count]).rstrip(" ,.;:") + "…"
+    return text
+
+
+class ContextBuilder:
+    """Keeps the best-scoring context entries that fit in `budget` estimated tokens."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._sections = OrderedDict()  # key -> (header, numbered, reserved share of the budget)
+        self._entries = []  # (score, order, section key, text, truncatable)
+        self.report = None
+
+    def section(self, key, header, numbered=False, reserve=0.0):
+        """Declare a section; its entries get first pick of `reserve` (0-1) of the budget."""
+        self._sections.setdefault(key, (header, numbered, reserve))
+
+    def add(self, key, text, score, truncatable=True):
+        self._entries.append((score, len(self._entries), key, text, truncatable))
+
+    def _fit(self, entry, limit, opened):
+        """(text, tokens used including a new header) for `entry` within `limit`, or None."""
+        _, _, key, text, truncatable = entry
+        cost = estimate_tokens(text)
+        header_cost = 0 if key in opened else estimate_tokens(self._sections[key][0])
+        if cost + header_cost <= limit:
+            return text, cost + header_cost
+        if truncatable and limit - header_cost >= CONTEXT_MIN_PARTIAL_TOKENS:
+            cut = truncate_to_tokens(text, limit - header_cost)
+            # A cut that leaves nothing but the ellipsis is dropped instead
+            if cut.rstrip("…").strip():
+                return cut, estimate_tokens(cut) + header_cost
+        return None
+
+    def build(self):
+        """The context text; afterwards `report` says what was kept and dropped."""
+        ranked = sorted(self._entries, key=lambda e: (-e[0], e[1]))
+        kept = {}  # order -> text
+        opened = set()
+        used = 0
+
+        def place(entry, limit):
+            fitted = self._fit(entry, limit, opened)
+            if fitted is None:
+                return 0
+            kept[entry[1]], cost = fitted
+            opened.add(entry[2])
+            return cost
+
+        # Reserved shares first, each section's entries best first
+        for key, (_, _, reserve) in self._sections.items():
+            share = min(int(self.budget * reserve), self.budget - used)
+            for entry in ranked:
+                if entry[2] == key and share > 0:
+                    cost = place(entry, share)
+                    share -= cost
+                    used += cost
+        # Then everything else competes for what is left
+        for entry in ranked:
+            if entry[1] not in kept:
+                used += place(entry, self.budget - used)
+
+        truncated = sum(1 for e in self._entries if e[1] in kept and kept[e[1]] != e[3])
+        dropped = len(self._entries) - len(kept)
+        dropped_tokens = sum(estimate_tokens(e[3]) - estimate_tokens(kept.get(e[1], "")) for e in self._entries)
+
+        blocks = []
+        for key, (header, numbered, _) in self._sections.items():
+            texts = [kept[order] for _, order, entry_key, _, _ in self._entries
+                     if entry_key == key and order in kept]
+            if not texts:
+                continue
+            if numbered:
+                texts = [f"{number}. {text}" for number, text in enumerate(texts, start=1)]
+            blocks.append("\n".join(([header] if header else []) + texts))
+
+        self.report = {
+            "budget": self.budget,
+            "used": used,
+            "kept": len(kept),
+            "truncated": truncated,
+            "dropped": dropped,
+            "dropped_tokens": dropped_tokens,
+        }
+        return "\n\n".join(blocks) + "\n"
+
+
+def build_context(builder, prompt_name):
+    """Build `builder`'s context and record how much of it had to be left out."""
+    context = builder.build()
+    report = builder.report
+    CONTEXT_TOKENS.observe(report["used"], prompt_name, "kept")
+    CONTEXT_TOKENS.observe(report["dropped_tokens"], prompt_name, "dropped")
+    if report["dropped"] or report["truncated"]:
+        app.logger.info(
+            "%s context over budget: kept %d entries (%d truncated), dropped %d, ~%d of %d tokens used, ~%d dropped",
+            prompt_name, report["kept"], report["truncated"], report["dropped"],
+            report["used"], report["budget"], report["dropped_tokens"]
+        )
+    return context
+
 # ========== CHATBOT (Unchanged) ==========
 
 def get_db_context(user_message):
-    """Fetch relevant islands, establishments, and visit data without IDs."""
-    
-    # 1. Initialize context at the very beginning
-    context = ""
-    
-    # 2. Query data
-    islands = Island.query.filter(Island.name.ilike(f"%{user_message}%")).all()
-    establishments = Establishment.query.filter(
-        (Establishment.name.ilike(f"%{user_message}%")) |
-        (Establishment.type.ilike(f"%{user_message}%"))
-    ).all()
+    """Fetch relevant islands, establishments, and visit data without IDs.
+
+    Search matches rank first (by relevance, then popularity), followed by the
+    popularity ranking; everything is fitted into CHAT_CONTEXT_TOKENS.
+    """
+    # 1. Query data: top-k matches from the text index, resolved against the catalog
+    catalog = get_catalog()
+    islands = search_islands(user_message)
+    establishments = search_establishments(user_message)
 
-    # Fallback: If user didn't specify an island, provide the full list
-    if not islands:
-        islands = Island.query.all()
-        
-    # 3. Build Island Section with Numbering
-    if islands:
-        context += "Available Islands (Numbered List):\n"
-        for index, i in enumerate(islands, start=1):
-            # No IDs or asterisks here
-            context += f"{index}. {i.name}: {i.description}. (Location: {i.latitude}, {i.longitude})\n"
-            
-    # 4. Build Establishments Section
-    if establishments:
-        context += "\nPlaces to Stay & Eat:\n"
-        for p in establishments:
-            island_name = "Mainland"
-            if p.island_id:
-                island = Island.query.get(p.island_id)
-                island_name = island.name if island else "Unknown"
-            
-            context += f"- {p.name} ({p.category}) at {island_name}: {p.description}\n"
-            
-    # 5. Add Visit Data
     total_visits_data = db.session.query(
-        Visit.island_id,
-        db.func.sum(Visit.total_visits).label('annual_visits')
+        VisitRollup.island_id,
+        VisitRollup.total_visits.label('annual_visits')
     ).filter(
-        Visit.visit_month.between('2025-01-01', '2025-12-31') 
-    ).group_by(Visit.island_id).order_by(db.desc('annual_visits')).all()
-
-    if total_visits_data:
-        context += "\nIsland Popularity Ranking:\n"
-        for island_id, annual_visits in total_visits_data:
-            island = Island.query.get(island_id)
-            if island:
-                context += f"- {island.name}: {annual_visits:,} visitors per year.\n"
-                
-    return context
+        VisitRollup.period == 'year', stats_year_filter()
+    ).order_by(VisitRollup.total_visits.desc()).all()
+    top_visits = total_visits_data[0][1] if total_visits_data else 0
+    popularity = {island_id: visits / top_visits for island_id, visits in total_visits_data if top_visits}
+
+    # Fallback: If nothing matched, give the model the most visited islands to choose from
+    if not islands:
+        islands = catalog.islands_for_ids(
+            [island_id for island_id, _ in total_visits_data[:app.config['SEARCH_TOP_K']]]
+        ) or catalog.islands[:app.config['SEARCH_TOP_K']]
+        islands.sort(key=lambda i: -popularity.get(i.id, 0))
+
+    builder = ContextBuilder(app.config['CHAT_CONTEXT_TOKENS'])
+    # Half the budget is kept for the islands themselves
+    builder.section("islands", "Available Islands (Numbered List):", numbered=True, reserve=0.5)
+    builder.section("places", "Places to Stay & Eat:")
+    builder.section("ranking", "Island Popularity Ranking:")
+
+    # 2. Islands, best match first; no IDs or asterisks here
+    for rank, i in enumerate(islands):
+        entry = f"{i.name}: {i.description}. (Location: {i.latitude}, {i.longitude})"
+        nearby = catalog.nearby_islands(i)
+        if nearby:
+            entry += "\n   Nearby: " + ", ".join(f"{n.name} ({d:.1f} km)" for d, n in nearby)
+        builder.add("islands", entry, 3 - rank / len(islands) + popularity.get(i.id, 0) / 2)
+
+    # 3. Establishments
+    for rank, p in enumerate(establishments):
+        island_name = "Mainland"
+        if p.island_id:
+            island = catalog.islands_by_id.get(p.island_id)
+            island_name = island.name if island else "Unknown"
+        builder.add("places", f"- {p.name} ({p.category}) at {island_name}: {p.description}",
+                    2 - rank / len(establishments) + popularity.get(p.island_id, 0) / 2)
+
+    # 4. Visit data, most visited first; fills whatever budget is left
+    for island_id, annual_visits in total_visits_data:
+        island = catalog.islands_by_id.get(island_id)
+        if island:
+            builder.add("ranking", f"- {island.name}: {annual_visits:,} visitors per year.",
+                        popularity.get(island_id, 0), truncatable=False)
+
+    return build_context(builder, "chat")
 
 
 def link_islands_places(text):
     """Replace island/place names in AI-generated text with clickable links."""
-    islands = Island.query.all()
-    establishments = Establishment.query.all()
+    return get_catalog().linker.link(text)
 
-    for obj_list, base_url in [(islands, '/island/'), (establishments, '/place/')]:
-        sorted_list = sorted(obj_list, key=lambda x: len(x.name), reverse=True)
-        for obj in sorted_list:
-            pattern = r'\b' + re.escape(obj.name) + r'\b'
-            text = re.sub(pattern, f"<a href='{base_url}{obj.id}'>{obj.name}</a>", text)
+def build_chat_prompt(user_message, db_context):
+    return f"""
+You are WiseBot, a friendly travel assistant specializing in Philippine destinations.
+Use the following information, especially the visitor statistics, to provide helpful suggestions to the user.
+Do not mention the source of your information.
+
+Information:
+{db_context}
+
+User: {user_message}
+AI:
+"""
 
-    return text
 
 @app.route("/ask", methods=["POST"])
 def ask():
@@ -310,24 +3166,317 @@ def ask():
     with app.app_context():
         db_context = get_db_context(user_message)
     
-    prompt = f"""
-You are WiseBot, a friendly travel assistant specializing in Philippine destinations.
-Use the following information, especially the visitor statistics, to provide helpful suggestions to the user.
-Do not mention the source of your information.
-
-Information:
-{db_context}
-
-User: {user_message}
-AI:
-"""
+    prompt = build_chat_prompt(user_message, db_context)
     try:
-        response = chat_model.generate_content(prompt)
-        linked_response = link_islands_places(response.text)
+        linked_response = link_islands_places(generate_text(prompt))
         return jsonify({"response": linked_response})
     except Exception as e:
         return jsonify({"response": f"⚠️ Chat error: {str(e)}"})
 
+
+# Text up to the last sentence end (., ! or ? followed by whitespace) or newline
+SENTENCE_BOUNDARY = re.compile(r'[.!?](?=\s)|\n')
+
+
+def split_complete_sentences(buffer):
+    """Split streamed text into (complete sentences, unfinished remainder)."""
+    last_end = 0
+    for match in SENTENCE_BOUNDARY.finditer(buffer):
+        last_end = match.end()
+    return buffer[:last_end], buffer[last_end:]
+
+
+def sse_event(payload, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(payload)}\n\n"
+
+
+@app.route("/ask/stream", methods=["POST"])
+def ask_stream():
+    """Same as /ask, but relays the answer as Server-Sent Events while it is generated.
+
+    Each `data:` event carries {"html": ...} for one or more completed sentences,
+    already linked; a final `done` event closes the stream.
+    """
+    data = request.json or {}
+    user_message = data.get("message", "").strip()
+
+    def generate():
+        if not user_message:
+            yield sse_event({"html": "⚠️ Please type a message."})
+            yield sse_event({}, event="done")
+            return
+
+        prompt = build_chat_prompt(user_message, get_db_context(user_message))
+        linker = get_catalog().linker
+        cache_key = llm_cache_key(prompt)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            yield sse_event({"html": linker.link(cached)})
+            yield sse_event({}, event="done")
+            return
+
+        buffer = ""
+        answer = ""
+        try:
+            for chunk in llm.stream(prompt):
+                buffer += chunk
+                answer += chunk
+                complete, buffer = split_complete_sentences(buffer)
+                if complete:
+                    yield sse_event({"html": linker.link(complete)})
+            if buffer:
+                yield sse_event({"html": linker.link(buffer)})
+            llm_cache.set(cache_key, answer)
+        except Exception as e:
+            yield sse_event({"html": f"⚠️ Chat error: {str(e)}"})
+        yield sse_event({}, event="done")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ========== ASYNC CHAT (ASGI) ==========
+# /ask and /ask/stream spend nearly all their time waiting on the model. Served
+# through `asgi_app` (e.g. `uvicorn app:asgi_app`), both run on the event loop
+# with the model's async client, so hundreds of chats can be in flight without a
+# thread each; only the few milliseconds of catalog/DB work that build the prompt
+# use a worker thread. Every other request goes to the Flask app unchanged via
+# asgiref's WsgiToAsgi. plan_trip needs no async path: it returns at once and the
+# itinerary is generated by the job pool.
+
+ASGI_MAX_BODY = 64 * 1024
+_wsgi_fallback = WsgiToAsgi(app) if WsgiToAsgi else None
+
+
+def prepare_chat(user_message):
+    """(prompt, cache key, linker) for a chat message; blocking, so run it in a thread."""
+    with app.app_context():
+        prompt = build_chat_prompt(user_message, get_db_context(user_message))
+        return prompt, llm_cache_key(prompt), get_catalog().linker
+
+
+async def _read_json_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > ASGI_MAX_BODY:
+            return None
+        if not message.get("more_body"):
+            break
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _send_response_start(send, status, content_type, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode())]
+                   + [(name.encode(), value.encode()) for name, value in headers],
+    })
+
+
+async def _send_json(send, payload, status=200):
+    await _send_response_start(send, status, "application/json")
+    await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+    return status
+
+
+async def ask_async(receive, send):
+    """Async twin of ask()."""
+    data = await _read_json_body(receive)
+    if data is None:
+        return await _send_json(send, {"error": "Expected a JSON body."}, 400)
+    user_message = str(data.get("message", "")).strip()
+    if not user_message:
+        return await _send_json(send, {"response": "⚠️ Please type a message."})
+
+    prompt, cache_key, linker = await asyncio.to_thread(prepare_chat, user_message)
+    try:
+        # The cache may be backed by a SQLite file, so it is read and written off the loop
+        answer = await asyncio.to_thread(llm_cache.get, cache_key)
+        if answer is None:
+            answer = await llm.agenerate(prompt)
+            await asyncio.to_thread(llm_cache.set, cache_key, answer)
+        return await _send_json(send, {"response": linker.link(answer)})
+    except Exception as e:
+        return await _send_json(send, {"response": f"⚠️ Chat error: {str(e)}"})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _stream_chat(user_message, emit):
+    """Send the answer to `user_message` as SSE events through `emit`."""
+    if not user_message:
+        await emit({"html": "⚠️ Please type a message."})
+        return
+    prompt, cache_key, linker = await asyncio.to_thread(prepare_chat, user_message)
+    cached = await asyncio.to_thread(llm_cache.get, cache_key)
+    if cached is not None:
+        await emit({"html": linker.link(cached)})
+        return
+
+    buffer = ""
+    answer = ""
+    chunks = llm.astream(prompt)
+    try:
+        async for chunk in chunks:
+            buffer += chunk
+            answer += chunk
+            complete, buffer = split_complete_sentences(buffer)
+            if complete:
+                await emit({"html": linker.link(complete)})
+        if buffer:
+            await emit({"html": linker.link(buffer)})
+        await asyncio.to_thread(llm_cache.set, cache_key, answer)
+    except Exception as e:
+        await emit({"html": f"⚠️ Chat error: {str(e)}"})
+    finally:
+        # Also runs when the client goes away (cancellation) or emit() fails
+        await chunks.aclose()
+
+
+async def ask_stream_async(receive, send):
+    """Async twin of ask_stream(); stops generating as soon as the client disconnects."""
+    data = await _read_json_body(receive)
+    if data is None:
+        return await _send_json(send, {"error": "Expected a JSON body."}, 400)
+    user_message = str(data.get("message", "")).strip()
+
+    await _send_response_start(send, 200, "text/event-stream",
+                               [("cache-control", "no-cache"), ("x-accel-buffering", "no")])
+
+    async def emit(payload, event=None):
+        await send({"type": "http.response.body", "body": sse_event(payload, event).encode(), "more_body": True})
+
+    streaming = asyncio.ensure_future(_stream_chat(user_message, emit))
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({streaming, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (streaming, disconnected):
+            task.cancel()
+        await asyncio.gather(streaming, disconnected, return_exceptions=True)
+    if disconnected.done() and not disconnected.cancelled():
+        return 499  # client closed the connection
+    streaming.result()
+    await emit({}, event="done")
+    await send({"type": "http.response.body", "body": b""})
+    return 200
+
+
+# path -> (Flask endpoint name, used as the metrics label so both paths share a series; handler)
+ASYNC_CHAT_ROUTES = {"/ask": ("ask", ask_async), "/ask/stream": ("ask_stream", ask_stream_async)}
+
+
+async def asgi_app(scope, receive, send):
+    """ASGI entry point: async chat endpoints natively, everything else via Flask."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    route = None
+    if scope["type"] == "http" and scope["method"] == "POST":
+        route = ASYNC_CHAT_ROUTES.get(scope["path"])
+    if route is not None:
+        endpoint, handler = route
+        started = time.perf_counter()
+        status = await handler(receive, send)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, "POST", status)
+        return
+
+    if _wsgi_fallback is None:
+        await _send_response_start(send, 501, "text/plain")
+        await send({"type": "http.response.body",
+                    "body": b"Install asgiref (pip install 'flask[async]') to serve the full app over ASGI."})
+        return
+    await _wsgi_fallback(scope, receive, send)
+
+# ========== PASSWORD HASHING ==========
+# Hashing is deliberately CPU-heavy, so a burst of logins could tie up every
+# worker. Hashes are computed on a small dedicated pool (hashlib releases the GIL
+# while it works) with a cap on waiting checks; past the cap a login is refused
+# quickly instead of queueing behind the burst. Unknown emails are checked
+# against a dummy hash so response times do not reveal which accounts exist.
+
+class PasswordHasherBusy(Exception):
+    """Too many password checks are already waiting."""
+
+
+password_executor = ThreadPoolExecutor(
+    max_workers=app.config['PASSWORD_HASH_WORKERS'], thread_name_prefix="password-hash"
+)
+_password_slots = threading.BoundedSemaphore(
+    app.config['PASSWORD_HASH_WORKERS'] + app.config['PASSWORD_HASH_MAX_PENDING']
+)
+_password_params = {}
+
+
+def _run_password_task(fn, *args):
+    if not _password_slots.acquire(blocking=False):
+        raise PasswordHasherBusy("Too many sign-ins right now. Please try again in a moment.")
+    try:
+        future = password_executor.submit(fn, *args)
+    except BaseException:
+        _password_slots.release()
+        raise
+    future.add_done_callback(lambda _: _password_slots.release())
+    try:
+        return future.result(timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+    except FutureTimeout:
+        raise PasswordHasherBusy("Signing in is taking too long right now. Please try again in a moment.")
+
+
+def _prepare_password_params(method):
+    """(parameter prefix of a fresh hash, dummy hash for unknown users) for `method`.
+    Runs on the hashing pool; two racing computations just keep the first result."""
+    if method not in _password_params:
+        dummy = generate_password_hash(uuid.uuid4().hex, method=method)
+        _password_params.setdefault(method, (dummy.split("$", 1)[0], dummy))
+    return _password_params[method]
+
+
+def _current_password_params():
+    """_prepare_password_params() for the configured method. configure_services() starts
+    it on the pool, so it is normally ready; if not, the request waits on the pool."""
+    method = app.config['PASSWORD_HASH_METHOD']
+    return _password_params.get(method) or _run_password_task(_prepare_password_params, method)
+
+
+def hash_password(password):
+    return _run_password_task(generate_password_hash, password, app.config['PASSWORD_HASH_METHOD'])
+
+
+def password_needs_rehash(stored_hash):
+    return not stored_hash or stored_hash.split("$", 1)[0] != _current_password_params()[0]
+
+
+def verify_password(stored_hash, password):
+    """True if `password` matches `stored_hash`; a missing hash (unknown user) never matches."""
+    if not stored_hash:
+        # Spend the same effort as a real check so unknown accounts are not revealed
+        _run_password_task(check_password_hash, _current_password_params()[1], password)
+        return False
+    return _run_password_task(check_password_hash, stored_hash, password)
+
+
+password_executor.submit(_prepare_password_params, app.config['PASSWORD_HASH_METHOD'])
+
 # ========== ROUTES (Unchanged as they rely on the 'image' attribute, which is now mapped) ==========
 @app.route("/")
 def index():
@@ -341,7 +3490,21 @@ def login():
         pwd = request.form.get("password", "")
         user = User.query.filter_by(email=email).first()
 
-        if user and check_password_hash(user.password_hash, pwd):
+        try:
+            valid = verify_password(user.password_hash if user else None, pwd)
+        except PasswordHasherBusy as e:
+            flash(str(e), "warning")
+            return render_template("login.html"), 503
+
+        if valid:
+            # Upgrading an old hash can wait for a later login if the pool is busy
+            try:
+                if password_needs_rehash(user.password_hash):
+                    user.password_hash = hash_password(pwd)
+                    db.session.commit()
+            except PasswordHasherBusy:
+                app.logger.warning("Skipped rehashing the password of user %s: hasher busy", user.id)
+
             session.clear()
             session["user_id"] = user.id
             session["role"] = user.role
@@ -386,6 +3549,11 @@ def add_establishment():
         return redirect(url_for("login"))
 
     if request.method == "POST":
+        try:
+            capacity = parse_capacity(request.form.get("capacity"))
+        except ValueError:
+            flash("Capacity must be a whole number of at least 1, or empty for no limit.", "danger")
+            return redirect(request.url)
         est = Establishment(
             name=request.form["name"],
             type=request.form["type"],
@@ -394,12 +3562,14 @@ def add_establishment():
             contact_number=request.form["contact"],
             opening_hours=request.form["hours"],
             establishments_image=request.form["image"],
+            capacity=capacity,
             owner_id=session["user_id"],
             is_approved=0
         )
 
         db.session.add(est)
         db.session.commit()
+        invalidate_catalog()
 
         flash("Establishment submitted for approval", "success")
         return redirect(url_for("owner_dashboard"))
@@ -419,49 +3589,135 @@ def delete_establishment(id):
         return redirect(url_for("home"))
 
     est = Establishment.query.filter_by(
-        id=id,
+        establishment_id=id,
         owner_id=owner.id
     ).first_or_404()
 
     db.session.delete(est)
     db.session.commit()
+    invalidate_catalog()
 
     flash("Establishment deleted successfully.", "success")
     return redirect(url_for("owner_dashboard"))
 
 from sqlalchemy import func
 
+# ========== ADMIN REPORTS ==========
+# All report numbers come from two month-level aggregates (bookings by status,
+# establishment and check-in month; visits by island and month). They are cached
+# for REPORT_CACHE_TTL seconds and every date/island filter is sliced from them in
+# Python, so changing filters never hits the database cold.
+
+_report_lock = threading.Lock()
+_report_aggregates = None
+
+
+def _load_report_aggregates():
+    booking_year = func.extract('year', Booking.check_in_date)
+    booking_month = func.extract('month', Booking.check_in_date)
+    bookings = db.session.query(
+        Booking.status, Booking.establishment_id, booking_year, booking_month,
+        func.count(Booking.booking_id)
+    ).group_by(Booking.status, Booking.establishment_id, booking_year, booking_month).all()
+
+    visits = db.session.query(
+        VisitRollup.island_id, VisitRollup.period_start, VisitRollup.total_visits
+    ).filter(VisitRollup.period == 'month').all()
+
+    return {
+        "loaded_at": time.time(),
+        "bookings": [(status, est_id, int(year), int(month), count)
+                     for status, est_id, year, month, count in bookings],
+        "visits": [(island_id, start.year, start.month, total)
+                   for island_id, start, total in visits],
+    }
+
+
+def get_report_aggregates():
+    global _report_aggregates
+    with _report_lock:
+        aggregates = _report_aggregates
+        if aggregates is None or time.time() - aggregates["loaded_at"] >= app.config['REPORT_CACHE_TTL']:
+            aggregates = _load_report_aggregates()
+            _report_aggregates = aggregates
+    return aggregates
+
+
+def parse_report_month(value):
+    """'YYYY-MM' from an <input type="month"> as a (year, month) tuple, or None."""
+    try:
+        parsed = datetime.strptime(value or "", "%Y-%m")
+    except ValueError:
+        return None
+    return (parsed.year, parsed.month)
+
+
+def build_report(start=None, end=None, island_id=None):
+    """Booking status counts and top islands/establishments for the given slice.
+
+    `start` and `end` are inclusive (year, month) tuples; None means unbounded.
+    """
+    aggregates = get_report_aggregates()
+    catalog = get_catalog()
+
+    def in_range(year, month):
+        return (start is None or (year, month) >= start) and (end is None or (year, month) <= end)
+
+    bookings_summary = {'pending': 0, 'confirmed': 0, 'cancelled': 0}
+    bookings_per_est = {}
+    for status, est_id, year, month, count in aggregates["bookings"]:
+        if not in_range(year, month):
+            continue
+        est = catalog.establishments_by_id.get(est_id)
+        if island_id and (est is None or est.island_id != island_id):
+            continue
+        if status in bookings_summary:
+            bookings_summary[status] += count
+        if est is not None:
+            bookings_per_est[est_id] = bookings_per_est.get(est_id, 0) + count
+
+    visits_per_island = {}
+    for visit_island_id, year, month, total in aggregates["visits"]:
+        if not in_range(year, month) or (island_id and visit_island_id != island_id):
+            continue
+        visits_per_island[visit_island_id] = visits_per_island.get(visit_island_id, 0) + total
+
+    top_islands = [
+        (catalog.islands_by_id[i].name, total)
+        for i, total in sorted(visits_per_island.items(), key=lambda item: item[1], reverse=True)
+        if i in catalog.islands_by_id
+    ][:5]
+    top_establishments = [
+        (catalog.establishments_by_id[e].name, total)
+        for e, total in sorted(bookings_per_est.items(), key=lambda item: item[1], reverse=True)
+    ][:5]
+
+    return bookings_summary, top_islands, top_establishments
+
+
 @app.route("/admin/reports")
 def admin_reports():
     if session.get("role") != "admin":
         flash("Access denied", "danger")
         return redirect(url_for("login"))
 
-    # Bookings summary
-    bookings_summary = {
-        'pending': db.session.query(func.count(Booking.booking_id)).filter_by(status='pending').scalar(),
-        'confirmed': db.session.query(func.count(Booking.booking_id)).filter_by(status='confirmed').scalar(),
-        'cancelled': db.session.query(func.count(Booking.booking_id)).filter_by(status='cancelled').scalar(),
-    }
-
-    # Top islands
-    top_islands = db.session.query(
-        Island.name, func.sum(Visit.total_visits).label('total')
-    ).join(Visit).group_by(Island.id).order_by(func.sum(Visit.total_visits).desc()).limit(5).all()
+    start = parse_report_month(request.args.get("start"))
+    end = parse_report_month(request.args.get("end"))
+    island_id = request.args.get("island", type=int)
 
-    # Top establishments
-    top_establishments = db.session.query(
-        Establishment.name, func.count(Booking.booking_id).label('total')
-    ).join(Booking, Booking.establishment_id == Establishment.establishment_id)\
-     .group_by(Establishment.establishment_id)\
-     .order_by(func.count(Booking.booking_id).desc())\
-     .limit(5).all()
+    bookings_summary, top_islands, top_establishments = build_report(start, end, island_id)
 
     return render_template(
         "admin_reports.html",
         bookings_summary=bookings_summary,
         top_islands=top_islands,
-        top_establishments=top_establishments
+        top_establishments=top_establishments,
+        islands=get_catalog().islands,
+        filters={
+            "start": request.args.get("start", "") if start else "",
+            "end": request.args.get("end", "") if end else "",
+            "island": island_id,
+        }
     )
 
 # Update user role
@@ -479,7 +3735,7 @@ def edit_user_role(user_id):
         flash("User role updated.", "success")
     else:
         flash("Invalid role.", "danger")
-    return redirect(url_for("manage_users"))
+    return redirect(url_for("admin_manage_users"))
 
 # Delete user
 @app.route("/admin/user/delete/<int:user_id>", methods=["POST"])
@@ -492,26 +3748,19 @@ def delete_user(user_id):
     db.session.delete(user)
     db.session.commit()
     flash("User deleted.", "success")
-    return redirect(url_for("manage_users"))
-
-# Main route to display page
-@app.route("/admin/manage_users")
-def manage_users():
-    if session.get("role") != "admin":
-        flash("Access denied", "danger")
-        return redirect(url_for("login"))
-    users = User.query.all()
-    return render_template("admin_manage_users.html", users=users)
+    return redirect(url_for("admin_manage_users"))
 
+# Main route to display page, newest users first
 @app.route("/admin/manage_users")
 def admin_manage_users():
     if session.get("role") != "admin":
         flash("Access denied", "danger")
         return redirect(url_for("login"))
 
-    users = User.query.order_by(User.id.desc()).all()
+    users, next_cursor, page_size = keyset_paginate(User.query, User.id, descending=True)
 
-    return render_template("admin_manage_users.html", users=users)
+    return render_template("admin_manage_users.html", users=users,
+                           next_cursor=next_cursor, page_size=page_size)
 
 @app.route("/admin/user/delete/<int:user_id>", methods=["POST"])
 def admin_delete_user(user_id):
@@ -568,13 +3817,16 @@ def admin_dashboard():
         flash("Access denied", "danger")
         return redirect(url_for("login"))
 
-    pending_establishments = Establishment.query.filter_by(
-        is_approved=0
-    ).all()
+    pending_establishments, next_cursor, page_size = keyset_paginate(
+        Establishment.query.filter_by(is_approved=0),
+        Establishment.establishment_id
+    )
 
     return render_template(
         "admin_dashboard.html",
-        establishments=pending_establishments
+        establishments=pending_establishments,
+        next_cursor=next_cursor,
+        page_size=page_size
     )
 
 @app.route("/owner/establishment/edit/<int:id>", methods=["GET", "POST"])
@@ -584,19 +3836,26 @@ def edit_establishment(id):
         return redirect(url_for("login"))
 
     est = Establishment.query.filter_by(
-        id=id,
+        establishment_id=id,
         owner_id=session["user_id"]
     ).first_or_404()
 
     if request.method == "POST":
+        try:
+            capacity = parse_capacity(request.form.get("capacity"))
+        except ValueError:
+            flash("Capacity must be a whole number of at least 1, or empty for no limit.", "danger")
+            return redirect(request.url)
         est.name = request.form["name"]
         est.type = request.form["type"]
         est.location = request.form["location"]
         est.contact_number = request.form["contact_number"]
         est.opening_hours = request.form["opening_hours"]
         est.description = request.form["description"]
+        est.capacity = capacity
 
         db.session.commit()
+        invalidate_catalog()
         flash("Establishment updated successfully", "success")
         return redirect(url_for("owner_dashboard"))
 
@@ -613,6 +3872,7 @@ def approve_establishment(id):
     est.rejected_reason = None
 
     db.session.commit()
+    invalidate_catalog()
     flash("Establishment approved", "success")
     return redirect(url_for("admin_dashboard"))
 
@@ -626,6 +3886,7 @@ def reject_establishment(id):
     est.rejected_reason = request.form["reason"]
 
     db.session.commit()
+    invalidate_catalog()
     flash("Establishment rejected", "warning")
     return redirect(url_for("admin_dashboard"))
 
@@ -645,11 +3906,13 @@ def signup():
             flash("Passwords do not match", "danger")
         else:
             try:
-                new_user = User(name=name, email=email, password_hash=generate_password_hash(pwd))
+                new_user = User(name=name, email=email, password_hash=hash_password(pwd))
                 db.session.add(new_user)
                 db.session.commit()
                 flash("Account created! You can now log in.", "success")
                 return redirect(url_for("login"))
+            except PasswordHasherBusy as e:
+                flash(str(e), "warning")
             except Exception as e:
                 db.session.rollback()
                 flash(f"Database error during sign up: {e}", "danger")
@@ -661,13 +3924,17 @@ def plan_trip():
     if "user_id" not in session:
         return redirect(url_for("login"))
 
-    destinations_list = Island.query.all()
+    catalog = get_catalog()
+    destinations_list = catalog.islands
 
     if request.method == "POST":
         destination_ids = request.form.getlist("destinations")
         if not destination_ids:
             flash("Please select at least one destination.", "danger")
             return redirect(url_for("plan_trip"))
+        if len(set(destination_ids)) > app.config['MAX_TRIP_DESTINATIONS']:
+            flash(f"Please select at most {app.config['MAX_TRIP_DESTINATIONS']} destinations.", "danger")
+            return redirect(url_for("plan_trip"))
 
         try:
             budget_per_person = float(request.form.get("budget"))
@@ -676,25 +3943,34 @@ def plan_trip():
         except (ValueError, TypeError):
             flash("Invalid numeric input for budget, days, or number of people.", "danger")
             return redirect(url_for("plan_trip"))
+        if not 1 <= days <= app.config['MAX_TRIP_DAYS']:
+            flash(f"Trips can be 1 to {app.config['MAX_TRIP_DAYS']} days long.", "danger")
+            return redirect(url_for("plan_trip"))
+        if people < 1 or not math.isfinite(budget_per_person) or budget_per_person < 0:
+            flash("Please enter at least one person and a budget of zero or more.", "danger")
+            return redirect(url_for("plan_trip"))
 
-        selected_islands = Island.query.filter(Island.id.in_(destination_ids)).all()
+        selected_islands = catalog.islands_for_ids(destination_ids)
         if not selected_islands:
             flash("Selected islands not found.", "danger")
             return redirect(url_for("plan_trip"))
 
-        establishments = Establishment.query.filter(
-            Establishment.island_id.in_([i.id for i in selected_islands])
-        ).all()
+        selected_islands, skeleton = route_skeleton(selected_islands, days)
 
-        db_context = ""
+        selected_ids = {i.id for i in selected_islands}
+        establishments = [p for p in catalog.establishments if p.island_id in selected_ids]
+
+        # Each selected island gets an equal share of most of PLAN_CONTEXT_TOKENS for
+        # its description and best-rated places; the best places overall fill the rest
+        builder = ContextBuilder(app.config['PLAN_CONTEXT_TOKENS'])
         for island in selected_islands:
-            db_context += f"Island: {island.name}\nDescription: {island.description}\nDetails: {island.details}\n\n"
-            island_establishments = [p for p in establishments if p.island_id == island.id]
-            if island_establishments:
-                db_context += "Places:\n"
-                for p in island_establishments:
-                    db_context += f"- {p.name} ({p.category}): {p.description}\n"
-            db_context += "\n"
+            builder.section(island.id, f"Island: {island.name}", reserve=0.8 / len(selected_islands))
+            builder.add(island.id, f"Description: {island.description}\nDetails: {island.details}", 10)
+            for p in establishments:
+                if p.island_id == island.id:
+                    builder.add(island.id, f"- {p.name} ({p.category}): {p.description}",
+                                1 + (p.rating or 0) / 5)
+        db_context = build_context(builder, "plan")
 
         islands_names = ", ".join([i.name for i in selected_islands])
 
@@ -702,35 +3978,54 @@ def plan_trip():
             f"You are a Philippine travel expert. Create a detailed, day-by-day travel itinerary "
             f"for a trip to: {islands_names}. The trip length is exactly {days} days, for {people} people, "
             f"with a budget of PHP {budget_per_person} per person.\n\n"
+            f"Follow this route, which is already optimized for travel distance:\n{skeleton}\n\n"
             f"Use the following information about islands and places:\n{db_context}\n"
             "Include local food, transport, and estimated cost per day per person. "
             "Use Markdown and Day headers."
         )
 
-        try:
-            response = chat_model.generate_content(plan_prompt)
-            itinerary = response.text
-
-            day_splits = re.split(r'Day\s+\d+[:.\s]*', itinerary, flags=re.IGNORECASE)
-            filtered_itinerary = ""
-
-            for i in range(1, min(days + 1, len(day_splits))):
-                filtered_itinerary += f"Day {i}\n{day_splits[i].strip()}\n\n"
-
-            return render_template(
-                "plan_result.html",
-                destination=islands_names,
-                itinerary=filtered_itinerary.strip(),
-                budget=budget_per_person,
-                days=days,
-                people=people
-            )
-
-        except Exception as e:
-            flash(f"Error generating plan: {e}", "danger")
+        job = submit_plan_job(session["user_id"], plan_prompt, islands_names,
+                              days, people, budget_per_person)
+        if job is None:
+            flash("The trip planner is busy right now. Please try again in a moment.", "warning")
             return redirect(url_for("plan_trip"))
 
-    return render_template("plan_trip.html", destinations=destinations_list)
+        return redirect(url_for("plan_job", job_id=job.job_id))
+
+    return render_template("plan_trip.html", destinations=destinations_list,
+                           max_days=app.config['MAX_TRIP_DAYS'],
+                           max_destinations=app.config['MAX_TRIP_DESTINATIONS'])
+
+
+@app.route("/plan_trip/job/<job_id>")
+def plan_job(job_id):
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    job = TripPlanJob.query.filter_by(job_id=job_id, user_id=session["user_id"]).first_or_404()
+    return render_template(
+        "plan_result.html",
+        job=job,
+        destination=job.destination,
+        itinerary=job.itinerary or "",
+        budget=job.budget,
+        days=job.days,
+        people=job.people
+    )
+
+
+@app.route("/plan_trip/job/<job_id>/status")
+def plan_job_status(job_id):
+    if "user_id" not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    job = TripPlanJob.query.filter_by(job_id=job_id, user_id=session["user_id"]).first_or_404()
+    return jsonify({
+        "job_id": job.job_id,
+        "status": job.status,
+        "itinerary": job.itinerary if job.status == "done" else None,
+        "error": job.error if job.status == "failed" else None,
+    })
 
 
 @app.route("/home")
@@ -750,56 +4045,102 @@ def home():
         Island.id,
         Island.name,
         Island.image,
-        db.func.sum(Visit.total_visits).label('annual_visits')
-    ).join(Visit, Island.id == Visit.island_id).filter(
-        Visit.visit_month.between('2025-01-01', '2025-12-31')
-    ).group_by(Island.id, Island.name, Island.image).order_by(
-        db.desc('annual_visits')
+        VisitRollup.total_visits.label('annual_visits')
+    ).join(VisitRollup, Island.id == VisitRollup.island_id).filter(
+        VisitRollup.period == 'year', stats_year_filter()
+    ).order_by(
+        VisitRollup.total_visits.desc()
     ).limit(10).all()
 
-    islands = Island.query.all()
-    establishments = Establishment.query.filter_by(is_approved=1).all()
+    catalog = get_catalog()
+    # The island and place grids are the same for every visitor
+    catalog_grids = cached_fragment("home_grids", lambda: render_template(
+        "_home_grids.html",
+        islands=catalog.islands,
+        places=catalog.approved_establishments
+    ))
 
 
     return render_template(
         "home.html",
         user=user_data.name,
-        islands=islands,
-        places=establishments,
+        catalog_grids=Markup(catalog_grids),
         top_islands=top_islands_data
     )
 
 
 
-from sqlalchemy import text # Ensure this import is at the top of app.py
-# Place this above your @app.route definitions
-class Activity(db.Model):
-    __tablename__ = 'activities'
-    activity_id = db.Column(db.Integer, primary_key=True)
-    island_id = db.Column(db.Integer, db.ForeignKey('islands.island_id'))
-    name = db.Column(db.String(255), nullable=False)
-    description = db.Column(db.Text)
-    price = db.Column(db.Float)
-    created_datetime_id = db.Column(db.Integer)
-    updated_datetime_id = db.Column(db.Integer)
-
 @app.route('/island/<int:island_id>')
 def island_details(island_id):
     # 1. Fetch the specific island
-    island = Island.query.get_or_404(island_id)
-    
-    # 2. FIX: Fetch only activities belonging to THIS island_id
-    # This prevents the list from displaying activities from every island in your DB
-    # Use this if your database table itself contains duplicate entries
-    activities = Activity.query.filter_by(island_id=island_id).group_by(Activity.name).all()
-    
-    # 3. Fetch establishments for this island
-    establishments = Establishment.query.filter_by(island_id=island_id).all()
-    
-    return render_template("island_details.html", 
-                           island=island, 
-                           places=establishments, 
-                           activities=activities)
+    catalog = get_catalog()
+    island = catalog.islands_by_id.get(island_id)
+    if island is None:
+        abort(404)
+
+    etag = catalog_etag("island", island_id)
+    if not_modified(etag):
+        return conditional_page(None, etag)
+
+    # 2. Activities (one per name) and establishments of THIS island, rendered once
+    # per catalog version
+    html = cached_fragment(("island", island_id), lambda: render_template(
+        "island_details.html",
+        island=island,
+        places=catalog.establishments_for_island(island_id),
+        activities=catalog.activities_for_island(island_id),
+        nearby_islands=catalog.nearby_islands(island)
+    ))
+    return conditional_page(html, etag)
+
+
+def _coordinate_args():
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    if lat is None or lng is None or not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+        abort(400, description="lat and lng query parameters are required")
+    return lat, lng
+
+
+def _geo_json(results, kind):
+    return [
+        {
+            "id": item.id,
+            "name": item.name,
+            "distance_km": round(distance, 3),
+            "url": url_for("island_details" if kind == "islands" else "place_details", **(
+                {"island_id": item.id} if kind == "islands" else {"place_id": item.id}
+            )),
+        }
+        for distance, item in results
+    ]
+
+
+@app.route("/api/islands/nearby")
+def islands_nearby():
+    """Islands within ?radius_km= (default 10) of ?lat=&lng=, nearest first."""
+    lat, lng = _coordinate_args()
+    radius_km = request.args.get("radius_km", 10.0, type=float)
+    if radius_km is None or not 0 < radius_km <= 500:
+        abort(400, description="radius_km must be between 0 and 500")
+    results = get_catalog().island_index.within(lat, lng, radius_km)
+    return jsonify({"islands": _geo_json(results, "islands")})
+
+
+@app.route("/api/nearest")
+def nearest_to_point():
+    """The ?k= (default 5) islands or establishments (?kind=) nearest to ?lat=&lng=."""
+    lat, lng = _coordinate_args()
+    k = max(1, min(request.args.get("k", 5, type=int), 50))
+    kind = request.args.get("kind", "islands")
+    catalog = get_catalog()
+    if kind == "islands":
+        index = catalog.island_index
+    elif kind == "establishments":
+        index = catalog.establishment_index
+    else:
+        return jsonify({"error": "kind must be 'islands' or 'establishments'"}), 400
+    return jsonify({kind: _geo_json(index.nearest(lat, lng, k), kind)})
 # --- ROUTE TO DELETE A BOOKING ---
 @app.route('/delete_booking/<int:booking_id>', methods=['POST'])
 def delete_booking(booking_id):
@@ -828,9 +4169,26 @@ def edit_booking(booking_id):
     
     if request.method == 'POST':
         # 1. Capture the new data from the form
-        booking.check_in_date = request.form.get('check_in_date')
-        booking.check_out_date = request.form.get('check_out_date')
-        booking.guests = request.form.get('guests')
+        try:
+            check_in_date = datetime.strptime(request.form.get('check_in_date', ''), "%Y-%m-%d").date()
+            check_out = request.form.get('check_out_date')
+            check_out_date = datetime.strptime(check_out, "%Y-%m-%d").date() if check_out else None
+            guests = int(request.form.get('guests', ''))
+        except ValueError:
+            flash("Invalid dates or number of guests.", "danger")
+            return redirect(request.url)
+
+        # 📅 The new dates must not overbook the place (ignoring this booking itself)
+        place = Establishment.query.get_or_404(booking.establishment_id)
+        problem = reserve_capacity(place, check_in_date, check_out_date, guests,
+                                   exclude_booking_id=booking.booking_id)
+        if problem:
+            flash(problem, "danger")
+            return redirect(request.url)
+
+        booking.check_in_date = check_in_date
+        booking.check_out_date = check_out_date
+        booking.guests = guests
         booking.notes = request.form.get('notes')
         
         # 2. Save changes to the database
@@ -847,26 +4205,39 @@ def place_details(place_id):
     if "user_id" not in session:
         return redirect(url_for("login"))
 
-    establishment = Establishment.query.get_or_404(place_id)
-    return render_template("place_details.html", place=establishment)
+    establishment = get_catalog().establishments_by_id.get(place_id)
+    if establishment is None:
+        abort(404)
+
+    etag = catalog_etag("place", place_id)
+    if not_modified(etag, establishment.updated_at):
+        return conditional_page(None, etag, establishment.updated_at)
+
+    html = cached_fragment(("place", place_id), lambda: render_template(
+        "place_details.html", place=establishment
+    ))
+    return conditional_page(html, etag, establishment.updated_at)
 
 @app.route("/my-bookings")
 def my_bookings():
     if session.get("role") != "user":
         return redirect(url_for("login"))
 
-    bookings = (
-    db.session.query(Booking, Establishment)
-    .join(Establishment, Booking.establishment_id == Establishment.establishment_id)
-    .filter(Booking.user_id == session["user_id"])
-    .order_by(Booking.booking_id.desc())
-    .all()
+    bookings, next_cursor, page_size = keyset_paginate(
+        db.session.query(Booking, Establishment)
+        .join(Establishment, Booking.establishment_id == Establishment.establishment_id)
+        .filter(Booking.user_id == session["user_id"]),
+        Booking.booking_id,
+        key=lambda row: row[0].booking_id,
+        descending=True
     )
 
 
     return render_template(
         "my_bookings.html",
-        bookings=bookings
+        bookings=bookings,
+        next_cursor=next_cursor,
+        page_size=page_size
     )
 
 @app.route("/owner/bookings")
@@ -876,14 +4247,17 @@ def owner_bookings():
 
     owner_id = session["user_id"]
 
-    owner_establishments = Establishment.query.filter_by(owner_id=owner_id).all()
-
-    est_ids = [e.establishment_id for e in owner_establishments]
-
-    bookings = Booking.query.filter(Booking.establishment_id.in_(est_ids))\
-        .order_by(Booking.booking_id.desc()).all()
+    bookings, next_cursor, page_size = keyset_paginate(
+        db.session.query(Booking, Establishment)
+        .join(Establishment, Booking.establishment_id == Establishment.establishment_id)
+        .filter(Establishment.owner_id == owner_id),
+        Booking.booking_id,
+        key=lambda row: row[0].booking_id,
+        descending=True
+    )
 
-    return render_template("owner_bookings.html", bookings=bookings)
+    return render_template("owner_bookings.html", bookings=bookings,
+                           next_cursor=next_cursor, page_size=page_size)
 
 
 
@@ -906,6 +4280,41 @@ def accept_booking(booking_id):
     return redirect(url_for("owner_bookings"))
 
 
+BULK_BOOKING_ACTIONS = {"accept": "confirmed", "reject": "cancelled"}
+
+
+@app.route("/owner/bookings/bulk", methods=["POST"])
+def bulk_moderate_bookings():
+    """Accept or reject many bookings at once: one ownership query, one UPDATE, one commit."""
+    if session.get("role") != "owner":
+        return redirect(url_for("login"))
+
+    owner_id = session["user_id"]
+    status = BULK_BOOKING_ACTIONS.get(request.form.get("action"))
+    booking_ids = {int(v) for v in request.form.getlist("booking_ids") if v.isdigit()}
+
+    if status is None or not booking_ids:
+        flash("Select at least one booking and an action.", "warning")
+        return redirect(url_for("owner_bookings"))
+
+    owned_ids = {
+        booking_id for (booking_id,) in db.session.query(Booking.booking_id)
+        .join(Establishment, Booking.establishment_id == Establishment.establishment_id)
+        .filter(Booking.booking_id.in_(booking_ids), Establishment.owner_id == owner_id)
+    }
+    if owned_ids != booking_ids:
+        flash("Unauthorized action", "danger")
+        return redirect(url_for("owner_bookings"))
+
+    updated = Booking.query.filter(Booking.booking_id.in_(owned_ids)).update(
+        {Booking.status: status}, synchronize_session=False
+    )
+    db.session.commit()
+
+    flash(f"{updated} booking(s) {'confirmed' if status == 'confirmed' else 'cancelled'}", "success")
+    return redirect(url_for("owner_bookings"))
+
+
 @app.route('/owner/approve_booking/<int:booking_id>')
 def owner_approve_booking(booking_id):
     if 'owner_id' not in session:
@@ -959,13 +4368,27 @@ def book_place(place_id):
             flash("All fields are required.", "danger")
             return redirect(request.url)
 
+        try:
+            check_in_date = datetime.strptime(check_in, "%Y-%m-%d").date()
+            check_out_date = datetime.strptime(check_out, "%Y-%m-%d").date() if check_out else None
+            guests = int(guests)
+        except ValueError:
+            flash("Invalid dates or number of guests.", "danger")
+            return redirect(request.url)
+
+        # 📅 Overlap / capacity check, held until the booking below is committed
+        problem = reserve_capacity(place, check_in_date, check_out_date, guests)
+        if problem:
+            flash(problem, "danger")
+            return redirect(request.url)
+
         # ✅ CREATE BOOKING RECORD
         booking = Booking(
         user_id=session["user_id"],
         establishment_id=place.id,
-        check_in_date=datetime.strptime(check_in, "%Y-%m-%d").date(),
-        check_out_date=datetime.strptime(check_out, "%Y-%m-%d").date() if check_out else None,
-        guests=int(guests),
+        check_in_date=check_in_date,
+        check_out_date=check_out_date,
+        guests=guests,
         notes=notes,
         status="pending"
         )
@@ -978,11 +4401,89 @@ def book_place(place_id):
 
     return render_template('booking.html', place=place)
 
+@app.route("/api/establishments/<int:place_id>/availability")
+def availability_calendar(place_id):
+    """Booked guests and free places per night for ?start=YYYY-MM and ?months= (1-12)."""
+    if "user_id" not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    place = get_catalog().establishments_by_id.get(place_id)
+    if place is None:
+        abort(404)
+
+    start_month = parse_report_month(request.args.get("start")) or (date.today().year, date.today().month)
+    months = max(1, min(request.args.get("months", 1, type=int), 12))
+    start = date(start_month[0], start_month[1], 1)
+    end_year, end_month = divmod(start_month[1] - 1 + months, 12)
+    end = date(start_month[0] + end_year, end_month + 1, 1)
+
+    occupancy = nightly_occupancy(overlapping_bookings(place_id, start, end), start, end)
+    return jsonify({
+        "establishment_id": place_id,
+        "capacity": place.capacity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "nights": {
+            night.isoformat(): {
+                "booked_guests": booked,
+                "available": None if place.capacity is None else max(place.capacity - booked, 0),
+            }
+            for night, booked in occupancy.items()
+        },
+    })
+
 @app.route("/logout")
 def logout():
     session.clear()
     return redirect(url_for("login"))
 
+# ========== APP FACTORY ==========
+def configure_services():
+    """Rebuild the objects sized from app.config when the module loads: the model
+    backend, the response cache, the plan and password pools and the visit
+    ingest buffer limits. Work already queued on the old pools still finishes."""
+    global llm, llm_cache, plan_executor, password_executor, _password_slots
+    llm = LazyBackend(build_llm_backend)
+    llm_cache = ResponseCache(
+        max_size=app.config['LLM_CACHE_SIZE'],
+        ttl=app.config['LLM_CACHE_TTL'],
+        path=app.config['LLM_CACHE_PATH'],
+    )
+
+    old_plan_executor, plan_executor = plan_executor, ThreadPoolExecutor(
+        max_workers=app.config['PLAN_WORKERS'], thread_name_prefix="plan-job"
+    )
+    old_plan_executor.shutdown(wait=False)
+    old_password_executor, password_executor = password_executor, ThreadPoolExecutor(
+        max_workers=app.config['PASSWORD_HASH_WORKERS'], thread_name_prefix="password-hash"
+    )
+    old_password_executor.shutdown(wait=False)
+    _password_slots = threading.BoundedSemaphore(
+        app.config['PASSWORD_HASH_WORKERS'] + app.config['PASSWORD_HASH_MAX_PENDING']
+    )
+    password_executor.submit(_prepare_password_params, app.config['PASSWORD_HASH_METHOD'])
+
+    visit_buffer.flush_seconds = app.config['VISIT_INGEST_FLUSH_SECONDS']
+    visit_buffer.flush_keys = app.config['VISIT_INGEST_FLUSH_KEYS']
+    visit_buffer.max_keys = app.config['VISIT_INGEST_MAX_KEYS']
+
+
+def create_app(config=None):
+    """Return the configured app, e.g. `gunicorn "app:create_app()"`.
+
+    Loading the app does no I/O: the model client is built on the first model
+    call and pending trip plans are resumed on the first request. Schema and
+    sample data are created explicitly with `flask --app app init-db`.
+    `config` overrides are applied before the services built from config are
+    rebuilt (see configure_services()), so call this before serving requests.
+    The database URI is bound at import, so set DATABASE_URI instead.
+    """
+    if config:
+        app.config.update(config)
+        configure_services()
+    return app
+
 # ========== RUN ==========
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    init_db()
+    app.run(debug=app.config['DEBUG'])
\ No newline at end of file
@@ -0,0 +1,398 @@
+"""Synthetic dataset generator and route benchmarks for TripWise.
+
+Fill a SQLite database with realistic volumes (seeded, so every run builds the
+same data), then time the main routes through the Flask test client with the
+stub LLM backend:
+
+    python benchmark.py generate --db bench.db --scale 1.0 --seed 42
+    python benchmark.py run --db bench.db --repeat 20 --json results.json
+    python benchmark.py run --db bench.db --compare results.json
+
+At --scale 1.0 the dataset has 2,000 islands, 8,000 establishments, ~1M weekly
+visit rows and 200,000 bookings. Results record the git commit, so JSON files
+from different commits can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 10000
+
+REGIONS = ["Pangasinan", "Palawan", "Cebu", "Bohol", "Siargao", "Batanes", "Camarines Sur",
+           "Romblon", "Zambales", "Aklan", "Davao", "Samar", "Leyte", "Negros Oriental", "Quezon"]
+# (lat, lng) centres that island coordinates are scattered around
+REGION_CENTRES = [(16.16, 120.36), (10.0, 118.8), (10.3, 123.9), (9.85, 124.15), (9.85, 126.05),
+                  (20.45, 121.97), (13.6, 123.3), (12.55, 122.27), (15.3, 119.95), (11.96, 121.92),
+                  (7.07, 125.6), (11.8, 125.0), (11.0, 124.9), (9.3, 123.3), (14.0, 121.9)]
+NAME_SYLLABLES = ["ala", "mi", "nos", "que", "zon", "ime", "lda", "go", "ber", "na", "dor", "ca",
+                  "bay", "an", "si", "ar", "pa", "la", "wan", "bo", "hol", "ta", "gum", "lu"]
+WORDS = ["white", "sand", "beach", "coral", "reef", "snorkeling", "lagoon", "cave", "cliff",
+         "sunset", "mangrove", "kayak", "island", "hopping", "diving", "turtle", "lighthouse",
+         "fishing", "village", "resort", "hiking", "trail", "waterfall", "tidal", "pool"]
+ESTABLISHMENT_KINDS = [("hotel", "Resort"), ("hotel", "Inn"), ("restaurant", "Grill"),
+                       ("restaurant", "Kitchen"), ("bar", "Bar"), ("bar", "Beach Club")]
+BOOKING_STATUSES = (["confirmed"] * 6) + (["pending"] * 3) + ["cancelled"]
+
+
+def configure(db_path):
+    """Point app.py at the benchmark database and stub out the model before importing it."""
+    os.environ["DATABASE_URI"] = "sqlite:///" + os.path.abspath(db_path)
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ.setdefault("LLM_STUB_LATENCY", "0")
+    # Every /ask and trip plan goes through the full prompt path instead of the cache
+    os.environ.setdefault("LLM_CACHE_TTL", "0")
+    os.environ.setdefault("LLM_CACHE_PATH", "")
+    import app as tripwise
+    return tripwise
+
+
+def chunks(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_rows(tripwise, model, rows, label):
+    started = time.perf_counter()
+    total = 0
+    for batch in chunks(rows):
+        tripwise.db.session.execute(model.__table__.insert(), batch)
+        tripwise.db.session.commit()
+        total += len(batch)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<15} {total:>10,} rows  {elapsed:6.1f}s  ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+    return total
+
+
+def island_name(rng, used):
+    while True:
+        name = "".join(rng.choice(NAME_SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        name = f"{name} Island"
+        if name not in used:
+            used.add(name)
+            return name
+
+
+def sentence(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+def generate(args):
+    if os.path.exists(args.db):
+        if not args.force:
+            sys.exit(f"{args.db} already exists; pass --force to replace it.")
+        os.remove(args.db)
+
+    tripwise = configure(args.db)
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(args.seed)
+    n_islands = max(3, int(2000 * args.scale))
+    n_establishments = int(8000 * args.scale)
+    n_users = int(20000 * args.scale)
+    n_owners = max(1, int(500 * args.scale))
+    n_bookings = int(200000 * args.scale)
+    n_activities = int(4000 * args.scale)
+    weeks = args.weeks
+
+    with tripwise.app.app_context():
+        db = tripwise.db
+        tripwise.create_schema()
+
+        print(f"Generating dataset (scale={args.scale}, seed={args.seed}) into {args.db}")
+        password_hash = generate_password_hash(BENCH_PASSWORD)
+
+        # Users: ids 1 = admin, 2..n_owners+1 = owners, then regular users
+        def users():
+            yield {"user_id": 1, "full_name": "Bench Admin", "email": "admin@bench.test",
+                   "password": password_hash, "role": "admin"}
+            for i in range(n_owners):
+                yield {"user_id": 2 + i, "full_name": f"Owner {i}", "email": f"owner{i}@bench.test",
+                       "password": password_hash, "role": "owner"}
+            for i in range(n_users):
+                yield {"user_id": 2 + n_owners + i, "full_name": f"User {i}", "email": f"user{i}@bench.test",
+                       "phone": f"09{rng.randrange(10 ** 9):09d}", "password": password_hash, "role": "user"}
+        insert_rows(tripwise, tripwise.User, users(), "users")
+        owner_ids = range(2, 2 + n_owners)
+        user_ids = range(2 + n_owners, 2 + n_owners + n_users)
+
+        # Islands, scattered around a few regional centres
+        used_names = set()
+
+        def islands():
+            for island_id in range(1, n_islands + 1):
+                region = rng.randrange(len(REGIONS))
+                lat = REGION_CENTRES[region][0] + rng.gauss(0, 0.4)
+                lng = REGION_CENTRES[region][1] + rng.gauss(0, 0.4)
+                yield {"island_id": island_id, "name": island_name(rng, used_names),
+                       "island_image": "hundred_islands.jpg",
+                       "description": sentence(rng, rng.randint(12, 40)),
+                       "history": sentence(rng, rng.randint(8, 30)),
+                       "location": f"{REGIONS[region]} coast", "region": REGIONS[region],
+                       "map_coordinates": f"{lat:.4f},{lng:.4f}",
+                       "latitude": round(lat, 4), "longitude": round(lng, 4)}
+        insert_rows(tripwise, tripwise.Island, islands(), "islands")
+
+        # Popularity is heavy-tailed: a few islands get most visits and bookings
+        popularity = [rng.paretovariate(1.2) for _ in range(n_islands)]
+        island_ids = list(range(1, n_islands + 1))
+
+        establishment_islands = []
+
+        def establishments():
+            picks = rng.choices(island_ids, weights=popularity, k=n_establishments)
+            for establishment_id, island_id in enumerate(picks, start=1):
+                kind, suffix = rng.choice(ESTABLISHMENT_KINDS)
+                establishment_islands.append(island_id)
+                yield {"establishment_id": establishment_id,
+                       "name": f"{rng.choice(NAME_SYLLABLES).capitalize()}{rng.choice(NAME_SYLLABLES)} {suffix} {establishment_id}",
+                       "type": kind, "island_id": island_id, "location": f"Island {island_id}",
+                       "contact_number": f"09{rng.randrange(10 ** 9):09d}", "opening_hours": "8:00 AM - 10:00 PM",
+                       "description": sentence(rng, rng.randint(8, 25)), "rating": round(rng.uniform(3.0, 5.0), 1),
+                       "establishments_image": "bluewater.jpg",
+                       "capacity": rng.choice([None, 10, 20, 40, 80, 150]),
+                       "owner_id": rng.choice(owner_ids), "is_approved": rng.random() < 0.9,
+                       "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1)}
+        insert_rows(tripwise, tripwise.Establishment, establishments(), "establishments")
+
+        def activities():
+            for activity_id in range(1, n_activities + 1):
+                yield {"activity_id": activity_id, "island_id": rng.choices(island_ids, weights=popularity)[0],
+                       "name": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}",
+                       "description": sentence(rng, rng.randint(6, 15)), "price": rng.choice([0, 150, 300, 500, 1200])}
+        insert_rows(tripwise, tripwise.Activity, activities(), "activities")
+
+        # Weekly visits with a yearly season (peak in April/May)
+        last_monday = date.today() - timedelta(days=date.today().weekday())
+        first_monday = last_monday - timedelta(weeks=weeks - 1)
+
+        def visits():
+            for island_id, weight in zip(island_ids, popularity):
+                base = 20 * weight
+                for week in range(weeks):
+                    monday = first_monday + timedelta(weeks=week)
+                    season = 1 + 0.6 * max(0.0, 1 - abs(monday.month - 4.5) / 3)
+                    yield {"island_id": island_id, "visit_week": monday,
+                           "visit_month": monday.replace(day=1), "visit_year": monday.replace(month=1, day=1),
+                           "total_visit": max(0, int(rng.gauss(base * season, base * 0.2)))}
+        insert_rows(tripwise, tripwise.Visit, visits(), "visits")
+
+        # Bookings from two years ago to six months ahead
+        booking_start = date.today() - timedelta(days=730)
+        establishment_weights = [popularity[island_id - 1] for island_id in establishment_islands]
+
+        def bookings():
+            picks = rng.choices(range(1, n_establishments + 1), weights=establishment_weights, k=n_bookings)
+            for booking_id, establishment_id in enumerate(picks, start=1):
+                check_in = booking_start + timedelta(days=rng.randrange(912))
+                yield {"booking_id": booking_id, "user_id": rng.choice(user_ids),
+                       "establishment_id": establishment_id, "check_in_date": check_in,
+                       "check_out_date": check_in + timedelta(days=rng.randint(1, 5)),
+                       "guests": rng.randint(1, 6), "notes": None, "status": rng.choice(BOOKING_STATUSES),
+                       "created_at": datetime.combine(check_in - timedelta(days=rng.randint(1, 60)), datetime.min.time())}
+        insert_rows(tripwise, tripwise.Booking, bookings(), "bookings")
+
+        started = time.perf_counter()
+        tripwise.rebuild_visit_rollups()
+        print(f"  {'visit rollups':<15} rebuilt in {time.perf_counter() - started:.1f}s")
+        db.session.execute(tripwise.text("ANALYZE"))
+        db.session.commit()
+    print("Done.")
+
+
+# ---------- benchmarks ----------
+
+class QueryCounter:
+    """Counts SQL statements issued from the benchmarking thread only."""
+
+    def __init__(self, tripwise):
+        self.count = 0
+        self._thread = threading.get_ident()
+        tripwise.event.listen(tripwise.Engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+
+
+def login(client, email):
+    client.get("/logout")
+    response = client.post("/login", data={"email": email, "password": BENCH_PASSWORD})
+    if response.status_code != 302:
+        sys.exit(f"Could not log in as {email}")
+
+
+def wait_for_job(client, location, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(location + "/status").get_json() or {}
+        if status.get("status") in ("done", "failed"):
+            return
+        time.sleep(0.02)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run(args):
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} not found; create it with `python benchmark.py generate --db {args.db}`.")
+    tripwise = configure(args.db)
+    client = tripwise.app.test_client()
+    counter = QueryCounter(tripwise)
+    rng = random.Random(args.seed)
+
+    with tripwise.app.app_context():
+        db, Booking, Establishment, User = tripwise.db, tripwise.Booking, tripwise.Establishment, tripwise.User
+        counts = {model.__tablename__: db.session.query(model).count()
+                  for model in (tripwise.Island, Establishment, tripwise.Visit, Booking, User)}
+        # The busiest user and owner, so listings are as large as they get
+        busy_user = db.session.query(User.email).join(Booking, Booking.user_id == User.id) \
+            .group_by(User.id).order_by(tripwise.func.count().desc()).first()
+        busy_owner = db.session.query(User.email) \
+            .join(Establishment, Establishment.owner_id == User.id) \
+            .join(Booking, Booking.establishment_id == Establishment.establishment_id) \
+            .group_by(User.id).order_by(tripwise.func.count().desc()).first()
+        admin = User.query.filter_by(role="admin").first()
+        islands = [(island.id, island.name) for island in tripwise.Island.query.order_by(tripwise.Island.id)]
+    if not (busy_user and busy_owner and admin and islands):
+        sys.exit("The database has no benchmark users or islands; regenerate it.")
+
+    def pick_island():
+        return rng.choice(islands)
+
+    def plan_trip():
+        ids = [str(island_id) for island_id, _ in rng.sample(islands, min(3, len(islands)))]
+        return client.post("/plan_trip", data={"destinations": ids, "budget": "5000", "days": "3", "people": "2"})
+
+    scenarios = [
+        ("home", busy_user[0], lambda: client.get("/home")),
+        ("island_details", busy_user[0], lambda: client.get(f"/island/{pick_island()[0]}")),
+        ("my_bookings", busy_user[0], lambda: client.get("/my-bookings")),
+        ("plan_trip", busy_user[0], plan_trip),
+        ("ask", busy_user[0], lambda: client.post("/ask", json={"message": f"What can I do on {pick_island()[1]}?"})),
+        ("owner_bookings", busy_owner[0], lambda: client.get("/owner/bookings")),
+        ("admin_reports", admin.email, lambda: client.get("/admin/reports")),
+    ]
+    if args.only:
+        scenarios = [s for s in scenarios if s[0] in args.only]
+
+    results = {}
+    for name, email, request in scenarios:
+        login(client, email)
+        timings, queries, errors = [], [], 0
+        for iteration in range(args.warmup + args.repeat):
+            counter.count = 0
+            started = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400 or (response.status_code == 302 and name != "plan_trip"):
+                errors += 1
+            if name == "plan_trip" and response.status_code == 302:
+                query_count = counter.count
+                wait_for_job(client, response.headers["Location"])
+                counter.count = query_count
+            if iteration >= args.warmup:
+                timings.append(elapsed * 1000)
+                queries.append(counter.count)
+        results[name] = {
+            "n": len(timings),
+            "mean_ms": round(statistics.mean(timings), 2),
+            "p50_ms": round(percentile(timings, 0.5), 2),
+            "p95_ms": round(percentile(timings, 0.95), 2),
+            "max_ms": round(max(timings), 2),
+            "queries": round(statistics.mean(queries), 1),
+            "errors": errors,
+        }
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "seed": args.seed,
+        "rows": counts,
+        "results": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved to {args.json}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    rows = ", ".join(f"{table}={count:,}" for table, count in report["rows"].items())
+    print(f"commit {report['commit']}  repeat={report['repeat']}  {rows}")
+    header = f"{'route':<16}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'queries':>9}{'errors':>8}"
+    if baseline:
+        header += f"{'p50 vs ' + str(baseline.get('commit')):>20}{'queries vs':>12}"
+    print(header)
+    for name, r in report["results"].items():
+        line = (f"{name:<16}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                f"{r['max_ms']:>10.2f}{r['queries']:>9.1f}{r['errors']:>8}")
+        old = (baseline or {}).get("results", {}).get(name)
+        if old:
+            change = (r["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+            line += f"{change:>+19.1f}%{r['queries'] - old['queries']:>+12.1f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="build a synthetic SQLite database")
+    gen.add_argument("--db", default="bench.db")
+    gen.add_argument("--scale", type=float, default=1.0, help="1.0 = 2,000 islands, ~1M visits")
+    gen.add_argument("--weeks", type=int, default=520, help="weeks of visit history per island")
+    gen.add_argument("--seed", type=int, default=42)
+    gen.add_argument("--force", action="store_true", help="replace an existing database")
+    gen.set_defaults(func=generate)
+
+    bench = commands.add_parser("run", help="time the main routes against a generated database")
+    bench.add_argument("--db", default="bench.db")
+    bench.add_argument("--repeat", type=int, default=20)
+    bench.add_argument("--warmup", type=int, default=3)
+    bench.add_argument("--seed", type=int, default=42)
+    bench.add_argument("--only", nargs="+", metavar="ROUTE", help="run only these routes")
+    bench.add_argument("--json", help="write the results to this file")
+    bench.add_argument("--compare", help="results JSON from an earlier run to diff against")
+    bench.set_defaults(func=run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+# The database URI is bound when app.py is imported, so point it at a scratch
+# SQLite file (and the stub model) before the import below
+_scratch = tempfile.mkdtemp(prefix="tripwise-tests-")
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(_scratch, 'tripwise.db')}"
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["LLM_CACHE_TTL"] = "0"
+os.environ["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as tripwise  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """The app with an empty schema, inside an app context."""
+    with tripwise.app.app_context():
+        for fts in tripwise.SQLITE_FTS_TABLES:
+            tripwise.db.session.execute(text(f"DROP TABLE IF EXISTS {fts}"))
+        tripwise.db.session.commit()
+        tripwise.db.drop_all()
+        tripwise.create_schema()
+        tripwise.invalidate_catalog()
+        yield tripwise.app
+        tripwise.db.session.remove()
+    tripwise.invalidate_catalog()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add_island(name, **fields):
+    island = tripwise.Island(name=name, image=fields.pop("image", "island.jpg"),
+                             description=fields.pop("description", f"{name} description"), **fields)
+    tripwise.db.session.add(island)
+    tripwise.db.session.commit()
+    tripwise.invalidate_catalog()
+    return island
+
+
+def add_visits(island, week, total):
+    tripwise.db.session.add(tripwise.Visit(
+        island_id=island.id, visit_week=week, visit_month=week.replace(day=1),
+        visit_year=week.replace(month=1, day=1), total_visits=total,
+    ))
+    tripwise.db.session.commit()
+
+
+def add_user(email, role="user", password="pw"):
+    user = tripwise.User(name=role, email=email, role=role,
+                         password_hash=tripwise.generate_password_hash(password, "pbkdf2:sha256:1000"))
+    tripwise.db.session.add(user)
+    tripwise.db.session.commit()
+    return user
+
+
+def login(client, email, password="pw"):
+    return client.post("/login", data={"email": email, "password": password})
+
+
+def last_year_week():
+    return date(date.today().year - 1, 11, 3)
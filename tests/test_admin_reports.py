@@ -0,0 +1,72 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import app as tripwise
+from conftest import add_island, add_user, add_visits
+
+
+@pytest.fixture
+def data(app, monkeypatch):
+    monkeypatch.setattr(tripwise, "_report_aggregates", None)
+    rng = random.Random(10)
+    islands = [add_island(name) for name in ("Bohol", "Coron", "Siargao")]
+    user = add_user("a@example.com")
+    places = []
+    for k in range(5):
+        place = tripwise.Establishment(name=f"Place {k}", type="hotel", island_id=rng.choice(islands).id,
+                                       establishments_image="p.jpg", is_approved=True)
+        tripwise.db.session.add(place)
+        places.append(place)
+    tripwise.db.session.commit()
+    tripwise.invalidate_catalog()
+
+    for _ in range(60):
+        check_in = date(2024, 1, 1) + timedelta(days=rng.randrange(366))
+        tripwise.db.session.add(tripwise.Booking(
+            user_id=user.id, establishment_id=rng.choice(places).establishment_id, guests=1,
+            check_in_date=check_in, check_out_date=check_in + timedelta(days=1),
+            status=rng.choice(["pending", "confirmed", "cancelled"]),
+        ))
+    tripwise.db.session.commit()
+    for island in islands:
+        for week in range(0, 52, 3):
+            add_visits(island, date(2024, 1, 1) + timedelta(weeks=week), rng.randrange(1, 500))
+    return islands
+
+
+def _brute_force(start, end, island_id):
+    def in_range(day):
+        return (start is None or (day.year, day.month) >= start) and (end is None or (day.year, day.month) <= end)
+
+    summary = {"pending": 0, "confirmed": 0, "cancelled": 0}
+    per_place = {}
+    for booking in tripwise.Booking.query.all():
+        place = tripwise.db.session.get(tripwise.Establishment, booking.establishment_id)
+        if in_range(booking.check_in_date) and (not island_id or place.island_id == island_id):
+            summary[booking.status] += 1
+            per_place[place.name] = per_place.get(place.name, 0) + 1
+    per_island = {}
+    for visit in tripwise.Visit.query.all():
+        if in_range(visit.visit_week) and (not island_id or visit.island_id == island_id):
+            name = tripwise.db.session.get(tripwise.Island, visit.island_id).name
+            per_island[name] = per_island.get(name, 0) + visit.total_visits
+    return summary, per_island, per_place
+
+
+@pytest.mark.parametrize("start, end, island", [
+    (None, None, None),
+    ((2024, 3), (2024, 7), None),
+    (None, (2024, 5), 2),
+    ((2024, 6), None, 1),
+    ((2024, 4), (2024, 4), 3),
+])
+def test_report_slices_match_a_brute_force_aggregate(data, start, end, island):
+    summary, top_islands, top_places = tripwise.build_report(start, end, island)
+
+    expected_summary, per_island, per_place = _brute_force(start, end, island)
+    assert summary == expected_summary
+    assert dict(top_islands) == per_island
+    assert dict(top_places) == per_place
+    assert [total for _, total in top_places] == sorted(per_place.values(), reverse=True)
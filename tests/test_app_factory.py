@@ -0,0 +1,16 @@
+import app as tripwise
+
+
+def test_create_app_overrides_reach_services(app):
+    original = {key: app.config[key] for key in
+                ("LLM_CACHE_SIZE", "PLAN_WORKERS", "PASSWORD_HASH_WORKERS", "VISIT_INGEST_MAX_KEYS")}
+    try:
+        tripwise.create_app({"LLM_CACHE_SIZE": 3, "PLAN_WORKERS": 1,
+                             "PASSWORD_HASH_WORKERS": 1, "VISIT_INGEST_MAX_KEYS": 10})
+
+        assert tripwise.llm_cache.max_size == 3
+        assert tripwise.plan_executor._max_workers == 1
+        assert tripwise.password_executor._max_workers == 1
+        assert tripwise.visit_buffer.max_keys == 10
+    finally:
+        tripwise.create_app(original)
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import app as tripwise
+from conftest import add_island
+
+
+class SlowStream(tripwise.LLMBackend):
+    """Sends one sentence, then stalls until it is closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def astream(self, prompt, timeout=None):
+        try:
+            yield "First sentence. "
+            await asyncio.sleep(30)
+            yield "Never sent."
+        finally:
+            self.closed = True
+
+
+async def _post(path, message, disconnect_after=None):
+    sent = []
+    body = {"type": "http.request", "body": json.dumps({"message": message}).encode(), "more_body": False}
+    requests = [body]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    async def send(event):
+        sent.append(event)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": []}
+    await asyncio.wait_for(tripwise.asgi_app(scope, receive, send), 5)
+    return sent
+
+
+def test_stream_completes_and_shares_the_wsgi_metrics_label(app):
+    add_island("Alaminos")
+    sent = asyncio.run(_post("/ask/stream", "alaminos"))
+
+    body = b"".join(event.get("body", b"") for event in sent[1:])
+    assert sent[0]["status"] == 200
+    assert b"event: done" in body
+    assert ("ask_stream", "POST", 200) in tripwise.REQUEST_SECONDS._series
+    assert not any(labels[0].endswith("_async") for labels in tripwise.REQUEST_SECONDS._series)
+
+
+def test_disconnect_closes_the_backend_stream(app, monkeypatch):
+    add_island("Alaminos")
+    backend = SlowStream()
+    monkeypatch.setattr(tripwise, "llm", backend)
+
+    sent = asyncio.run(_post("/ask/stream", "alaminos", disconnect_after=0.1))
+
+    assert backend.closed
+    assert b"First sentence." in b"".join(event.get("body", b"") for event in sent[1:])
+    assert ("ask_stream", "POST", 499) in tripwise.REQUEST_SECONDS._series
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import app as tripwise
+from conftest import add_island, add_user, login
+
+
+def _add_place(capacity):
+    island = add_island("Coron")
+    place = tripwise.Establishment(name="Coron Inn", type="hotel", island_id=island.id,
+                                   establishments_image="inn.jpg", is_approved=True, capacity=capacity)
+    tripwise.db.session.add(place)
+    tripwise.db.session.commit()
+    return place.establishment_id
+
+
+def _book(client, place_id, guests):
+    return client.post(f"/book_place/{place_id}", data={
+        "check_in_date": "2030-05-01", "check_out_date": "2030-05-03", "guests": str(guests),
+    })
+
+
+def test_booking_over_capacity_is_refused(app, client):
+    place_id = _add_place(capacity=3)
+    add_user("a@example.com")
+    login(client, "a@example.com")
+
+    assert _book(client, place_id, 2).headers["Location"].endswith("/my-bookings")
+    assert _book(client, place_id, 2).headers["Location"].endswith(f"/book_place/{place_id}")
+    assert tripwise.Booking.query.count() == 1
+
+
+def test_concurrent_bookings_cannot_both_take_the_last_places(app, monkeypatch):
+    place_id = _add_place(capacity=2)
+    clients = []
+    for email in ("a@example.com", "b@example.com"):
+        add_user(email)
+        client = app.test_client()
+        login(client, email)
+        clients.append(client)
+    tripwise.db.session.remove()
+
+    # Widen the gap between the capacity check and the insert
+    check = tripwise.check_availability
+
+    def slow_check(*args, **kwargs):
+        problem = check(*args, **kwargs)
+        time.sleep(0.3)
+        return problem
+
+    monkeypatch.setattr(tripwise, "check_availability", slow_check)
+    threads = [threading.Thread(target=_book, args=(client, place_id, 2)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tripwise.Booking.query.filter_by(establishment_id=place_id).count() == 1
+
+
+def test_booking_lock_does_not_fire_update_triggers(app, client):
+    place_id = _add_place(capacity=3)
+    add_user("a@example.com")
+    login(client, "a@example.com")
+    db = tripwise.db
+    db.session.execute(tripwise.text("CREATE TABLE updates_seen (establishment_id INTEGER)"))
+    db.session.execute(tripwise.text(
+        "CREATE TRIGGER log_updates AFTER UPDATE ON establishments BEGIN "
+        "INSERT INTO updates_seen VALUES (new.establishment_id); END"))
+    db.session.commit()
+    try:
+        assert _book(client, place_id, 2).headers["Location"].endswith("/my-bookings")
+        seen = db.session.execute(tripwise.text("SELECT COUNT(*) FROM updates_seen")).scalar()
+        assert seen == 0
+    finally:
+        db.session.execute(tripwise.text("DROP TABLE updates_seen"))
+        db.session.commit()
+
+
+def _owner_client(client):
+    owner = add_user("owner@example.com", role="owner")
+    login(client, "owner@example.com")
+    return owner
+
+
+def test_owner_forms_refuse_capacity_below_one(app, client):
+    owner = _owner_client(client)
+    island = add_island("Siargao")
+    form = {"name": "Cloud 9 Inn", "type": "hotel", "location": "General Luna",
+            "contact": "0917", "hours": "24h", "image": "inn.jpg", "description": ""}
+    for capacity in ("0", "-2", "many"):
+        response = client.post("/owner/establishment/add", data={**form, "capacity": capacity})
+        assert response.headers["Location"].endswith("/owner/establishment/add")
+    assert tripwise.Establishment.query.count() == 0
+
+    place = tripwise.Establishment(name="Cloud 9 Inn", type="hotel", island_id=island.id, owner_id=owner.id,
+                                   establishments_image="inn.jpg", is_approved=True, capacity=4)
+    tripwise.db.session.add(place)
+    tripwise.db.session.commit()
+    edit = {"name": "Cloud 9 Inn", "type": "hotel", "location": "General Luna",
+            "contact_number": "0917", "opening_hours": "24h", "description": ""}
+    response = client.post(f"/owner/establishment/edit/{place.establishment_id}", data={**edit, "capacity": "0"})
+    assert response.headers["Location"].endswith(f"/owner/establishment/edit/{place.establishment_id}")
+    tripwise.db.session.expire_all()
+    assert tripwise.db.session.get(tripwise.Establishment, place.establishment_id).capacity == 4
+
+    client.post(f"/owner/establishment/edit/{place.establishment_id}", data={**edit, "capacity": ""})
+    tripwise.db.session.expire_all()
+    assert tripwise.db.session.get(tripwise.Establishment, place.establishment_id).capacity is None
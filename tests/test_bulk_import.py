@@ -0,0 +1,60 @@
+import json
+
+import app as tripwise
+from conftest import add_island, last_year_week
+
+
+def _import(app, tmp_path, entity, rows):
+    path = tmp_path / f"{entity}.jsonl"
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    return app.test_cli_runner().invoke(args=["data", "import", entity, str(path)])
+
+
+def test_invalid_establishment_rows_are_skipped(app, tmp_path):
+    island = add_island("Coron")
+    result = _import(app, tmp_path, "establishments", [
+        {"name": "Rocket Inn", "type": "spaceship", "island_id": island.id},
+        {"name": "Nowhere Bar", "type": "bar", "island_id": 999},
+        {"name": "No Type Grill", "island_id": island.id},
+        {"name": "Big Hotel", "type": "hotel", "island_id": island.id, "capacity": 0},
+        {"name": "Coron Bar", "type": "bar", "island_id": island.id, "rating": 4.5},
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert "1 inserted, 0 updated, 4 skipped" in result.output
+    assert "bad type 'spaceship'" in result.output
+    assert "unknown island_id 999" in result.output
+    assert "new rows need type" in result.output
+    assert [e.name for e in tripwise.Establishment.query.all()] == ["Coron Bar"]
+
+
+def test_reimporting_places_without_an_island_updates_them(app, tmp_path):
+    rows = [{"name": "Dup Place", "type": "restaurant", "description": "first"}]
+    _import(app, tmp_path, "establishments", rows)
+    rows[0]["description"] = "second"
+    result = _import(app, tmp_path, "establishments", rows)
+
+    assert "0 inserted, 1 updated" in result.output
+    places = tripwise.Establishment.query.filter_by(name="Dup Place").all()
+    assert [p.description for p in places] == ["second"]
+
+
+def test_error_list_is_capped(app, tmp_path):
+    result = _import(app, tmp_path, "islands", [{"description": "no name"}] * 50)
+
+    assert "50 skipped" in result.output
+    assert result.output.count("missing name") == tripwise.BULK_MAX_ERRORS_SHOWN
+    assert "and 40 more" in result.output
+
+
+def test_visit_upsert_never_duplicates_a_week(app):
+    island = add_island("Coron")
+    row = {"island_id": island.id, "visit_week": last_year_week(), "visit_month": last_year_week().replace(day=1),
+           "visit_year": last_year_week().replace(month=1, day=1), "total_visit": 10}
+    connection = tripwise.db.session.connection()
+    tripwise.upsert_visits(connection, [row])
+    tripwise.upsert_visits(connection, [{**row, "total_visit": 25}])
+    assert [v.total_visits for v in tripwise.Visit.query.all()] == [25]
+
+    tripwise.upsert_visits(connection, [{**row, "total_visit": 5}], increment=True)
+    assert [v.total_visits for v in tripwise.Visit.query.all()] == [30]
@@ -0,0 +1,53 @@
+from datetime import date
+
+import pytest
+
+import app as tripwise
+from conftest import add_island, add_user, login
+
+
+@pytest.fixture
+def bookings(app):
+    island = add_island("Coron")
+    guest = add_user("guest@example.com")
+    ids = {}
+    for owner_email in ("mine@example.com", "theirs@example.com"):
+        owner = add_user(owner_email, role="owner")
+        place = tripwise.Establishment(name=f"Inn of {owner_email}", type="hotel", island_id=island.id,
+                                       owner_id=owner.id, establishments_image="inn.jpg", is_approved=True)
+        tripwise.db.session.add(place)
+        tripwise.db.session.flush()
+        booking = tripwise.Booking(user_id=guest.id, establishment_id=place.establishment_id, guests=2,
+                                   check_in_date=date(2030, 5, 1), check_out_date=date(2030, 5, 3))
+        tripwise.db.session.add(booking)
+        tripwise.db.session.flush()
+        ids[owner_email] = booking.booking_id
+    tripwise.db.session.commit()
+    return ids
+
+
+def _statuses():
+    tripwise.db.session.expire_all()
+    return {b.booking_id: b.status for b in tripwise.Booking.query.all()}
+
+
+def _moderate(client, action, booking_ids):
+    return client.post("/owner/bookings/bulk", data={"action": action, "booking_ids": [str(i) for i in booking_ids]})
+
+
+def test_owner_can_moderate_own_bookings(client, bookings):
+    login(client, "mine@example.com")
+    _moderate(client, "accept", [bookings["mine@example.com"]])
+
+    assert _statuses() == {bookings["mine@example.com"]: "confirmed", bookings["theirs@example.com"]: "pending"}
+
+
+def test_bulk_moderation_refuses_bookings_of_other_owners(client, bookings):
+    login(client, "mine@example.com")
+    response = _moderate(client, "reject", bookings.values())
+
+    assert response.headers["Location"].endswith("/owner/bookings")
+    assert set(_statuses().values()) == {"pending"}  # nothing changed, not even the owner's own booking
+
+    _moderate(client, "reject", [bookings["theirs@example.com"], 999])
+    assert set(_statuses().values()) == {"pending"}
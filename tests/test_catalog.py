@@ -0,0 +1,53 @@
+import app as tripwise
+from conftest import add_island, add_user, login
+
+
+def _place(owner, **fields):
+    island = add_island("Coron")
+    place = tripwise.Establishment(name="Coron Inn", type="hotel", island_id=island.id, owner_id=owner.id,
+                                   establishments_image="inn.jpg", **fields)
+    tripwise.db.session.add(place)
+    tripwise.db.session.commit()
+    tripwise.invalidate_catalog()
+    return place.establishment_id
+
+
+def _catalog_place(place_id):
+    return tripwise.get_catalog().establishments_by_id.get(place_id)
+
+
+def test_admin_moderation_refreshes_the_snapshot(app, client):
+    owner = add_user("owner@example.com", role="owner")
+    place_id = _place(owner, is_approved=False)
+    assert not _catalog_place(place_id).is_approved
+
+    add_user("admin@example.com", role="admin")
+    login(client, "admin@example.com")
+    client.get(f"/admin/approve/{place_id}")
+    assert _catalog_place(place_id).is_approved
+
+    client.post(f"/admin/reject/{place_id}", data={"reason": "Closed"})
+    assert _catalog_place(place_id).rejected_reason == "Closed"
+
+
+def test_owner_writes_refresh_the_snapshot(app, client):
+    owner = add_user("owner@example.com", role="owner")
+    place_id = _place(owner, is_approved=True)
+    snapshot = tripwise.get_catalog()
+    assert tripwise.get_catalog() is snapshot  # reused while nothing changes
+
+    login(client, "owner@example.com")
+    client.post(f"/owner/establishment/edit/{place_id}", data={
+        "name": "Coron Lodge", "type": "hotel", "location": "Town", "contact_number": "0917",
+        "opening_hours": "24h", "description": "", "capacity": "",
+    })
+    assert _catalog_place(place_id).name == "Coron Lodge"
+
+    client.post("/owner/establishment/add", data={
+        "name": "Kayangan Bar", "type": "bar", "location": "Town", "contact": "0917", "hours": "6pm",
+        "image": "bar.jpg", "description": "", "capacity": "",
+    })
+    assert "Kayangan Bar" in {place.name for place in tripwise.get_catalog().establishments}
+
+    client.post(f"/owner/establishment/delete/{place_id}")
+    assert _catalog_place(place_id) is None
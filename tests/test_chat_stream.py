@@ -0,0 +1,46 @@
+import json
+
+import app as tripwise
+from conftest import add_island
+
+
+class ChunkedBackend:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream(self, prompt, timeout=None):
+        yield from self.chunks
+
+
+def _events(body):
+    events = []
+    for block in body.split("\n\n")[:-1]:
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields.get("event"), json.loads(fields["data"])))
+    return events
+
+
+def test_sse_event_framing():
+    assert tripwise.sse_event({"html": "a\nb"}) == 'data: {"html": "a\\nb"}\n\n'
+    assert tripwise.sse_event({}, event="done") == "event: done\ndata: {}\n\n"
+
+
+def test_split_keeps_the_unfinished_sentence():
+    assert tripwise.split_complete_sentences("One. Two! Thr") == ("One. Two!", " Thr")
+    assert tripwise.split_complete_sentences("Version 2.5 is") == ("", "Version 2.5 is")
+    assert tripwise.split_complete_sentences("Line one\nline") == ("Line one\n", "line")
+
+
+def test_stream_flushes_whole_sentences_then_done(app, client, monkeypatch):
+    add_island("Coron")
+    monkeypatch.setattr(tripwise, "llm", ChunkedBackend(["Visit Cor", "on. It is ", "lovely! More", " soon"]))
+
+    response = client.post("/ask/stream", json={"message": "Where should I go?"})
+
+    assert response.mimetype == "text/event-stream"
+    assert _events(response.get_data(as_text=True)) == [
+        (None, {"html": "Visit <a href='/island/1'>Coron</a>."}),
+        (None, {"html": " It is lovely!"}),
+        (None, {"html": " More soon"}),
+        ("done", {}),
+    ]
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import app as tripwise
+from conftest import add_island, add_user, login
+
+
+def _add_place():
+    island = add_island("Coron")
+    place = tripwise.Establishment(name="Coron Inn", type="hotel", island_id=island.id,
+                                   establishments_image="inn.jpg", is_approved=True)
+    tripwise.db.session.add(place)
+    tripwise.db.session.commit()
+    tripwise.invalidate_catalog()
+    return place
+
+
+def test_if_modified_since_alone_gets_304(app, client):
+    place = _add_place()
+    add_user("a@example.com")
+    login(client, "a@example.com")
+
+    first = client.get(f"/place/{place.establishment_id}")
+    assert first.status_code == 200
+    last_modified = first.headers["Last-Modified"]
+
+    again = client.get(f"/place/{place.establishment_id}", headers={"If-Modified-Since": last_modified})
+    assert again.status_code == 304
+
+
+def test_updates_bump_last_modified(app, client):
+    place = _add_place()
+    place.updated_at = datetime.utcnow() - timedelta(days=30)
+    tripwise.db.session.commit()
+    tripwise.invalidate_catalog()
+    add_user("a@example.com")
+    login(client, "a@example.com")
+    last_modified = client.get(f"/place/{place.establishment_id}").headers["Last-Modified"]
+
+    place.description = "Now with a pool"
+    tripwise.db.session.commit()
+    tripwise.invalidate_catalog()
+
+    response = client.get(f"/place/{place.establishment_id}", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 200
+    assert response.headers["Last-Modified"] != last_modified
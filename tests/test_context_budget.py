@@ -0,0 +1,46 @@
+import app as tripwise
+
+
+def _long(word, count):
+    return " ".join([word] * count)
+
+
+def test_reserved_section_survives_a_long_competing_list():
+    builder = tripwise.ContextBuilder(200)
+    builder.section("islands", "Islands:", reserve=0.5)
+    builder.section("ranking", "Ranking:")
+    builder.add("islands", "Alaminos: " + _long("coves", 60), 1)
+    for n in range(50):
+        builder.add("ranking", f"- Island {n}: {1000 - n} visitors per year.", 5, truncatable=False)
+
+    context = builder.build()
+
+    assert "Islands:" in context and "Alaminos" in context
+    assert "Ranking:" in context
+    assert builder.report["used"] <= 200
+
+
+def test_overflowing_entries_are_dropped_not_left_as_ellipses():
+    builder = tripwise.ContextBuilder(40)
+    builder.section("islands", "Islands:")
+    builder.section("places", "Places:")
+    builder.add("islands", _long("sand", 36), 2)
+    builder.add("places", "Supercalifragilisticexpialidocious" * 6, 1)
+
+    context = builder.build()
+
+    assert "Places:" not in context  # its only entry did not fit, so no empty section
+    assert "\n…" not in context and not context.strip().endswith(":")
+    assert builder.report["dropped"] == 1
+
+
+def test_tight_budget_chat_context_keeps_islands(app, monkeypatch):
+    from conftest import add_island, add_visits, last_year_week
+    for n in range(40):
+        island = add_island(f"Island {n}", description=_long("lagoon", 30))
+        add_visits(island, last_year_week(), 100 + n)
+    monkeypatch.setitem(app.config, 'CHAT_CONTEXT_TOKENS', 150)
+    context = tripwise.get_db_context("somewhere quiet")
+
+    assert "Available Islands" in context
+    assert tripwise.estimate_tokens(context) <= 160
@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+import app as tripwise
+
+
+def _linker():
+    islands = [SimpleNamespace(id=1, name="Coron"), SimpleNamespace(id=2, name="Coron Island")]
+    places = [SimpleNamespace(id=7, name="Coron Inn"), SimpleNamespace(id=8, name="Coron"),
+              SimpleNamespace(id=9, name="Kayangan Lake")]
+    return tripwise.EntityLinker(islands, places)
+
+
+def test_longest_name_wins():
+    assert _linker().link("Sail to Coron Island, then sleep at Coron Inn in Coron.") == (
+        "Sail to <a href='/island/2'>Coron Island</a>, then sleep at "
+        "<a href='/place/7'>Coron Inn</a> in <a href='/island/1'>Coron</a>."
+    )
+
+
+def test_existing_links_are_not_relinked():
+    text = "See <a href='/guide'>the Kayangan Lake guide</a> before Kayangan Lake."
+    assert _linker().link(text) == (
+        "See <a href='/guide'>the Kayangan Lake guide</a> before <a href='/place/9'>Kayangan Lake</a>."
+    )
+
+
+def test_names_inside_words_are_left_alone():
+    assert _linker().link("Coronation day") == "Coronation day"
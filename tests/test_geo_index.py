@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+import app as tripwise
+
+
+def _points(rng, count):
+    return [(rng.uniform(5, 20), rng.uniform(117, 127), n) for n in range(count)]
+
+
+def _brute_force(points, lat, lng):
+    return sorted((tripwise.haversine_km(lat, lng, plat, plng), item) for plat, plng, item in points)
+
+
+QUERIES = [(12.5, 122.0), (5.01, 117.02), (30.0, 140.0), (-10.0, 100.0)]
+
+
+@pytest.mark.parametrize("cell_deg", [0.05, 0.5, 3.0])
+def test_nearest_matches_brute_force(cell_deg):
+    rng = random.Random(14)
+    points = _points(rng, 400)
+    index = tripwise.GeoGridIndex(points, cell_deg=cell_deg)
+
+    for lat, lng in QUERIES + [points[7][:2]]:
+        for k in (1, 5, 50):
+            expected = _brute_force(points, lat, lng)[:k]
+            assert [item for _, item in index.nearest(lat, lng, k)] == [item for _, item in expected]
+
+
+@pytest.mark.parametrize("cell_deg", [0.05, 0.5, 3.0])
+def test_within_matches_brute_force(cell_deg):
+    rng = random.Random(15)
+    points = _points(rng, 400) + [(None, 120.0, "unlocated")]
+    located = points[:-1]
+    index = tripwise.GeoGridIndex(points, cell_deg=cell_deg)
+    assert len(index) == 400
+
+    for lat, lng in QUERIES + [located[3][:2]]:
+        for radius in (0.5, 25, 300, 5000):
+            expected = [pair for pair in _brute_force(located, lat, lng) if pair[0] <= radius]
+            assert [item for _, item in index.within(lat, lng, radius)] == [item for _, item in expected]
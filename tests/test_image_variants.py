@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import app as tripwise
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def static_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "static_folder", str(tmp_path))
+    monkeypatch.setattr(tripwise, "IMAGE_VARIANT_DIR", str(tmp_path / "images" / "variants"))
+    monkeypatch.setattr(tripwise, "_image_variants", {})
+    (tmp_path / "images").mkdir()
+    return tmp_path
+
+
+def _photo(static_dir, name, width, height):
+    Image.new("RGB", (width, height), (20, 120, 200)).save(static_dir / "images" / name)
+    return f"images/{name}"
+
+
+def test_variants_are_built_per_width_without_upscaling(static_dir):
+    variants = tripwise.image_variants(_photo(static_dir, "bay.jpg", 1000, 500))
+
+    assert [width for width, _ in variants["jpeg"]] == [320, 640, 1000]
+    assert [width for width, _ in variants["webp"]] == [320, 640, 1000]
+    for fmt in ("jpeg", "webp"):
+        for width, name in variants[fmt]:
+            with Image.open(os.path.join(tripwise.IMAGE_VARIANT_DIR, name)) as variant:
+                assert variant.format == fmt.upper()
+                assert variant.size == (width, width // 2)
+
+
+def test_responsive_image_uses_the_variants(app, static_dir):
+    filename = _photo(static_dir, "bay.jpg", 1000, 500)
+    with app.test_request_context():
+        html = str(tripwise.responsive_image(filename, alt="Bay"))
+
+    assert '<source type="image/webp"' in html
+    assert "/img/bay-640." in html and " 1000w" in html
+    assert 'alt="Bay"' in html and 'loading="lazy"' in html
+
+
+def test_missing_original_falls_back_to_the_static_file(app, static_dir):
+    assert tripwise.image_variants("images/gone.jpg") is None
+    with app.test_request_context():
+        html = str(tripwise.responsive_image("images/gone.jpg", alt="Gone"))
+
+    assert html.startswith('<img src="/static/images/gone.jpg"')
+    assert "<picture" not in html
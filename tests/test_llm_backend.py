@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+import app as tripwise
+
+
+class FlakyBackend(tripwise.LLMBackend):
+    def __init__(self):
+        self.calls = 0
+        self.fail = True
+        self.release = threading.Event()
+
+    def generate(self, prompt, timeout=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("down")
+        self.release.wait(5)
+        return "ok"
+
+
+def test_half_open_circuit_lets_one_probe_through():
+    backend = FlakyBackend()
+    resilient = tripwise.ResilientBackend(backend, max_concurrency=10, timeout=5, retries=0,
+                                          circuit_threshold=1, circuit_reset=0.05)
+    with pytest.raises(tripwise.LLMUnavailable):
+        resilient.generate("hi")
+    time.sleep(0.06)
+
+    backend.fail = False
+    results = []
+
+    def call():
+        try:
+            results.append(resilient.generate("hi"))
+        except tripwise.LLMUnavailable:
+            results.append("refused")
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    backend.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert backend.calls == 2  # the first failure, then a single probe
+    assert sorted(results) == ["ok"] + ["refused"] * 7
+    assert resilient.generate("hi") == "ok"  # the probe closed the circuit
+
+
+def test_failed_probe_reopens_the_circuit():
+    backend = FlakyBackend()
+    resilient = tripwise.ResilientBackend(backend, timeout=5, retries=0, circuit_threshold=3, circuit_reset=0.05)
+    for _ in range(3):
+        with pytest.raises(tripwise.LLMUnavailable):
+            resilient.generate("hi")
+    time.sleep(0.06)
+
+    with pytest.raises(tripwise.LLMUnavailable):
+        resilient.generate("hi")
+    assert backend.calls == 4
+    with pytest.raises(tripwise.LLMUnavailable):
+        resilient.generate("hi")
+    assert backend.calls == 4  # open again without waiting for three more failures
+
+
+class HangingBackend(tripwise.LLMBackend):
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate(self, prompt, timeout=None):
+        self.release.wait(5)
+        return "late"
+
+    def stream(self, prompt, timeout=None):
+        yield "first"
+        self.release.wait(5)
+        yield "late"
+
+
+def test_hung_call_is_abandoned_at_the_deadline():
+    backend = HangingBackend()
+    resilient = tripwise.ResilientBackend(backend, max_concurrency=1, timeout=0.2, retries=0)
+    started = time.monotonic()
+    with pytest.raises(tripwise.LLMUnavailable):
+        resilient.generate("hi")
+    assert time.monotonic() - started < 1
+
+    # The overdue call keeps its slot until it really returns
+    assert not resilient._slots.acquire(blocking=False)
+    backend.release.set()
+    time.sleep(0.1)
+    assert resilient._slots.acquire(blocking=False)
+
+
+def test_stream_stalled_between_chunks_hits_the_deadline():
+    backend = HangingBackend()
+    resilient = tripwise.ResilientBackend(backend, timeout=0.2, retries=0)
+    chunks = []
+    started = time.monotonic()
+    with pytest.raises(tripwise.LLMUnavailable):
+        for chunk in resilient.stream("hi"):
+            chunks.append(chunk)
+    assert chunks == ["first"]
+    assert time.monotonic() - started < 1
+    backend.release.set()
+
+
+def test_slot_is_free_during_the_backoff_sleep():
+    backend = FlakyBackend()
+    backend.release.set()
+    resilient = tripwise.ResilientBackend(backend, max_concurrency=1, timeout=5, retries=1)
+    free_while_sleeping = []
+
+    def sleep(attempt, deadline):
+        free = resilient._slots.acquire(blocking=False)
+        if free:
+            resilient._slots.release()
+        free_while_sleeping.append(free)
+        backend.fail = False
+        return True
+
+    resilient._sleep_before_retry = sleep
+    assert resilient.generate("hi") == "ok"
+    assert free_while_sleeping == [True]
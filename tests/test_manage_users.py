@@ -0,0 +1,22 @@
+import re
+
+import app as tripwise
+from conftest import add_user, login
+
+
+def test_paging_through_users_lists_each_once_newest_first(app, client):
+    add_user("admin@example.com", role="admin")
+    for k in range(4):
+        add_user(f"user{k}@example.com")
+    login(client, "admin@example.com")
+
+    seen = []
+    url = "/admin/manage_users?per_page=2"
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        seen += [int(i) for i in re.findall(r'/admin/user/edit/(\d+)', html)]
+        cursor = re.search(r'after=(\d+)', html)
+        url = f"/admin/manage_users?per_page=2&after={cursor.group(1)}" if cursor else None
+
+    ids = [user.id for user in tripwise.User.query.all()]
+    assert seen == sorted(ids, reverse=True)
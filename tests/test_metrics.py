@@ -0,0 +1,37 @@
+import app as tripwise
+from conftest import add_user, login
+
+
+def test_histogram_renders_prometheus_text():
+    histogram = tripwise.Histogram("demo_seconds", "Demo timings.", ("endpoint",), (0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, 'say "hi"\n')
+
+    assert histogram.render().splitlines() == [
+        "# HELP demo_seconds Demo timings.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{endpoint="say \\"hi\\"\\n",le="0.1"} 1',
+        'demo_seconds_bucket{endpoint="say \\"hi\\"\\n",le="1.0"} 3',
+        'demo_seconds_bucket{endpoint="say \\"hi\\"\\n",le="+Inf"} 4',
+        'demo_seconds_sum{endpoint="say \\"hi\\"\\n"} 4.05',
+        'demo_seconds_count{endpoint="say \\"hi\\"\\n"} 4',
+    ]
+
+
+def test_metrics_are_closed_without_a_token(app, client):
+    assert client.get("/metrics").status_code == 401
+
+    add_user("admin@example.com", role="admin")
+    login(client, "admin@example.com")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# TYPE tripwise_request_duration_seconds histogram" in response.get_data(as_text=True)
+
+
+def test_metrics_token_gate(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3cret")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
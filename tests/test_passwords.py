@@ -0,0 +1,56 @@
+import threading
+
+import app as tripwise
+from conftest import add_user, login
+
+
+def _stored_hash(email):
+    tripwise.db.session.expire_all()
+    return tripwise.User.query.filter_by(email=email).one().password_hash
+
+
+def test_login_upgrades_an_old_hash(app, client):
+    user = add_user("a@example.com")
+    user.password_hash = tripwise.generate_password_hash("pw", "pbkdf2:sha256:500")
+    tripwise.db.session.commit()
+
+    assert login(client, "a@example.com").headers["Location"].endswith("/home")
+    assert _stored_hash("a@example.com").startswith("pbkdf2:sha256:1000$")
+
+
+def test_busy_hasher_skips_the_rehash_but_signs_in(app, client, monkeypatch):
+    user = add_user("a@example.com")
+    old_hash = user.password_hash = tripwise.generate_password_hash("pw", "pbkdf2:sha256:500")
+    tripwise.db.session.commit()
+
+    def busy(password):
+        raise tripwise.PasswordHasherBusy("busy")
+
+    monkeypatch.setattr(tripwise, "hash_password", busy)
+    assert login(client, "a@example.com").headers["Location"].endswith("/home")
+    assert _stored_hash("a@example.com") == old_hash
+
+
+def test_busy_hasher_refuses_the_check_itself(app, client, monkeypatch):
+    add_user("a@example.com")
+    monkeypatch.setattr(tripwise, "_password_slots", threading.BoundedSemaphore(1))
+    tripwise._password_slots.acquire()
+
+    assert login(client, "a@example.com").status_code == 503
+
+
+def test_unknown_email_costs_a_full_check_on_the_pool(app, client, monkeypatch):
+    calls = []
+    check = tripwise.check_password_hash
+
+    def spy(stored_hash, password):
+        calls.append((stored_hash, threading.current_thread().name))
+        return check(stored_hash, password)
+
+    monkeypatch.setattr(tripwise, "check_password_hash", spy)
+    response = login(client, "nobody@example.com")
+
+    assert response.status_code == 200
+    [(stored_hash, thread)] = calls
+    assert stored_hash.startswith("pbkdf2:sha256:1000$")
+    assert thread.startswith("password-hash")
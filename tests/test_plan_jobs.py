@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import app as tripwise
+from conftest import add_user
+
+
+def _submit(user, prompt="Plan three days on Bohol"):
+    return tripwise.submit_plan_job(user.id, prompt, "Bohol", 3, 2, 5000.0)
+
+
+def _job(user, status, updated_at=None):
+    job = tripwise.TripPlanJob(job_id=tripwise.uuid.uuid4().hex, user_id=user.id, dedupe_key=status,
+                               status=status, days=3, people=2, budget=5000.0, prompt="Plan",
+                               updated_at=updated_at or datetime.utcnow())
+    tripwise.db.session.add(job)
+    tripwise.db.session.commit()
+    return job.job_id
+
+
+def test_identical_pending_plans_are_deduped_per_user(app, monkeypatch):
+    queued = []
+    monkeypatch.setattr(tripwise, "_enqueue_plan_job", lambda job_id: queued.append(job_id) or True)
+    alice, bob = add_user("alice@example.com"), add_user("bob@example.com")
+
+    first = _submit(alice)
+    assert _submit(alice, "  plan THREE days   on bohol ").job_id == first.job_id
+    assert _submit(bob).job_id != first.job_id
+    assert len(queued) == 2
+
+    first.status = "done"
+    tripwise.db.session.commit()
+    assert _submit(alice).job_id != first.job_id
+
+
+def test_resume_requeues_pending_and_stale_running_jobs(app, monkeypatch):
+    queued = []
+    monkeypatch.setattr(tripwise, "_enqueue_plan_job", lambda job_id: queued.append(job_id) or True)
+    user = add_user("a@example.com")
+    pending = _job(user, "pending")
+    stale = _job(user, "running", datetime.utcnow() - timedelta(hours=1))
+    _job(user, "running")
+    _job(user, "done")
+
+    tripwise.resume_plan_jobs()
+
+    assert sorted(queued) == sorted([pending, stale])
+
+
+def test_resume_fails_jobs_the_full_queue_refuses(app, monkeypatch):
+    monkeypatch.setattr(tripwise, "_enqueue_plan_job", lambda job_id: False)
+    user = add_user("a@example.com")
+    job_id = _job(user, "pending")
+
+    tripwise.resume_plan_jobs()
+
+    tripwise.db.session.expire_all()
+    job = tripwise.db.session.get(tripwise.TripPlanJob, job_id)
+    assert job.status == "failed"
+    assert job.error == "Planner queue is full"
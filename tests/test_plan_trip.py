@@ -0,0 +1,48 @@
+import pytest
+
+import app as tripwise
+from conftest import add_island, add_user, login
+
+
+@pytest.fixture
+def planner(app, client):
+    add_island("Alaminos", map_coordinates="16.16, 119.98")
+    add_user("traveller@example.com")
+    login(client, "traveller@example.com")
+    return lambda days: client.post("/plan_trip", data={
+        "destinations": ["1"], "budget": "5000", "days": days, "people": "2",
+    })
+
+
+@pytest.mark.parametrize("days", ["0", "-3", "31", "1000000000"])
+def test_out_of_range_trip_lengths_are_refused(planner, days):
+    response = planner(days)
+
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith("/plan_trip")
+    assert tripwise.TripPlanJob.query.count() == 0
+
+
+def test_trip_within_limit_is_queued(planner, monkeypatch):
+    monkeypatch.setattr(tripwise, "_enqueue_plan_job", lambda job_id: True)
+    planner("3")
+
+    job = tripwise.TripPlanJob.query.one()
+    assert "Day 3:" in job.prompt
+
+
+def test_too_many_destinations_are_refused(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "MAX_TRIP_DESTINATIONS", 2)
+    monkeypatch.setattr(tripwise, "_enqueue_plan_job", lambda job_id: True)
+    islands = [add_island(name, map_coordinates=f"1{k}.0, 120.0") for k, name in enumerate(("Bohol", "Cebu", "Siquijor"))]
+    add_user("traveller@example.com")
+    login(client, "traveller@example.com")
+    plan = lambda ids: client.post("/plan_trip", data={
+        "destinations": [str(i.id) for i in ids], "budget": "5000", "days": "3", "people": "2",
+    })
+
+    assert plan(islands).headers["Location"].endswith("/plan_trip")
+    assert tripwise.TripPlanJob.query.count() == 0
+    plan(islands[:2])
+    assert tripwise.TripPlanJob.query.count() == 1
+
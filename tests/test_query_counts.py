@@ -0,0 +1,55 @@
+"""Pin the number of SQL statements on hot paths, so an N+1 loop shows up as a failure."""
+import flask
+import pytest
+
+import app as tripwise
+from conftest import add_island, add_user, add_visits, last_year_week, login
+
+CATALOG_LOAD_QUERIES = 3  # islands, establishments, activities
+
+
+@pytest.fixture
+def catalog(app):
+    for n in range(12):
+        island = add_island(f"Island {n}", map_coordinates=f"{10 + n / 10}, {120 + n / 10}")
+        add_visits(island, last_year_week(), 100 + n)
+    tripwise.invalidate_catalog()
+
+
+def test_catalog_load_cost(app, catalog):
+    tripwise.reset_query_count()
+    tripwise.get_catalog()
+    assert tripwise.get_query_count() == CATALOG_LOAD_QUERIES
+
+
+def test_home_query_count(app, client, catalog):
+    add_user("traveller@example.com")
+    login(client, "traveller@example.com")
+    counts = []
+
+    def record(sender, response, **extra):
+        counts.append(tripwise.get_query_count())
+
+    tripwise.invalidate_catalog()
+    with flask.request_finished.connected_to(record, app):
+        for _ in range(3):
+            client.get("/home")
+
+    # user + visit ranking, plus the catalog on the first (cold) request
+    assert counts == [2 + CATALOG_LOAD_QUERIES, 2, 2]
+
+
+def test_chat_context_query_count(app, catalog):
+    with app.test_request_context():
+        tripwise.invalidate_catalog()
+        tripwise.reset_query_count()
+        tripwise.get_db_context("Island 3 beach hotels")
+        cold = tripwise.get_query_count()
+
+        tripwise.reset_query_count()
+        tripwise.get_db_context("Island 3 beach hotels")
+        warm = tripwise.get_query_count()
+
+    # island search, establishment search and visit ranking
+    assert warm == 3
+    assert cold == 3 + CATALOG_LOAD_QUERIES
@@ -0,0 +1,35 @@
+import app as tripwise
+from conftest import add_island
+
+
+def test_entries_expire_after_the_ttl(monkeypatch, tmp_path):
+    now = [1000.0]
+    monkeypatch.setattr(tripwise.time, "time", lambda: now[0])
+    cache = tripwise.ResponseCache(max_size=10, ttl=60, path=str(tmp_path / "cache.db"))
+    cache.set("k", "answer")
+
+    now[0] += 59
+    assert cache.get("k") == "answer"
+    now[0] += 2
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = tripwise.ResponseCache(max_size=2, ttl=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+
+def test_catalog_change_misses_the_cache(app):
+    add_island("Coron")
+    cache = tripwise.ResponseCache(max_size=10, ttl=60)
+    cache.set(tripwise.llm_cache_key("Best beaches?"), "Coron")
+    assert cache.get(tripwise.llm_cache_key("best   BEACHES?")) == "Coron"
+
+    add_island("Siargao")
+    assert cache.get(tripwise.llm_cache_key("Best beaches?")) is None
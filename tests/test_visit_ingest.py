@@ -0,0 +1,42 @@
+from datetime import date
+
+import pytest
+
+import app as tripwise
+from conftest import add_island
+
+
+@pytest.fixture
+def ingest(app, client):
+    app.config['VISIT_INGEST_TOKEN'] = "secret"
+    yield lambda counts: client.post("/api/visits/ingest", json={"counts": counts},
+                                     headers={"Authorization": "Bearer secret"})
+    app.config['VISIT_INGEST_TOKEN'] = ""
+    with tripwise.visit_buffer._lock:
+        tripwise.visit_buffer._counts.clear()
+
+
+def test_booleans_are_not_ids_or_counts(app, ingest):
+    add_island("Alaminos")
+    response = ingest([{"island_id": True, "count": 1}, {"island_id": 1, "count": True}])
+
+    assert response.status_code == 202
+    assert response.json["accepted"] == 0
+    assert [r["index"] for r in response.json["rejected"]] == [0, 1]
+
+
+def test_counts_are_summed_per_week_and_flushed_once(app, ingest):
+    island = add_island("Alaminos")
+    monday = date(2025, 11, 10)
+    response = ingest([{"island_id": island.id, "count": 3, "date": "2025-11-12"},
+                       {"island_id": island.id, "count": 4, "date": "2025-11-16"}])
+    assert response.json == {"accepted": 2, "rejected": [], "pending": 1}
+
+    assert tripwise.visit_buffer.flush() == 1
+    ingest([{"island_id": island.id, "count": 5, "date": "2025-11-10"}])
+    tripwise.visit_buffer.flush()
+
+    visits = tripwise.Visit.query.all()
+    assert [(v.visit_week, v.total_visits) for v in visits] == [(monday, 12)]
+    rollups = {r.period: r.total_visits for r in tripwise.VisitRollup.query.all()}
+    assert rollups == {"month": 12, "year": 12}
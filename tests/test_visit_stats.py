@@ -0,0 +1,52 @@
+from datetime import date
+
+import app as tripwise
+from conftest import add_island, add_visits, last_year_week
+
+
+def _ranking():
+    return tripwise.db.session.query(tripwise.Island.name, tripwise.VisitRollup.total_visits)\
+        .join(tripwise.VisitRollup, tripwise.Island.id == tripwise.VisitRollup.island_id)\
+        .filter(tripwise.VisitRollup.period == 'year', tripwise.stats_year_filter())\
+        .order_by(tripwise.VisitRollup.total_visits.desc()).all()
+
+
+def test_ranking_uses_last_complete_year_while_current_year_is_partial(app):
+    alaminos, siargao, coron = add_island("Alaminos"), add_island("Siargao"), add_island("Coron")
+    add_visits(alaminos, last_year_week(), 120)
+    add_visits(siargao, last_year_week(), 300)
+    add_visits(coron, last_year_week(), 200)
+    add_visits(alaminos, date(date.today().year, 1, 5), 1)
+
+    assert _ranking() == [("Siargao", 300), ("Coron", 200), ("Alaminos", 120)]
+    context = tripwise.get_db_context("where should I go?")
+    assert "Siargao: 300 visitors per year" in context
+    assert "1 visitors per year" not in context
+
+
+def test_ranking_falls_back_to_current_year_without_history(app):
+    island = add_island("Alaminos")
+    add_visits(island, date(date.today().year, 1, 5), 7)
+
+    assert _ranking() == [("Alaminos", 7)]
+
+
+def test_configured_stats_year_wins(app, monkeypatch):
+    island = add_island("Alaminos")
+    add_visits(island, date(2020, 3, 2), 50)
+    add_visits(island, last_year_week(), 80)
+    monkeypatch.setitem(app.config, 'VISIT_STATS_YEAR', 2020)
+    assert _ranking() == [("Alaminos", 50)]
+
+
+def test_rollup_deltas_add_up_in_place(app):
+    island = add_island("Bohol")
+    month, year = date(2024, 3, 1), date(2024, 1, 1)
+    connection = tripwise.db.session.connection()
+    tripwise.apply_visit_deltas(connection, {(island.id, month, year): 5})
+    tripwise.apply_visit_deltas(connection, {(island.id, month, year): 7, (island.id, date(2024, 4, 1), year): 1})
+    tripwise.apply_visit_delta(connection, island.id, month, year, -2)
+    tripwise.db.session.commit()
+
+    totals = {(r.period, r.period_start): r.total_visits for r in tripwise.VisitRollup.query.all()}
+    assert totals == {("month", month): 10, ("month", date(2024, 4, 1)): 1, ("year", year): 11}